@@ -11,11 +11,11 @@ django.setup()
 
 from apistar import Component, Include, Route
 from apistar.backends import django_orm
-from apistar.frameworks.wsgi import WSGIApp as App
 from apistar_jwt.authentication import get_jwt
 from apistar_jwt.token import JWT
 
-from envelopes import views
+from envelopes import commands, views
+from envelopes.instrumentation import InstrumentedApp as App
 
 
 account_routes = [
@@ -24,22 +24,39 @@ account_routes = [
     Route('/{uuid}/', 'GET', views.get_account),
     Route('/{uuid}/', 'PATCH', views.update_account),
     Route('/{uuid}/', 'DELETE', views.delete_account),
+    Route('/{uuid}/summary/', 'GET', views.get_account_summary),
+    Route('/{uuid}/reports/spend/', 'GET', views.get_spend_report),
+    Route('/{uuid}/reports/budget/', 'GET', views.get_budget_report),
+    Route('/{uuid}/reports/projection/', 'GET', views.get_projection_report),
 ]
 
 envelope_routes = [
-    # Route('/', 'GET', list_envelopes),
-    # Route('/', 'POST', create_envelope),
-    # Route('/{uuid}', 'GET', get_envelope),
-    # Route('/{uuid}', 'PUT', update_envelope),
-    # Route('/{uuid}', 'PATCH', update_envelope),
-    # Route('/{uuid}', 'DELETE', delete_envelope),
-    # Route('/{uuid}/deposit', 'POST', deposit_into_envelope),
-    # Route('/{uuid}/withdraw', 'POST', withdraw_from_envelope),
+    Route('/', 'GET', views.list_envelopes),
+    Route('/', 'POST', views.create_envelope),
+    Route('/movements/', 'POST', views.move_envelope_funds),
+    Route('/transfers/', 'POST', views.transfer_envelope_funds),
+    Route('/{uuid}/', 'GET', views.get_envelope),
+    Route('/{uuid}/', 'PUT', views.update_envelope, name='replace_envelope'),
+    Route('/{uuid}/', 'PATCH', views.update_envelope),
+    Route('/{uuid}/', 'DELETE', views.delete_envelope),
+    Route('/{uuid}/deposit/', 'POST', views.deposit_into_envelope),
+    Route('/{uuid}/withdraw/', 'POST', views.withdraw_from_envelope),
+    Route('/{uuid}/balance/', 'GET', views.get_envelope_balance),
+]
+
+transaction_routes = [
+    Route('/', 'GET', views.list_transactions),
+    Route('/export', 'GET', views.export_transactions),
+    Route('/import', 'POST', views.import_transactions),
+    Route('/{friendly_id}/', 'GET', views.get_transaction),
 ]
 
 routes = [
+   Route('/metrics', 'GET', views.get_metrics),
+   Route('/metrics/slow', 'GET', views.list_slow_requests),
    Include('/accounts', account_routes),
-   # Include('/envelope', envelope_rtoues),
+   Include('/envelopes', envelope_routes),
+   Include('/transactions', transaction_routes),
 ]
 
 
@@ -53,5 +70,5 @@ app = App(
     routes=routes,
     components=components,
     settings=settings,
-    commands=django_orm.commands,  # Install custom commands.
+    commands=django_orm.commands + commands.commands,  # Install custom commands.
 )
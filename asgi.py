@@ -0,0 +1,16 @@
+"""
+ASGI entry point, served alongside the WSGI `app.app`, e.g.
+
+    uvicorn asgi:application --workers 4
+
+`ASGI_THREADS` bounds how many requests run application code at once per
+process (and so how many database connections each process opens).
+"""
+# Standard Library Imports
+import os
+
+# First Party Library Imports
+from app import app
+from envelopes.asgi import ASGIAdapter
+
+application = ASGIAdapter(app, max_workers=int(os.environ.get('ASGI_THREADS') or 32))
@@ -0,0 +1,220 @@
+"""
+WSGI versus ASGI throughput at a fixed number of worker threads.
+
+    python -m benchmarks.asgi [--workers N] [--concurrency N ...] [--requests N]
+                              [--route KEY ...] [--keepdb] [--output PATH]
+
+Both modes serve the same seeded database in-process, with the same
+`--workers` threads allowed to run application code:
+
+* `wsgi`: `--workers` threads, each calling `app.app` for one request at a
+  time, as a threaded WSGI server (`gunicorn --threads N app:app`) would;
+  `--concurrency` clients queue requests for them.
+* `asgi`: one event loop holding `--concurrency` requests in flight through
+  `asgi.application`'s adapter with `max_workers=--workers`.
+
+Against real servers, compare `gunicorn -w P --threads N app:app` with
+`uvicorn --workers P asgi:application` and `ASGI_THREADS=N`.
+"""
+# Standard Library Imports
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from queue import Queue
+
+# Third Party Library Imports
+from django.db import connection
+
+# First Party Library Imports
+from app import app
+from envelopes.asgi import ASGIAdapter, environ_from_scope
+
+# Local Imports
+from .factories import seed
+from .harness import auth_header, benchmark_database, environment, summarize
+
+ROUTES = {
+    'GET /accounts/': '/accounts/',
+    'GET /accounts/{uuid}/': '/accounts/{account}/',
+    'GET /accounts/{uuid}/summary/': '/accounts/{account}/summary/',
+    'GET /transactions/export': '/transactions/export',
+}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--years', type=int, default=1, help='years of transactions')
+    parser.add_argument('--workers', type=int, default=8, help='threads running the app')
+    parser.add_argument(
+        '--concurrency', type=int, nargs='+', default=[8, 32, 128],
+        help='requests in flight')
+    parser.add_argument('--requests', type=int, default=500, help='requests per measurement')
+    parser.add_argument('--route', nargs='+', choices=sorted(ROUTES), default=sorted(ROUTES))
+    parser.add_argument('--keepdb', action='store_true')
+    parser.add_argument('--output', default='asgi-report.json')
+    return parser.parse_args(argv)
+
+
+def build_scopes(dataset, path, count):
+    headers = [
+        (name.lower().encode('latin-1'), value.encode('latin-1'))
+        for name, value in auth_header(dataset.users[0]).items()
+    ]
+    path = path.format(account=dataset.accounts[0].uuid)
+    return [
+        {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+         'headers': headers}
+        for _ in range(count)
+    ]
+
+
+def serve_wsgi(scope):
+    status = {}
+
+    def start_response(line, headers, exc_info=None):
+        status['code'] = int(line[:3])
+
+    content = app(environ_from_scope(scope, b''), start_response)
+    try:
+        for _ in content:
+            pass
+    finally:
+        if hasattr(content, 'close'):
+            content.close()
+    return status['code']
+
+
+def run_wsgi(scopes, workers, concurrency):
+    """
+    Serve `scopes` from `workers` threads, each handling one request at a
+    time, while `concurrency` clients keep a request queued or running.
+
+    Latency is measured from the moment a request is queued, so time spent
+    waiting for a free thread counts, as it would in a server's backlog.
+    """
+    backlog = Queue()
+    pending = list(reversed(scopes))
+    latencies, errors, lock = [], Counter(), threading.Lock()
+
+    def worker():
+        try:
+            while True:
+                job = backlog.get()
+                if job is None:
+                    return
+                scope, done, result = job
+                result.append(serve_wsgi(scope))
+                done.set()
+        finally:
+            connection.close()
+
+    def client():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                scope = pending.pop()
+            done, result = threading.Event(), []
+            started = time.perf_counter()
+            backlog.put((scope, done, result))
+            done.wait()
+            took = time.perf_counter() - started
+            with lock:
+                if result[0] >= 400:
+                    errors[str(result[0])] += 1
+                else:
+                    latencies.append(took)
+
+    servers = [threading.Thread(target=worker) for _ in range(workers)]
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in servers:
+        thread.start()
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    for thread in servers:
+        backlog.put(None)
+    for thread in servers:
+        thread.join()
+    return summarize(latencies, elapsed, errors)
+
+
+def run_asgi(scopes, workers, concurrency):
+    """
+    Serve `scopes` through `ASGIAdapter(max_workers=workers)` with
+    `concurrency` requests in flight on one event loop.
+    """
+    adapter = ASGIAdapter(app, max_workers=workers)
+    latencies, errors = [], Counter()
+    pending = list(reversed(scopes))
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def client():
+        while pending:
+            scope = pending.pop()
+            status = {}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status['code'] = message['status']
+
+            started = time.perf_counter()
+            await adapter(scope, receive, send)
+            took = time.perf_counter() - started
+            if status['code'] >= 400:
+                errors[str(status['code'])] += 1
+            else:
+                latencies.append(took)
+
+    loop = asyncio.new_event_loop()
+    try:
+        started = time.perf_counter()
+        loop.run_until_complete(asyncio.gather(
+            *[client() for _ in range(concurrency)], loop=loop))
+        elapsed = time.perf_counter() - started
+    finally:
+        adapter.close()
+        loop.close()
+    return summarize(latencies, elapsed, errors)
+
+
+def run(args):
+    report = {'environment': environment(), 'parameters': vars(args).copy(), 'routes': {}}
+    dataset = seed(users=args.users, years=args.years)
+    for key in args.route:
+        report['routes'][key] = {}
+        for concurrency in args.concurrency:
+            scopes = build_scopes(dataset, ROUTES[key], args.requests)
+            results = {
+                'wsgi': run_wsgi(scopes, args.workers, concurrency),
+                'asgi': run_asgi(scopes, args.workers, concurrency),
+            }
+            report['routes'][key][str(concurrency)] = results
+            for mode, summary in sorted(results.items()):
+                print('{:<32} c={:<4} {} {throughput_per_s:>8} req/s  '
+                      'p50 {p50_ms} ms  p99 {p99_ms} ms'.format(key, concurrency, mode, **summary))
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with benchmark_database(keepdb=args.keepdb):
+        report = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('report written to {}'.format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+pytest-benchmark suite for the API routes and envelope writes.
+
+    bash scripts/benchmark [--benchmark-json PATH] [pytest-benchmark options]
+"""
+# Standard Library Imports
+import itertools
+from datetime import datetime
+from decimal import Decimal
+
+# Third Party Library Imports
+import pytest
+
+# First Party Library Imports
+from envelopes.models import Envelope
+
+# Local Imports
+from .harness import route_keys
+
+
+@pytest.mark.parametrize('key', route_keys())
+def test_route(benchmark, client, scenarios, key):
+    if key not in scenarios:
+        pytest.fail('No benchmark scenario for {}'.format(key))
+    scenario = scenarios[key]
+    send = getattr(client, scenario.method)
+    counter = itertools.count()
+
+    def setup():
+        url, kwargs = scenario.prepare(next(counter))
+        return (url, ), kwargs
+
+    def request(url, **kwargs):
+        response = send(url, **kwargs)
+        response.content
+        return response
+
+    response = benchmark.pedantic(request, setup=setup, rounds=50, warmup_rounds=2)
+    assert response.status_code < 400, response.content
+
+
+def test_deposit(benchmark, dataset):
+    envelope = dataset.envelopes[0]
+    benchmark(Envelope.deposit, envelope.uuid, dataset.users[0], Decimal('1.00'), datetime.now())
+
+
+def test_withdraw(benchmark, dataset):
+    envelope = dataset.envelopes[0]
+    benchmark(
+        Envelope.withdraw, envelope.uuid, dataset.users[0], Decimal('1.00'), datetime.now(),
+        category=dataset.categories[0])
@@ -0,0 +1,28 @@
+# Third Party Library Imports
+import pytest
+from apistar import TestClient
+
+# First Party Library Imports
+from app import app
+
+# Local Imports
+from .factories import seed
+from .harness import auth_header, benchmark_database, route_scenarios
+
+
+@pytest.fixture(scope='session')
+def dataset():
+    with benchmark_database():
+        yield seed(users=3, accounts=2, envelopes=6, years=2, per_month=20)
+
+
+@pytest.fixture(scope='session')
+def client(dataset):
+    client = TestClient(app)
+    client.headers.update(auth_header(dataset.users[0]))
+    return client
+
+
+@pytest.fixture(scope='session')
+def scenarios(dataset):
+    return route_scenarios(dataset)
@@ -0,0 +1,158 @@
+"""
+Factories and a bulk seeder for benchmark data.
+
+`seed()` builds users x accounts x envelopes with years of monthly activity.
+Users, accounts and envelopes are created one by one through the factories;
+transactions are built by `TransactionFactory` and written with
+`bulk_create`, and balances and rollups are set once at the end so the
+seeded ledger is consistent with its transactions.
+"""
+# Standard Library Imports
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Third Party Library Imports
+import factory
+from django.contrib.auth import get_user_model
+from django.db import transaction as db_transaction
+
+# First Party Library Imports
+from envelopes.models import Account, AccountRollup, Category, Envelope, Transaction
+from envelopes.utils import friendly_ids
+
+CATEGORY_NAMES = [
+    'Groceries', 'Rent', 'Utilities', 'Transport', 'Dining', 'Health',
+    'Entertainment', 'Clothing', 'Gifts', 'Travel', 'Education', 'Savings',
+]
+ENVELOPE_NAMES = [
+    'Groceries', 'Rent', 'Car', 'Vacation', 'Emergency', 'Christmas',
+    'Dining out', 'Clothes', 'Internet', 'Pets', 'Gym', 'Books',
+]
+BULK_SIZE = 2000
+
+Dataset = namedtuple('Dataset', 'users accounts envelopes categories transactions')
+
+
+class UserFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = get_user_model()
+
+    email = factory.Sequence(lambda n: 'bench-{}@example.com'.format(n))
+    full_name = factory.Faker('name')
+    short_name = factory.Faker('first_name')
+    password = '12345abc'
+
+
+class AccountFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Account
+
+    owner = factory.SubFactory(UserFactory)
+    balance = Decimal('0.00')
+
+
+class EnvelopeFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Envelope
+
+    account = factory.SubFactory(AccountFactory)
+    creator = factory.SelfAttribute('account.owner')
+    name = factory.Iterator(ENVELOPE_NAMES)
+    budget = Decimal('100.00')
+    balance = Decimal('0.00')
+    created = factory.LazyFunction(datetime.now)
+    modified = factory.SelfAttribute('created')
+
+
+class TransactionFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Transaction
+
+    friendly_id = factory.LazyFunction(friendly_ids.next_id)
+    envelope = factory.SubFactory(EnvelopeFactory)
+    user = factory.SelfAttribute('envelope.creator')
+    owner_id = factory.SelfAttribute('envelope.owner_id')
+    action_type = Transaction.ACTION_TYPE_DEPOSITED
+    delta = Decimal('0.00')
+    created = factory.LazyFunction(datetime.now)
+    description = ''
+    comment = ''
+
+
+def categories():
+    return [Category.objects.get_or_create(name=name)[0] for name in CATEGORY_NAMES]
+
+
+def month_starts(years, until):
+    month = until.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    starts = []
+    for _ in range(years * 12):
+        starts.append(month)
+        month = (month - timedelta(days=1)).replace(day=1)
+    return starts[::-1]
+
+
+def seed(users=2, accounts=1, envelopes=5, years=1, per_month=20, until=None, random_seed=0):
+    """
+    Create benchmark data and return it as a `Dataset`.
+
+    Every envelope gets its budget deposited at the start of each month,
+    followed by `per_month - 1` categorized withdrawals spread over that
+    month. Numbers are drawn from `random_seed`, so two runs with the same
+    arguments seed the same amounts.
+    """
+    rng = random.Random(random_seed)
+    until = datetime.now() if until is None else until
+    months = month_starts(years, until)
+    category_list = categories()
+    dataset = Dataset([], [], [], category_list, 0)
+    pending = []
+
+    def flush():
+        Transaction.objects.bulk_create(pending)
+        count = len(pending)
+        del pending[:]
+        return count
+
+    transactions = 0
+    with db_transaction.atomic():
+        for _ in range(users):
+            user = UserFactory()
+            dataset.users.append(user)
+            for _ in range(accounts):
+                account = AccountFactory(owner=user)
+                dataset.accounts.append(account)
+                allocated = Decimal('0.00')
+                for _ in range(envelopes):
+                    budget = Decimal(rng.randrange(5000, 100000)) / 100
+                    envelope = EnvelopeFactory(account=account, budget=budget, created=months[0])
+                    dataset.envelopes.append(envelope)
+                    balance = Decimal('0.00')
+                    for month in months:
+                        pending.append(TransactionFactory.build(
+                            envelope=envelope, delta=budget, created=month,
+                            action_type=Transaction.ACTION_TYPE_DEPOSITED))
+                        balance += budget
+                        for _ in range(per_month - 1):
+                            amount = min(balance, Decimal(rng.randrange(100, 5000)) / 100)
+                            if amount <= 0:
+                                break
+                            pending.append(TransactionFactory.build(
+                                envelope=envelope, delta=-amount,
+                                created=month + timedelta(minutes=rng.randrange(28 * 24 * 60)),
+                                action_type=Transaction.ACTION_TYPE_WITHDRAWN,
+                                category=rng.choice(category_list)))
+                            balance -= amount
+                        if len(pending) >= BULK_SIZE:
+                            transactions += flush()
+                    envelope.balance = balance
+                    envelope.modified = until
+                    envelope.save(update_fields=['balance', 'modified'])
+                    allocated += balance
+                account.balance = allocated + Decimal(rng.randrange(0, 100000)) / 100
+                account.save(update_fields=['balance'])
+                AccountRollup.rebuild(account.pk, until)
+        transactions += flush()
+    return dataset._replace(transactions=transactions)
@@ -0,0 +1,51 @@
+"""
+Microbenchmark for Transaction friendly id generation.
+
+    python -m benchmarks.friendly_ids [--count N] [--minimum IDS_PER_SECOND]
+
+Exits non-zero when either the single-id or the batch path falls below the
+minimum rate. No database is touched.
+"""
+# Standard Library Imports
+import argparse
+import sys
+import time
+
+# First Party Library Imports
+import app  # noqa; F401
+from envelopes.utils import friendly_ids
+
+
+def measure(func, count):
+    started = time.perf_counter()
+    func(count)
+    return count / (time.perf_counter() - started)
+
+
+def single(count):
+    next_id = friendly_ids.next_id
+    for _ in range(count):
+        next_id()
+
+
+def batch(count):
+    for _ in range(count // 1000):
+        friendly_ids.next_ids(1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--minimum', type=float, default=100000)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name, func in (('single', single), ('batch', batch)):
+        rate = measure(func, args.count)
+        failed = failed or rate < args.minimum
+        print('{:<8} {:>12,.0f} ids/s'.format(name, rate))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Ledger write throughput against the group commit window.
+
+    python -m benchmarks.group_commit [--writers N] [--operations N]
+                                      [--envelopes N] [--windows MS ...]
+                                      [--max-batch N] [--keepdb] [--output PATH]
+
+`--writers` threads alternate deposits and withdrawals spread over
+`--envelopes` envelopes, first committing each write on its own
+(`Envelope.deposit`/`Envelope.withdraw`, window 0) and then through a
+`GroupCommit` queue for every non-zero window in `--windows`. Every write
+is acknowledged only after its commit, so the numbers compare durable
+writes per second and the latency each window adds to them.
+"""
+# Standard Library Imports
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+
+# Third Party Library Imports
+from django.db import connection
+
+# First Party Library Imports
+import app  # noqa; F401
+from envelopes.ledger import GroupCommit
+from envelopes.models import Envelope
+
+# Local Imports
+from .factories import seed
+from .harness import benchmark_database, environment, summarize
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=32)
+    parser.add_argument('--operations', type=int, default=100, help='operations per writer')
+    parser.add_argument('--envelopes', type=int, default=16, help='envelopes written to')
+    parser.add_argument(
+        '--windows', type=float, nargs='+', default=[0, 1, 2, 5, 10],
+        help='group commit windows in milliseconds, 0 commits every write alone')
+    parser.add_argument('--max-batch', type=int, default=100)
+    parser.add_argument('--keepdb', action='store_true')
+    parser.add_argument('--output', default='group-commit-report.json')
+    return parser.parse_args(argv)
+
+
+def run_window(dataset, writers, operations, targets, window, max_batch):
+    """
+    Time `writers` threads doing `operations` writes each, through a
+    `GroupCommit` with `window` milliseconds or, for 0, directly.
+    """
+    user = dataset.users[0]
+    category = dataset.categories[0]
+    queue = GroupCommit(window=window / 1000, max_batch=max_batch) if window else None
+    deposit = queue.deposit if queue else Envelope.deposit
+    withdraw = queue.withdraw if queue else Envelope.withdraw
+    latencies, errors, lock = [], Counter(), threading.Lock()
+    start = threading.Barrier(writers + 1)
+
+    def write(worker):
+        local, failed = [], Counter()
+        try:
+            start.wait()
+            for i in range(operations):
+                uuid = targets[(worker + i) % len(targets)]
+                started = time.perf_counter()
+                try:
+                    if i % 2 == 0:
+                        deposit(uuid, user, Decimal('1.00'), datetime.now())
+                    else:
+                        withdraw(uuid, user, Decimal('1.00'), datetime.now(), category=category)
+                except Exception as e:
+                    failed[type(e).__name__] += 1
+                else:
+                    local.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(local)
+            errors.update(failed)
+
+    threads = [threading.Thread(target=write, args=(worker, )) for worker in range(writers)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    summary = summarize(latencies, elapsed, errors)
+    if queue is not None:
+        queue.close()
+        stats = queue.stats()
+        summary['batches'] = stats['batches']
+        summary['mean_batch'] = round(stats['entries'] / max(stats['batches'], 1), 1)
+    return summary
+
+
+def run(args):
+    report = {'environment': environment(), 'parameters': vars(args).copy(), 'windows': {}}
+    dataset = seed(users=1, envelopes=args.envelopes, years=1, per_month=2)
+    targets = [envelope.uuid for envelope in dataset.envelopes[:args.envelopes]]
+    for window in args.windows:
+        summary = run_window(
+            dataset, args.writers, args.operations, targets, window, args.max_batch)
+        report['windows'][str(window)] = summary
+        print('window {:>5} ms {throughput_per_s:>8} tps  p50 {p50_ms} ms  p99 {p99_ms} ms  '
+              'mean batch {}'.format(window, summary.get('mean_batch', 1), **summary))
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with benchmark_database(keepdb=args.keepdb):
+        report = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('report written to {}'.format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,364 @@
+"""
+Shared pieces of the benchmark suite: a throwaway database, request
+scenarios for every route in `app.py`, concurrent writers and report
+helpers.
+"""
+# Standard Library Imports
+import os
+import platform
+import subprocess
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+# Third Party Library Imports
+import django
+from apistar import Include
+from apistar_jwt.token import JWT
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+# First Party Library Imports
+from app import routes
+from envelopes.models import Account, Envelope, Transaction
+
+Scenario = namedtuple('Scenario', 'method path prepare')
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """
+    Create, migrate and finally drop a test database next to the configured one.
+
+    Benchmarks never touch the development database; with `keepdb=True` the
+    database is left in place and reused (and reseeded) by the next run.
+    """
+    old_name = connection.settings_dict['NAME']
+    name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield name
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+
+
+def auth_header(user):
+    token = JWT.encode(
+        {'user': user.id, 'username': user.email}, os.environ.get('JWT_SECRET'),
+        algorithm='HS256')
+    return {'Authorization': 'Bearer {}'.format(token)}
+
+
+def route_keys(entries=routes, prefix=''):
+    """
+    Return `METHOD path` for every route mounted in `app.py`.
+    """
+    keys = []
+    for entry in entries:
+        if isinstance(entry, Include):
+            keys.extend(route_keys(entry.routes, prefix + entry.path))
+        else:
+            keys.append('{} {}'.format(entry.method, prefix + entry.path))
+    return keys
+
+
+def route_scenarios(dataset):
+    """
+    Map every `route_keys()` entry to a `Scenario` exercising it for the
+    first seeded user.
+
+    `prepare(i)` returns the url and request keyword arguments for the
+    `i`-th request; any rows it creates (such as the account a DELETE
+    removes) are set up outside the timed section.
+    """
+    user = dataset.users[0]
+    account = dataset.accounts[0]
+    envelopes = [envelope for envelope in dataset.envelopes if envelope.account_id == account.pk]
+    deposit, withdraw = Decimal('1.00'), Decimal('-1.00')
+
+    def get(url, **kwargs):
+        return lambda i: (url, kwargs)
+
+    staff, _ = get_user_model().objects.get_or_create(
+        email='bench-staff@example.com', defaults={'is_staff': True})
+    staff_headers = auth_header(staff)
+
+    latest = Transaction.objects.filter(owner_id=user.pk).only(
+        'friendly_id', 'created').order_by('-created', '-id')[0]
+    month = latest.created.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def create_account(i):
+        return '/accounts/', {'json': {'balance': '10.00'}}
+
+    def update_account(i):
+        return '/accounts/{}/'.format(account.uuid), {'json': {
+            'balance': '{}.00'.format(1000 + i % 100), 'owner': user.pk}}
+
+    def delete_account(i):
+        doomed = Account.objects.create(owner=user, balance=0)
+        return '/accounts/{}/'.format(doomed.uuid), {}
+
+    def move_funds(i):
+        movements = [
+            {'envelope': str(envelope.uuid), 'amount': str(deposit if i % 2 else withdraw)}
+            for envelope in envelopes[:3]
+        ]
+        return '/envelopes/movements/', {'json': {'movements': movements}}
+
+    def create_envelope(i):
+        return '/envelopes/', {'json': {
+            'name': 'Bench {}'.format(i), 'budget': '10.00', 'balance': '0.00',
+            'account': account.pk}}
+
+    def update_envelope(i):
+        return '/envelopes/{}/'.format(envelopes[-1].uuid), {'json': {
+            'name': envelopes[-1].name, 'budget': '{}.00'.format(100 + i % 100),
+            'balance': str(envelopes[-1].balance), 'account': account.pk}}
+
+    def delete_envelope(i):
+        doomed = Envelope.objects.create(
+            creator=user, account=account, name='Doomed', budget=0, balance=0,
+            created=datetime.now(), modified=datetime.now())
+        return '/envelopes/{}/'.format(doomed.uuid), {}
+
+    def change_balance(i):
+        return '/envelopes/{}/{}/'.format(envelopes[2].uuid, 'withdraw' if i % 2 else 'deposit'), {
+            'json': {'amount': '1.00'}}
+
+    def import_statement(i):
+        rows = ''.join(
+            '{},{},Statement line {}\n'.format(month.date().isoformat(), withdraw, n)
+            for n in range(100))
+        url = '/transactions/import?format=csv&envelope={}'.format(envelopes[1].uuid)
+        return url, {'data': ('date,amount,description\n' + rows).encode('utf-8')}
+
+    def transfer_funds(i):
+        source, target = envelopes[i % 2], envelopes[(i + 1) % 2]
+        return '/envelopes/transfers/', {'json': {
+            'source': str(source.uuid), 'target': str(target.uuid), 'amount': '1.00'}}
+
+    return {
+        'GET /metrics': Scenario('get', '/metrics', get('/metrics', headers=staff_headers)),
+        'GET /metrics/slow': Scenario(
+            'get', '/metrics/slow', get('/metrics/slow', headers=staff_headers)),
+        'GET /accounts/': Scenario('get', '/accounts/', get('/accounts/')),
+        'POST /accounts/': Scenario('post', '/accounts/', create_account),
+        'GET /accounts/{uuid}/': Scenario(
+            'get', '/accounts/{uuid}/', get('/accounts/{}/'.format(account.uuid))),
+        'PATCH /accounts/{uuid}/': Scenario('patch', '/accounts/{uuid}/', update_account),
+        'DELETE /accounts/{uuid}/': Scenario('delete', '/accounts/{uuid}/', delete_account),
+        'GET /accounts/{uuid}/summary/': Scenario(
+            'get', '/accounts/{uuid}/summary/',
+            get('/accounts/{}/summary/'.format(account.uuid))),
+        'GET /accounts/{uuid}/reports/spend/': Scenario(
+            'get', '/accounts/{uuid}/reports/spend/',
+            get('/accounts/{}/reports/spend/'.format(account.uuid))),
+        'GET /accounts/{uuid}/reports/budget/': Scenario(
+            'get', '/accounts/{uuid}/reports/budget/',
+            get('/accounts/{}/reports/budget/?month={}'.format(
+                account.uuid, month.strftime('%Y-%m')))),
+        'GET /accounts/{uuid}/reports/projection/': Scenario(
+            'get', '/accounts/{uuid}/reports/projection/',
+            get('/accounts/{}/reports/projection/'.format(account.uuid))),
+        'GET /envelopes/': Scenario('get', '/envelopes/', get('/envelopes/')),
+        'POST /envelopes/': Scenario('post', '/envelopes/', create_envelope),
+        'GET /envelopes/{uuid}/': Scenario(
+            'get', '/envelopes/{uuid}/', get('/envelopes/{}/'.format(envelopes[0].uuid))),
+        'PUT /envelopes/{uuid}/': Scenario('put', '/envelopes/{uuid}/', update_envelope),
+        'PATCH /envelopes/{uuid}/': Scenario('patch', '/envelopes/{uuid}/', update_envelope),
+        'DELETE /envelopes/{uuid}/': Scenario('delete', '/envelopes/{uuid}/', delete_envelope),
+        'GET /envelopes/{uuid}/balance/': Scenario(
+            'get', '/envelopes/{uuid}/balance/', get('/envelopes/{}/balance/?at={}'.format(
+                envelopes[0].uuid, month.isoformat()))),
+        'POST /envelopes/{uuid}/deposit/': Scenario(
+            'post', '/envelopes/{uuid}/deposit/', change_balance),
+        'POST /envelopes/{uuid}/withdraw/': Scenario(
+            'post', '/envelopes/{uuid}/withdraw/', change_balance),
+        'POST /envelopes/movements/': Scenario('post', '/envelopes/movements/', move_funds),
+        'POST /envelopes/transfers/': Scenario('post', '/envelopes/transfers/', transfer_funds),
+        'GET /transactions/': Scenario('get', '/transactions/', get(
+            '/transactions/?since={}'.format(month.date().isoformat()))),
+        'GET /transactions/export': Scenario(
+            'get', '/transactions/export', get('/transactions/export?format=ndjson')),
+        'POST /transactions/import': Scenario('post', '/transactions/import', import_statement),
+        'GET /transactions/{friendly_id}/': Scenario(
+            'get', '/transactions/{friendly_id}/', get('/transactions/{}/?since={}'.format(
+                latest.friendly_id, month.date().isoformat()))),
+    }
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors=None):
+    """
+    Throughput and latency percentiles (in milliseconds) for one measurement.
+    """
+    ordered = sorted(latencies)
+    errors = Counter() if errors is None else errors
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'errors': dict(errors),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(len(ordered) / elapsed, 1) if elapsed else None,
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p90_ms': ms(percentile(ordered, 0.90)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'max_ms': ms(ordered[-1] if ordered else None),
+    }
+
+
+def measure_route(client, scenario, requests, warmup=5):
+    """
+    Issue `requests` sequential requests for `scenario` and summarize them.
+
+    Responses with a status of 400 or above are counted as errors by status.
+    """
+    send = getattr(client, scenario.method)
+    for i in range(warmup):
+        url, kwargs = scenario.prepare(i)
+        send(url, **kwargs)
+    latencies = []
+    errors = Counter()
+    elapsed = 0
+    for i in range(warmup, warmup + requests):
+        url, kwargs = scenario.prepare(i)
+        started = time.perf_counter()
+        response = send(url, **kwargs)
+        if scenario.method == 'get':
+            response.content
+        took = time.perf_counter() - started
+        elapsed += took
+        if response.status_code >= 400:
+            errors[str(response.status_code)] += 1
+        else:
+            latencies.append(took)
+    return summarize(latencies, elapsed, errors)
+
+
+def run_writers(dataset, writers, operations, hot_envelopes=1, optimistic=False):
+    """
+    Run `writers` threads, each alternating `operations` deposits and
+    withdrawals through `Envelope.deposit`/`Envelope.withdraw`.
+
+    All threads write to the first `hot_envelopes` seeded envelopes, so a
+    small number measures contention on one row. Returns one summary for
+    deposits, one for withdrawals and the combined throughput.
+    """
+    user = dataset.users[0]
+    targets = [envelope.uuid for envelope in dataset.envelopes[:hot_envelopes]]
+    category = dataset.categories[0]
+    latencies = {'deposit': [], 'withdraw': []}
+    errors = {'deposit': Counter(), 'withdraw': Counter()}
+    lock = threading.Lock()
+    start = threading.Barrier(writers + 1)
+
+    def write(worker):
+        local = {'deposit': [], 'withdraw': []}
+        failed = {'deposit': Counter(), 'withdraw': Counter()}
+        try:
+            start.wait()
+            for i in range(operations):
+                uuid = targets[(worker + i) % len(targets)]
+                kind = 'deposit' if i % 2 == 0 else 'withdraw'
+                started = time.perf_counter()
+                try:
+                    if kind == 'deposit':
+                        Envelope.deposit(
+                            uuid, user, Decimal('1.00'), datetime.now(), optimistic=optimistic)
+                    else:
+                        Envelope.withdraw(
+                            uuid, user, Decimal('1.00'), datetime.now(), category=category,
+                            optimistic=optimistic)
+                except Exception as e:
+                    failed[kind][type(e).__name__] += 1
+                else:
+                    local[kind].append(time.perf_counter() - started)
+        finally:
+            connection.close()
+        with lock:
+            for kind in local:
+                latencies[kind].extend(local[kind])
+                errors[kind].update(failed[kind])
+
+    threads = [threading.Thread(target=write, args=(worker, )) for worker in range(writers)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'writers': writers,
+        'operations_per_writer': operations,
+        'hot_envelopes': len(targets),
+        'optimistic': optimistic,
+        'deposit': summarize(latencies['deposit'], elapsed, errors['deposit']),
+        'withdraw': summarize(latencies['withdraw'], elapsed, errors['withdraw']),
+        'throughput_per_s': round(
+            (len(latencies['deposit']) + len(latencies['withdraw'])) / elapsed, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'database_version': getattr(connection, 'pg_version', None),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+COMPARED = (('p50_ms', 1), ('p99_ms', 1), ('throughput_per_s', -1))
+
+
+def compare(baseline, current):
+    """
+    Relative change of every route and writer metric present in both reports.
+
+    Returns `(name, metric, before, after, regression)` rows where
+    `regression` is positive when `current` is slower than `baseline`.
+    """
+    def metrics(report):
+        found = {}
+        for key, summary in report.get('routes', {}).items():
+            found[key] = summary
+        for key in ('deposit', 'withdraw'):
+            if key in report.get('writers', {}):
+                found['writers ' + key] = report['writers'][key]
+        return found
+
+    before, after = metrics(baseline), metrics(current)
+    rows = []
+    for name in sorted(set(before) & set(after)):
+        for metric, sign in COMPARED:
+            old, new = before[name].get(metric), after[name].get(metric)
+            if not old or new is None:
+                continue
+            rows.append((name, metric, old, new, sign * (new - old) / old))
+    return rows
@@ -0,0 +1,119 @@
+"""
+Load driver for the Envelopes API.
+
+    python -m benchmarks.load [--users N] [--accounts N] [--envelopes N]
+                              [--years N] [--per-month N] [--requests N]
+                              [--writers N] [--operations N] [--hot-envelopes N]
+                              [--optimistic] [--keepdb] [--output PATH]
+                              [--baseline PATH] [--max-regression FRACTION]
+
+Seeds a throwaway copy of the configured database (PostgreSQL, or SQLite
+with `DB_ENGINE=django.db.backends.sqlite3`), times every route in `app.py`
+through the WSGI app and runs concurrent writers against
+`Envelope.deposit`/`Envelope.withdraw`. The JSON report is written to
+`--output`; given a `--baseline` report, changes are printed and the exit
+status is non-zero when any metric regressed by more than `--max-regression`.
+"""
+# Standard Library Imports
+import argparse
+import json
+import sys
+import time
+
+# Third Party Library Imports
+from apistar import TestClient
+
+# First Party Library Imports
+from app import app
+
+# Local Imports
+from .factories import seed
+from .harness import (auth_header, benchmark_database, compare, environment,
+                      measure_route, route_keys, route_scenarios, run_writers)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--accounts', type=int, default=2, help='accounts per user')
+    parser.add_argument('--envelopes', type=int, default=10, help='envelopes per account')
+    parser.add_argument('--years', type=int, default=3, help='years of transactions')
+    parser.add_argument('--per-month', type=int, default=30, help='transactions per envelope')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=100, help='operations per writer')
+    parser.add_argument('--hot-envelopes', type=int, default=1)
+    parser.add_argument('--optimistic', action='store_true')
+    parser.add_argument('--keepdb', action='store_true')
+    parser.add_argument('--output', default='benchmark-report.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--max-regression', type=float, default=0.25)
+    return parser.parse_args(argv)
+
+
+def run(args):
+    report = {'environment': environment(), 'parameters': vars(args).copy()}
+    started = time.perf_counter()
+    dataset = seed(
+        users=args.users, accounts=args.accounts, envelopes=args.envelopes, years=args.years,
+        per_month=args.per_month)
+    report['seed'] = {
+        'users': len(dataset.users),
+        'accounts': len(dataset.accounts),
+        'envelopes': len(dataset.envelopes),
+        'transactions': dataset.transactions,
+        'elapsed_s': round(time.perf_counter() - started, 3),
+    }
+    print('seeded {transactions} transactions in {elapsed_s}s'.format(**report['seed']))
+
+    client = TestClient(app)
+    client.headers.update(auth_header(dataset.users[0]))
+    scenarios = route_scenarios(dataset)
+    report['routes'] = {}
+    for key in route_keys():
+        if key not in scenarios:
+            print('{:<36} no scenario, skipped'.format(key))
+            continue
+        try:
+            summary = measure_route(client, scenarios[key], args.requests)
+        except Exception as e:
+            # e.g. PostgreSQL-only SQL when running against the SQLite stand-in
+            report['routes'][key] = {'failed': '{}: {}'.format(type(e).__name__, e)}
+            print('{:<36} failed: {}'.format(key, report['routes'][key]['failed']))
+            continue
+        report['routes'][key] = summary
+        print('{:<36} {throughput_per_s:>8} req/s  p50 {p50_ms} ms  p99 {p99_ms} ms'.format(
+            key, **summary))
+    report['unmeasured_routes'] = [key for key in route_keys() if key not in scenarios]
+
+    report['writers'] = run_writers(
+        dataset, args.writers, args.operations, hot_envelopes=args.hot_envelopes,
+        optimistic=args.optimistic)
+    print('{:<36} {throughput_per_s:>8} ops/s'.format(
+        '{} writers'.format(args.writers), **report['writers']))
+    return report
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with benchmark_database(keepdb=args.keepdb):
+        report = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print('report written to {}'.format(args.output))
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressed = False
+    for name, metric, before, after, change in compare(baseline, report):
+        flag = change > args.max_regression
+        regressed = regressed or flag
+        print('{:<36} {:<17} {:>10} -> {:>10} {:>+7.1%}{}'.format(
+            name, metric, before, after, change, '  REGRESSION' if flag else ''))
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
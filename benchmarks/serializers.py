@@ -0,0 +1,65 @@
+"""
+Compare marshmallow `dump()` with the compiled read serializers.
+
+    python -m benchmarks.serializers [--rows N] [--repeat N]
+
+Rows are built in memory, so no database is needed; the compiled path is
+given the `values_list()` tuples it receives in the views.
+"""
+# Standard Library Imports
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# First Party Library Imports
+import app  # noqa; F401
+from envelopes.models import Transaction
+from envelopes.views import transaction_schema, transaction_serializer
+
+
+def build_rows(count):
+    started = datetime(2015, 1, 1)
+    return [
+        Transaction(
+            id=i, friendly_id='TX{:08d}'.format(i), user_id=1, envelope_id=i % 20 + 1,
+            created=started + timedelta(minutes=i), action_type=Transaction.ACTION_TYPE_WITHDRAWN,
+            delta=Decimal(i % 10000) / 100, description='Groceries', category_id=i % 12 or None,
+            comment='', transfer_id=uuid.uuid4() if i % 50 == 0 else None)
+        for i in range(1, count + 1)
+    ]
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    objects = build_rows(args.rows)
+    tuples = [
+        tuple(getattr(obj, column) for column in transaction_serializer.columns)
+        for obj in objects
+    ]
+    assert transaction_serializer.dump_many(tuples) == transaction_schema.dump(
+        objects, many=True).data
+
+    marshmallow = best_of(args.repeat, lambda: transaction_schema.dump(objects, many=True))
+    compiled = best_of(args.repeat, lambda: transaction_serializer.dump_many(tuples))
+    print('{:<12} {:>9.1f} ms'.format('marshmallow', marshmallow * 1000))
+    print('{:<12} {:>9.1f} ms'.format('compiled', compiled * 1000))
+    print('{:<12} {:>9.1f}x'.format('speedup', marshmallow / compiled))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,33 @@
 import os
-from apistar_jwt.authentication import JWTAuthentication
+from envelopes.authentication import CachedJWTAuthentication
+
+# Pooled PostgreSQL in production; benchmarks may point DB_ENGINE at SQLite as a stand-in.
+DB_ENGINE = os.environ.get('DB_ENGINE') or 'envelopes.db.postgresql_pool'
+# Seconds a thread keeps its connection between requests. With the pooled
+# engine leave this at 0: closing returns the connection to the pool.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE') or 0)
+DB_POOL = {
+    'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE') or 1),
+    'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE') or 32),
+    'MAX_LIFETIME': float(os.environ.get('DB_POOL_MAX_LIFETIME') or 1800),
+    'CHECK_INTERVAL': float(os.environ.get('DB_POOL_CHECK_INTERVAL') or 30),
+    'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT') or 10),
+}
 
 settings = {
-    'AUTHENTICATION': [JWTAuthentication()],
+    'AUTHENTICATION': [CachedJWTAuthentication(
+        max_size=int(os.environ.get('JWT_CACHE_SIZE', 10000)),
+        max_age=int(os.environ.get('JWT_CACHE_MAX_AGE', 300)),
+    )],
     'DATABASES': {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': DB_ENGINE,
             'NAME': os.environ.get('DB_NAME'),
             'HOST': os.environ.get('DB_HOST'),
             'USER': os.environ.get('DB_USER'),
             'PASSWORD': os.environ.get('DB_PASS'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'POOL': DB_POOL,
         },
     },
     'INSTALLED_APPS': [
@@ -31,6 +49,19 @@ settings = {
         # include other password validators here
     ],
     'HASHIDS_SALT': os.environ.get('HASHIDS_SALT'),
+    'FRIENDLY_ID_WORKER': os.environ.get('FRIENDLY_ID_WORKER'),
+    'SLOW_REQUEST_SECONDS': os.environ.get('SLOW_REQUEST_SECONDS'),
+    'SLOW_REQUEST_SAMPLES': os.environ.get('SLOW_REQUEST_SAMPLES'),
+    'ROW_CACHE_BACKEND': os.environ.get('ROW_CACHE_BACKEND'),
+    'ROW_CACHE_SIZE': os.environ.get('ROW_CACHE_SIZE'),
+    'ROW_CACHE_TIMEOUT': os.environ.get('ROW_CACHE_TIMEOUT'),
+    'CATEGORY_MAP_MAX_AGE': os.environ.get('CATEGORY_MAP_MAX_AGE'),
+    'IDEMPOTENCY_KEY_TTL': os.environ.get('IDEMPOTENCY_KEY_TTL'),
+    'IDEMPOTENCY_CACHE_SIZE': os.environ.get('IDEMPOTENCY_CACHE_SIZE'),
+    'IDEMPOTENCY_WAIT': os.environ.get('IDEMPOTENCY_WAIT'),
+    'LEDGER_GROUP_COMMIT_WINDOW': os.environ.get('LEDGER_GROUP_COMMIT_WINDOW'),
+    'LEDGER_GROUP_COMMIT_MAX_BATCH': os.environ.get('LEDGER_GROUP_COMMIT_MAX_BATCH'),
+    'OPTIMISTIC_LEDGER_WRITES': os.environ.get('OPTIMISTIC_LEDGER_WRITES'),
     'SECRET_KEY': os.environ.get('SECRET_KEY'),
     'JWT': {
         'SECRET': os.environ.get('JWT_SECRET'),
@@ -40,11 +71,13 @@ settings = {
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': DB_ENGINE,
         'NAME': os.environ.get('DB_NAME'),
         'HOST': os.environ.get('DB_HOST'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'POOL': DB_POOL,
     },
 }
 
@@ -68,5 +101,36 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 HASHIDS_SALT = os.environ.get('HASHIDS_SALT')
+FRIENDLY_ID_WORKER = os.environ.get('FRIENDLY_ID_WORKER')
+SLOW_REQUEST_SECONDS = os.environ.get('SLOW_REQUEST_SECONDS')
+SLOW_REQUEST_SAMPLES = os.environ.get('SLOW_REQUEST_SAMPLES')
+
+# An alias in CACHES shared by every process; 'local' keeps rows in an in-process LRU, which is
+# only correct for a single process. Unset, rows are not cached.
+ROW_CACHE_BACKEND = os.environ.get('ROW_CACHE_BACKEND')
+ROW_CACHE_SIZE = os.environ.get('ROW_CACHE_SIZE')
+ROW_CACHE_TIMEOUT = os.environ.get('ROW_CACHE_TIMEOUT')
+# Seconds before a process reloads its category map when ROW_CACHE_BACKEND is unset, so other
+# processes' category changes show up.
+CATEGORY_MAP_MAX_AGE = os.environ.get('CATEGORY_MAP_MAX_AGE')
+
+IDEMPOTENCY_KEY_TTL = os.environ.get('IDEMPOTENCY_KEY_TTL')
+IDEMPOTENCY_CACHE_SIZE = os.environ.get('IDEMPOTENCY_CACHE_SIZE')
+IDEMPOTENCY_WAIT = os.environ.get('IDEMPOTENCY_WAIT')
+
+# Milliseconds deposits and withdrawals wait to share a commit; unset or 0 commits each alone.
+LEDGER_GROUP_COMMIT_WINDOW = os.environ.get('LEDGER_GROUP_COMMIT_WINDOW')
+LEDGER_GROUP_COMMIT_MAX_BATCH = os.environ.get('LEDGER_GROUP_COMMIT_MAX_BATCH')
+
+# Set to check envelope versions instead of locking; rollups then need `apistar fold_rollups`.
+OPTIMISTIC_LEDGER_WRITES = os.environ.get('OPTIMISTIC_LEDGER_WRITES')
+
+CACHES = {
+    'default': {
+        'BACKEND': (os.environ.get('CACHE_BACKEND') or
+                    'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION') or '',
+    },
+}
 SECRET_KEY = os.environ.get('SECRET_KEY')
 JWT_SECRET = os.environ.get('JWT_SECRET')
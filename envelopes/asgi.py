@@ -0,0 +1,173 @@
+# Standard Library Imports
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Third Party Library Imports
+from django.db import connections
+
+RESPONSE_BUFFER = 8
+_DONE = object()
+
+
+def environ_from_scope(scope, body):
+    """
+    Build a WSGI environ for an ASGI HTTP `scope` and its complete `body`.
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        if name in environ:
+            value = environ[name] + ',' + value
+        environ[name] = value
+    # the body is already complete, so this also covers chunked uploads
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+class ASGIAdapter:
+    """
+    Serves a WSGI app over ASGI 3 from a bounded thread pool.
+
+    The event loop only moves bytes, so one process can hold hundreds of
+    requests in flight while at most `max_workers` of them run application
+    code (and hold a database connection) at a time. A response is produced
+    entirely on one pool thread, including the body of streamed responses,
+    because Django connections and server-side cursors belong to the thread
+    that opened them. Chunks are handed to the loop through a small bounded
+    buffer, so a slow client pauses its stream instead of buffering it.
+    """
+
+    def __init__(self, wsgi_app, max_workers=32):
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.closed = False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope type {!r}'.format(scope['type']))
+
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue(maxsize=RESPONSE_BUFFER)
+        abandoned = threading.Event()
+        environ = environ_from_scope(scope, b''.join(body))
+        job = loop.run_in_executor(
+            self.executor, self.run_wsgi, environ, loop, queue, abandoned)
+        started = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if started:
+                    await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+                    continue
+                status, headers = item
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                started = True
+        finally:
+            abandoned.set()
+            # keep draining so a worker blocked on a full buffer can finish
+            while not job.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.wait({job}, timeout=0.05)
+        # re-raise application errors so the server answers 500 or drops the stream
+        job.result()
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    def run_wsgi(self, environ, loop, queue, abandoned):
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                [name.lower().encode('latin-1'), value.encode('latin-1')]
+                for name, value in headers
+            ]
+
+        try:
+            iterable = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in iterable:
+                    if abandoned.is_set():
+                        break
+                    if response:
+                        put((response.pop('status'), response.pop('headers')))
+                    if chunk:
+                        put(chunk)
+                if response:
+                    put((response.pop('status'), response.pop('headers')))
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        finally:
+            if not abandoned.is_set():
+                put(_DONE)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def close(self):
+        """
+        Close every pool thread's database connections and stop the pool.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        # one task per thread: the barrier keeps each thread busy until all have one
+        barrier = threading.Barrier(self.max_workers)
+
+        def close_connections():
+            barrier.wait()
+            connections.close_all()
+
+        for future in [self.executor.submit(close_connections) for _ in range(self.max_workers)]:
+            future.result()
+        self.executor.shutdown(wait=True)
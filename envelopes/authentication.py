@@ -0,0 +1,91 @@
+# Standard Library Imports
+import hashlib
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+# Third Party Library Imports
+import jwt
+from apistar import http
+from apistar.types import Settings
+from apistar_jwt.authentication import JWTAuthentication
+
+
+class CachedJWTAuthentication:
+    """
+    Memoizes a wrapped authenticator's verified result per bearer token.
+
+    Entries are keyed by the SHA-256 digest of the Authorization header, kept
+    in a bounded LRU and dropped once the token's `exp` claim passes (or
+    after `max_age` seconds for tokens without one), so a cached identity is
+    never returned for an expired token. Failed authentications are not
+    cached; the wrapped authenticator raises for them on every attempt.
+    """
+
+    def __init__(self, authentication=None, max_size=10000, max_age=300, clock=time.time):
+        self.authentication = JWTAuthentication() if authentication is None else authentication
+        self.max_size = max_size
+        self.max_age = max_age
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._expiries = []
+        self._lock = threading.Lock()
+
+    def authenticate(self, authorization: http.Header, settings: Settings):
+        if authorization is None:
+            return self.authentication.authenticate(authorization, settings)
+        key = hashlib.sha256(authorization.encode('utf-8')).digest()
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        auth = self.authentication.authenticate(authorization, settings)
+        expires = self.expires_at(auth, now)
+        if expires > now:
+            with self._lock:
+                self._entries[key] = (auth, expires)
+                heapq.heappush(self._expiries, (expires, key))
+                self._evict(now)
+        return auth
+
+    def expires_at(self, auth, now):
+        expires = now + self.max_age
+        try:
+            claims = jwt.decode(auth.token, verify=False)
+        except jwt.InvalidTokenError:
+            return now
+        if 'exp' in claims:
+            expires = min(expires, claims['exp'])
+        return expires
+
+    def _evict(self, now):
+        while self._expiries and self._expiries[0][0] <= now:
+            expires, key = heapq.heappop(self._expiries)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == expires:
+                del self._entries[key]
+                self.evictions += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        if len(self._expiries) > 2 * self.max_size:
+            self._expiries = [(entry[1], key) for key, entry in self._entries.items()]
+            heapq.heapify(self._expiries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+            }
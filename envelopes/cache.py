@@ -0,0 +1,236 @@
+# Standard Library Imports
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Third Party Library Imports
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction as db_transaction
+
+DEFAULT_TIMEOUT = object()
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU with per-entry expiry.
+
+    Implements the subset of Django's cache API that `RowCache` uses, so a
+    Django cache (memcached, redis, ...) can be swapped in for it. A
+    `timeout` of `None` means the entry only leaves by LRU eviction.
+    """
+
+    def __init__(self, max_size=10000, timeout=60, clock=time.monotonic):
+        self.max_size = max_size
+        self.default_timeout = timeout
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expires(self, timeout):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        return None if timeout is None else self.clock() + timeout
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key, value, expires):
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._get(key, self.clock())
+        return default if value is None else value
+
+    def get_many(self, keys):
+        now = self.clock()
+        with self._lock:
+            values = {key: self._get(key, now) for key in keys}
+        return {key: value for key, value in values.items() if value is not None}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        expires = self._expires(timeout)
+        with self._lock:
+            self._set(key, value, expires)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT):
+        expires = self._expires(timeout)
+        with self._lock:
+            for key, value in data.items():
+                self._set(key, value, expires)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        expires = self._expires(timeout)
+        with self._lock:
+            if self._get(key, self.clock()) is not None:
+                return False
+            self._set(key, value, expires)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RowCache:
+    """
+    Read-through cache of serialized rows keyed by `(owner, uuid)`.
+
+    Every data key embeds two generation tokens, one for the row and one
+    for its owner. Writers replace a token with a fresh random one instead
+    of deleting entries, so anything cached under the old token (including
+    a value a concurrent reader loaded before the write committed) can no
+    longer be reached. Tokens are replaced when the write happens and again
+    when its transaction commits. A lost token is recreated with a new
+    random value, never a reused one, so eviction cannot resurrect an old
+    entry.
+
+    Readers must call `get` before loading the row from the database and
+    store it with the key `get` returned.
+
+    The tokens only keep reads fresh if every process sees the same ones,
+    so the backend must be shared by all of them. With no backend nothing
+    is cached and every `get` misses.
+    """
+
+    def __init__(self, backend, timeout=60, prefix='rows'):
+        self.backend = backend
+        self.timeout = timeout
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def generation_key(self, kind, value):
+        return '{}:gen:{}:{}'.format(self.prefix, kind, value)
+
+    def generations(self, keys):
+        tokens = self.backend.get_many(keys)
+        for key in keys:
+            if key not in tokens:
+                token = uuid.uuid4().hex
+                if not self.backend.add(key, token, None):
+                    token = self.backend.get(key) or token
+                tokens[key] = token
+        return tokens
+
+    def get(self, kind, owner, uuid_):
+        """
+        Return `(key, value)`; `value` is `None` on a miss.
+        """
+        if not self.enabled:
+            self.misses += 1
+            return None, None
+        try:
+            uuid_ = uuid.UUID(str(uuid_))
+            owner = int(owner)
+        except (TypeError, ValueError):
+            return None, None
+        row_key = self.generation_key(kind, uuid_.hex)
+        owner_key = self.generation_key('owner', owner)
+        tokens = self.generations([row_key, owner_key])
+        key = '{}:{}:{}:{}:{}:{}'.format(
+            self.prefix, kind, owner, uuid_.hex, tokens[owner_key], tokens[row_key])
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key, value
+
+    def set(self, key, value):
+        if key is not None and value is not None:
+            self.backend.set(key, value, self.timeout)
+
+    def _bump(self, keys):
+        self.backend.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+    def invalidate(self, kind, *uuids):
+        self._invalidate([self.generation_key(kind, uuid.UUID(str(u)).hex) for u in uuids])
+
+    def invalidate_owner(self, owner):
+        self._invalidate([self.generation_key('owner', int(owner))])
+
+    def table_version(self, table):
+        """
+        Return the current version stamp of a whole `table`, or `None` when
+        there is no shared backend to keep one in.
+        """
+        if not self.enabled:
+            return None
+        key = self.generation_key('table', table)
+        return self.generations([key])[key]
+
+    def invalidate_table(self, table):
+        """
+        Replace the version stamp of `table` once the current transaction
+        commits; a rolled back change leaves it as it was.
+        """
+        if not self.enabled:
+            return
+        keys = [self.generation_key('table', table)]
+        db_transaction.on_commit(lambda: self._bump(keys))
+
+    def _invalidate(self, keys):
+        if not keys or not self.enabled:
+            return
+        self._bump(keys)
+        # Outside an atomic block this runs immediately.
+        db_transaction.on_commit(lambda: self._bump(keys))
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def backend_from_settings():
+    """
+    The row cache backend named by `ROW_CACHE_BACKEND`: an alias in `CACHES`
+    that every process shares (memcached, redis, ...), or `local` for an
+    in-process LRU, which is only correct when a single process serves the
+    database. Unset, the row cache is off.
+    """
+    alias = getattr(settings, 'ROW_CACHE_BACKEND', None)
+    if not alias:
+        return None
+    if alias == 'local':
+        return LocalCache(
+            max_size=int(getattr(settings, 'ROW_CACHE_SIZE', None) or 10000),
+            timeout=None,
+        )
+    backend = caches[alias]
+    if isinstance(backend, (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            'ROW_CACHE_BACKEND "{}" is not shared between processes'.format(alias))
+    return backend
+
+
+row_cache = RowCache(
+    backend_from_settings(),
+    timeout=int(getattr(settings, 'ROW_CACHE_TIMEOUT', None) or 60),
+)
@@ -0,0 +1,116 @@
+# Standard Library Imports
+import threading
+import time
+from types import MappingProxyType
+
+# Third Party Library Imports
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Local Imports
+from .cache import row_cache
+from .models import Category
+
+TABLE = 'category'
+MAX_AGE = float(getattr(settings, 'CATEGORY_MAP_MAX_AGE', None) or 60)
+
+
+class CategoryMap:
+    """
+    Immutable snapshot of the `Category` table at one `version`.
+
+    `by_id` maps id to name and `by_name` name to id. Both are read-only
+    views, so a snapshot can be shared by every thread without locking.
+    """
+
+    __slots__ = ('version', 'loaded_at', 'by_id', 'by_name')
+
+    def __init__(self, version, rows, loaded_at=0.0):
+        by_id = dict(rows)
+        self.version = version
+        self.loaded_at = loaded_at
+        self.by_id = MappingProxyType(by_id)
+        self.by_name = MappingProxyType({name: pk for pk, name in by_id.items()})
+
+    def __contains__(self, pk):
+        return pk in self.by_id
+
+    def __len__(self):
+        return len(self.by_id)
+
+
+class CategoryIndex:
+    """
+    Process-wide, preloaded `CategoryMap`.
+
+    Checking freshness never costs a query. Creating, updating or deleting
+    a category bumps the table's version when its transaction commits, and
+    the next caller then reloads the whole table with one query. Changes
+    made with `QuerySet.update()` or `bulk_create()` send no signals and
+    must call `invalidate()` themselves.
+
+    With a row cache backend the version is a stamp kept in it, so every
+    process sees every change. Without one it is a counter in this
+    process, which only sees its own changes; other processes' show up once
+    the map is `max_age` seconds old.
+    """
+
+    def __init__(self, cache=row_cache, max_age=MAX_AGE, clock=time.monotonic):
+        self.cache = cache
+        self.max_age = max_age
+        self.clock = clock
+        self.loads = 0
+        self._generation = 0
+        self._map = CategoryMap(None, ())
+        self._lock = threading.Lock()
+
+    def _version(self):
+        if self.cache.enabled:
+            return self.cache.table_version(TABLE)
+        return self._generation
+
+    def _fresh(self, snapshot, version):
+        if snapshot.version != version:
+            return False
+        return self.cache.enabled or self.clock() - snapshot.loaded_at < self.max_age
+
+    def current(self):
+        version = self._version()
+        snapshot = self._map
+        if self._fresh(snapshot, version):
+            return snapshot
+        with self._lock:
+            if not self._fresh(self._map, version):
+                self._map = CategoryMap(
+                    version, Category.objects.values_list('id', 'name'), self.clock())
+                self.loads += 1
+            return self._map
+
+    def _bump(self):
+        with self._lock:
+            self._generation += 1
+
+    def invalidate(self):
+        """
+        Bump the table's version once the current transaction commits; a
+        rolled back change leaves it as it was.
+        """
+        if self.cache.enabled:
+            self.cache.invalidate_table(TABLE)
+        else:
+            db_transaction.on_commit(self._bump)
+
+
+category_index = CategoryIndex()
+
+
+def category_map():
+    return category_index.current()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    category_index.invalidate()
@@ -0,0 +1,100 @@
+# Standard Library Imports
+from datetime import datetime
+
+# Third Party Library Imports
+from apistar import Command, exceptions
+from dateutil import parser as date_parser
+
+# Local Imports
+from . import idempotency, partitions
+from .models import AccountRollup, BalanceSnapshot, LedgerNotSettled
+
+
+def partition_transactions(months_ahead: int=3):
+    """
+    Partition transactions by month and create the upcoming partitions.
+
+    months_ahead: Months after the current one to create partitions for.
+    """
+    converted, created = partitions.partition(months_ahead=months_ahead)
+    lines = ['Partitioned {}.'.format(partitions.TABLE)] if converted else []
+    lines.extend('Created {}.'.format(name) for name in created)
+    return '\n'.join(lines or ['Partitions are up to date.'])
+
+
+def archive_transactions(directory: str='archive', retention_months: int=24):
+    """
+    Archive transaction partitions older than the retention window.
+
+    directory: Where the gzipped CSV files are written.
+    retention_months: Months before the current one to keep in the database.
+    """
+    paths = partitions.archive(directory, retention_months=retention_months)
+    return '\n'.join(['Archived {}.'.format(path) for path in paths] or ['Nothing to archive.'])
+
+
+def restore_transactions(path: str):
+    """
+    Restore an archived transaction partition.
+
+    path: File written by archive_transactions.
+    """
+    count = partitions.restore(path)
+    return 'Restored {} transactions from {}.'.format(count, path)
+
+
+def snapshot_balances(as_of: str=''):
+    """
+    Snapshot every envelope balance for point-in-time balance reads.
+
+    as_of: Time the snapshot is taken at, midnight today by default.
+    """
+    cutoff = date_parser.parse(as_of) if as_of else datetime.combine(
+        datetime.now().date(), datetime.min.time())
+    try:
+        count = BalanceSnapshot.take(cutoff)
+    except LedgerNotSettled as e:
+        raise exceptions.CommandLineError(str(e))
+    return 'Snapshotted {} envelopes as of {}.'.format(count, cutoff.isoformat())
+
+
+def reconcile_balances(full: bool=False):
+    """
+    Check every envelope balance against its ledger.
+
+    full: Sum the whole ledger instead of starting from the latest snapshots.
+    """
+    mismatches = BalanceSnapshot.reconcile(full=full)
+    if mismatches:
+        raise exceptions.CommandLineError('\n'.join(
+            'Envelope {} ({}) has balance {} but its ledger sums to {}.'.format(
+                uuid, pk, balance, ledger)
+            for pk, uuid, balance, ledger in mismatches))
+    return 'All envelope balances match their ledgers.'
+
+
+def fold_rollups():
+    """
+    Fold pending account rollup deltas into the account rollups.
+    """
+    count = AccountRollup.fold()
+    return 'Folded {} rollup deltas.'.format(count)
+
+
+def purge_idempotency_keys():
+    """
+    Delete stored responses to Idempotency-Key requests that have expired.
+    """
+    count = idempotency.purge()
+    return 'Purged {} idempotency keys.'.format(count)
+
+
+commands = [
+    Command('partition_transactions', partition_transactions),
+    Command('archive_transactions', archive_transactions),
+    Command('restore_transactions', restore_transactions),
+    Command('snapshot_balances', snapshot_balances),
+    Command('reconcile_balances', reconcile_balances),
+    Command('fold_rollups', fold_rollups),
+    Command('purge_idempotency_keys', purge_idempotency_keys),
+]
@@ -0,0 +1,325 @@
+# Standard Library Imports
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Tuple
+
+# Third Party Library Imports
+import psycopg2 as Database
+from psycopg2 import extensions
+
+# Local Imports
+from ..instrumentation import format_metric
+
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolTimeout(Database.OperationalError):
+    """
+    No connection became free within the pool's `timeout`.
+
+    Subclasses psycopg2's `OperationalError`, so Django reraises it as
+    `django.db.OperationalError` like any other failure to connect.
+    """
+
+
+class PooledConnection:
+    __slots__ = ('pool', 'connection', 'created', 'last_used')
+
+    def __init__(self, pool, connection, now):
+        self.pool = pool
+        self.connection = connection
+        self.created = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections opened by `connect()`.
+
+    `getconn` hands out the most recently used idle connection, opens a new
+    one while fewer than `max_size` exist, and otherwise waits up to
+    `timeout` seconds for one to be returned. A connection idle for longer
+    than `check_interval` is pinged before being handed out, and one older
+    than `max_lifetime` is closed instead of being reused. `putconn` rolls
+    back anything left open and drops connections that are closed or broken.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, max_lifetime=1800.0,
+                 check_interval=30.0, timeout=10.0, label=None, clock=time.monotonic):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError('Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1')
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.label = label or {}
+        self.clock = clock
+        self.closed = False
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.wait_count = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.opened = 0
+        self.discarded = Counter()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.opened += 1
+        return PooledConnection(self, connection, self.clock())
+
+    def _discard(self, pooled, reason):
+        try:
+            pooled.connection.close()
+        except Database.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            self.discarded[reason] += 1
+            self._condition.notify()
+
+    def _observe_wait(self, waited):
+        with self._condition:
+            self.wait_count += 1
+            self.wait_seconds += waited
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    self.wait_buckets[index] += 1
+
+    def _expired(self, pooled, now):
+        return self.max_lifetime is not None and now - pooled.created >= self.max_lifetime
+
+    def _is_healthy(self, pooled):
+        connection = pooled.connection
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Database.Error:
+            return False
+        return True
+
+    def fill(self):
+        """
+        Open connections until `min_size` exist.
+        """
+        while True:
+            with self._condition:
+                if self.closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            pooled = self._open()
+            with self._condition:
+                self._idle.appendleft(pooled)
+                self._condition.notify()
+
+    def getconn(self):
+        started = self.clock()
+        deadline = started + self.timeout
+        while True:
+            stale = []
+            pooled = None
+            with self._condition:
+                while pooled is None:
+                    if self.closed:
+                        raise Database.InterfaceError('connection pool is closed')
+                    now = self.clock()
+                    while self._idle:
+                        candidate = self._idle.pop()
+                        if self._expired(candidate, now):
+                            stale.append(candidate)
+                        else:
+                            pooled = candidate
+                            break
+                    if pooled is not None:
+                        break
+                    if self._size - len(stale) < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            'no database connection available within {}s '
+                            '(max_size={})'.format(self.timeout, self.max_size))
+                    self._condition.wait(remaining)
+                self._in_use += 1
+            for candidate in stale:
+                self._discard(candidate, 'lifetime')
+            if pooled is None:
+                try:
+                    pooled = self._open()
+                except BaseException:
+                    with self._condition:
+                        self._in_use -= 1
+                    raise
+            elif (self.check_interval is not None and
+                    self.clock() - pooled.last_used >= self.check_interval and
+                    not self._is_healthy(pooled)):
+                with self._condition:
+                    self._in_use -= 1
+                self._discard(pooled, 'health_check')
+                continue
+            self._observe_wait(self.clock() - started)
+            return pooled
+
+    def putconn(self, pooled):
+        connection = pooled.connection
+        reason = None
+        if self.closed:
+            reason = 'pool_closed'
+        elif connection.closed:
+            reason = 'broken'
+        elif self._expired(pooled, self.clock()):
+            reason = 'lifetime'
+        else:
+            status = connection.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                reason = 'broken'
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except Database.Error:
+                    reason = 'broken'
+        with self._condition:
+            self._in_use -= 1
+        if reason is not None:
+            self._discard(pooled, reason)
+            return
+        pooled.last_used = self.clock()
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def close(self):
+        """
+        Close idle connections now and the rest as they are returned.
+        """
+        with self._condition:
+            self.closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._condition.notify_all()
+        for pooled in idle:
+            self._discard(pooled, 'pool_closed')
+
+    def samples(self):
+        """
+        Current values of every `POOL_METRICS` entry, labelled with `label`.
+        """
+        with self._condition:
+            label = tuple(sorted(self.label.items()))
+            wait = [
+                ('_bucket', label + (('le', bound), ), count)
+                for bound, count in zip(WAIT_BUCKETS, self.wait_buckets)
+            ]
+            wait.extend([
+                ('_bucket', label + (('le', '+Inf'), ), self.wait_count),
+                ('_sum', label, self.wait_seconds),
+                ('_count', label, self.wait_count),
+            ])
+            return {
+                'envelopes_db_pool_connections': [
+                    ('', label + (('state', 'idle'), ), len(self._idle)),
+                    ('', label + (('state', 'in_use'), ), self._in_use),
+                ],
+                'envelopes_db_pool_wait_seconds': wait,
+                'envelopes_db_pool_timeouts_total': [('', label, self.timeouts)],
+                'envelopes_db_pool_opened_total': [('', label, self.opened)],
+                'envelopes_db_pool_discarded_total': [
+                    ('', label + (('reason', reason), ), count)
+                    for reason, count in sorted(self.discarded.items())
+                ],
+            }
+
+
+POOL_METRICS = (
+    ('envelopes_db_pool_connections', 'gauge', 'Pooled connections by state.'),
+    ('envelopes_db_pool_wait_seconds', 'histogram', 'Time spent acquiring a connection.'),
+    ('envelopes_db_pool_timeouts_total', 'counter', 'Acquisitions that gave up waiting.'),
+    ('envelopes_db_pool_opened_total', 'counter', 'Connections opened.'),
+    ('envelopes_db_pool_discarded_total', 'counter', 'Connections closed, by reason.'),
+)
+
+_pools: Dict[Tuple[str, tuple], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+# Pools inherited across a fork; kept referenced so that garbage collection
+# never closes (and terminates the session of) the parent's sockets.
+_inherited: List[ConnectionPool] = []
+
+
+def get_pool(key, factory):
+    """
+    Return the process-wide pool for `key`, creating it with `factory()`.
+    """
+    global _pools_pid
+    with _pools_lock:
+        if os.getpid() != _pools_pid:
+            _inherited.extend(_pools.values())
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = _pools[key] = factory()
+            created = True
+        else:
+            created = False
+    if created:
+        pool.fill()
+    return pool
+
+
+def close_pools(database=None):
+    """
+    Close every pool, or only those connected to `database`.
+    """
+    with _pools_lock:
+        doomed = [
+            key for key, pool in _pools.items()
+            if database is None or pool.label.get('database') == database
+        ]
+        pools = [_pools.pop(key) for key in doomed]
+    for pool in pools:
+        pool.close()
+
+
+def render_pool_metrics():
+    with _pools_lock:
+        pools = list(_pools.values())
+    if not pools:
+        return ''
+    samples = [pool.samples() for pool in pools]
+    lines = []
+    for name, kind, help_text in POOL_METRICS:
+        lines.extend(format_metric(name, kind, help_text, [
+            sample for pool_samples in samples for sample in pool_samples[name]]))
+    return '\n'.join(lines) + '\n'
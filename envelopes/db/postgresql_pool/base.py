@@ -0,0 +1,89 @@
+"""
+PostgreSQL backend that borrows connections from a process-wide pool.
+
+    DATABASES['default'] = {
+        'ENGINE': 'envelopes.db.postgresql_pool',
+        ...,
+        'POOL': {'MIN_SIZE': 1, 'MAX_SIZE': 20, 'MAX_LIFETIME': 1800,
+                 'CHECK_INTERVAL': 30, 'TIMEOUT': 10},
+    }
+
+Closing the connection, which Django does at the end of every request while
+`CONN_MAX_AGE` is 0, returns it to the pool instead of disconnecting, so
+requests skip the TCP and authentication handshake.
+"""
+# Standard Library Imports
+import functools
+
+# Third Party Library Imports
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgresCreation
+
+# Local Imports
+from ..pool import ConnectionPool, close_pools, get_pool
+
+POOL_DEFAULTS = {
+    'MIN_SIZE': 1,
+    'MAX_SIZE': 10,
+    'MAX_LIFETIME': 1800,
+    'CHECK_INTERVAL': 30,
+    'TIMEOUT': 10,
+}
+
+
+def release_connections(database):
+    # the friendly id worker lease holds a session of its own
+    from ...utils import friendly_ids
+    friendly_ids.release()
+    close_pools(database)
+
+
+class DatabaseCreation(PostgresCreation):
+    # A database cannot be dropped while pooled connections to it are open.
+
+    def _create_test_db(self, verbosity, autoclobber, keepdb=False):
+        release_connections(self._get_test_db_name())
+        return super()._create_test_db(verbosity, autoclobber, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        release_connections(test_database_name)
+        return super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pooled = None
+
+    def get_pool(self, conn_params):
+        options = dict(POOL_DEFAULTS, **(self.settings_dict.get('POOL') or {}))
+        params = tuple(sorted((name, str(value)) for name, value in conn_params.items()))
+        key = (self.alias, params)
+        return get_pool(key, lambda: ConnectionPool(
+            functools.partial(super(DatabaseWrapper, self).get_new_connection, conn_params),
+            min_size=int(options['MIN_SIZE']),
+            max_size=int(options['MAX_SIZE']),
+            max_lifetime=float(options['MAX_LIFETIME']),
+            check_interval=float(options['CHECK_INTERVAL']),
+            timeout=float(options['TIMEOUT']),
+            label={'alias': self.alias, 'database': conn_params['database']},
+        ))
+
+    def get_new_connection(self, conn_params):
+        # Django's throwaway connections to the 'postgres' database stay unpooled.
+        if self.alias == NO_DB_ALIAS:
+            return super().get_new_connection(conn_params)
+        self.pooled = self.get_pool(conn_params).getconn()
+        connection = self.pooled.connection
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.pooled is None:
+            return super()._close()
+        pooled, self.pooled = self.pooled, None
+        pooled.pool.putconn(pooled)
@@ -0,0 +1,173 @@
+# Standard Library Imports
+from collections import defaultdict
+
+# Third Party Library Imports
+from django.db import connection
+
+DEFAULT_EMBED_LIMIT = 10
+MAX_EMBED_LIMIT = 50
+
+
+class InvalidFieldset(ValueError):
+    pass
+
+
+class Relation:
+    """
+    Rows of `model` embedded under each parent row as `name`, newest first.
+
+    `parent_column` is the model field pointing at the parent, `serializer`
+    dumps the embedded rows and `children` are the relations that can be
+    embedded under them in turn.
+    """
+
+    def __init__(self, name, model, parent_column, serializer, children=()):
+        self.name = name
+        self.model = model
+        self.parent_column = parent_column
+        self.serializer = serializer
+        self.children = {child.name: child for child in children}
+
+    def latest(self, parent_ids, columns, limit):
+        """
+        `(parent id, *columns)` for the newest `limit` rows of every parent
+        in `parent_ids`, in one query.
+
+        A `LATERAL` subquery runs one `LIMIT`ed scan per parent. Envelopes
+        are read in order from `envelope_account_created_idx`, so the cost is
+        bounded by the number of rows returned however many a parent has.
+        Transactions only have `(envelope, created)`, so without incremental
+        sort (PostgreSQL 13) each parent's rows are sorted before the limit.
+        PostgreSQL only.
+        """
+        if not parent_ids:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(self.latest_sql(columns), {
+                'parent_ids': list(parent_ids), 'limit': limit})
+            return cursor.fetchall()
+
+    def latest_sql(self, columns):
+        opts = self.model._meta
+        return """
+            SELECT parent.id, {selected}
+            FROM unnest(%(parent_ids)s) AS parent (id)
+            CROSS JOIN LATERAL (
+                SELECT {columns}, created AS sort_created, id AS sort_id
+                FROM {table}
+                WHERE {parent_column} = parent.id
+                ORDER BY created DESC, id DESC
+                LIMIT %(limit)s
+            ) child
+            ORDER BY parent.id, child.sort_created DESC, child.sort_id DESC
+        """.format(
+            selected=', '.join('child.{}'.format(opts.get_field(c).column) for c in columns),
+            columns=', '.join(opts.get_field(c).column for c in columns),
+            table=opts.db_table,
+            parent_column=opts.get_field(self.parent_column).column,
+        )
+
+
+def parse_list(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def project(serializer, value):
+    """
+    The projection of `serializer` to the comma separated output keys in
+    `value`, or `serializer` itself when `value` is empty.
+    """
+    keys = parse_list(value)
+    if not keys:
+        return serializer
+    try:
+        return serializer.project(keys)
+    except ValueError as e:
+        raise InvalidFieldset(str(e))
+
+
+def get_embed_limit(value):
+    if value is None or value == '':
+        return DEFAULT_EMBED_LIMIT
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise InvalidFieldset('Malformed embed limit')
+    if limit < 1:
+        raise InvalidFieldset('Malformed embed limit')
+    return min(limit, MAX_EMBED_LIMIT)
+
+
+def resolve_includes(value, relations):
+    """
+    Nest the relation names listed in `value` under the `relations` they
+    belong to: `envelopes,transactions` on accounts embeds envelopes and
+    the transactions of each embedded envelope.
+    """
+    remaining = set(parse_list(value))
+
+    def walk(level):
+        included = {}
+        for name in sorted(level):
+            if name in remaining:
+                remaining.discard(name)
+                included[name] = (level[name], walk(level[name].children))
+        return included
+
+    included = walk(relations)
+    if remaining:
+        raise InvalidFieldset('Cannot include "{}"'.format(', '.join(sorted(remaining))))
+    return included
+
+
+def load(rows, id_index, included, params):
+    """
+    Read the `included` relations of `rows`, with one query per relation,
+    without serializing anything. `fields[<name>]` and `limit[<name>]`
+    project and bound each relation.
+
+    Returns `(name, serializer, id_index, children, nested)` per relation,
+    where `children` are `(parent id, *columns)` rows and `nested` is the
+    same for the relations embedded under them.
+    """
+    if included and connection.vendor != 'postgresql':
+        raise InvalidFieldset('include needs PostgreSQL')
+    loaded = []
+    parent_ids = [row[id_index] for row in rows]
+    for name, (relation, nested) in sorted(included.items()):
+        serializer = project(relation.serializer, params.get('fields[{}]'.format(name)))
+        limit = get_embed_limit(params.get('limit[{}]'.format(name)))
+        columns = serializer.columns_with('id')
+        children = relation.latest(parent_ids, columns, limit)
+        child_id_index = columns.index('id')
+        loaded.append((name, serializer, child_id_index, children, load(
+            [row[1:] for row in children], child_id_index, nested, params)))
+    return loaded
+
+
+def fingerprint(loaded):
+    """
+    What the embedded output of `loaded` depends on: relation names, output
+    keys and rows, so a caller can derive a validator before dumping.
+    """
+    return [
+        (name, serializer.keys, children, fingerprint(nested))
+        for name, serializer, _, children, nested in loaded
+    ]
+
+
+def embed(results, parent_ids, loaded):
+    """
+    Add the relations read by `load` to the serialized `results` of the
+    rows with `parent_ids`.
+    """
+    for name, serializer, id_index, children, nested in loaded:
+        child_rows = [row[1:] for row in children]
+        child_results = serializer.dump_many(child_rows)
+        if nested:
+            embed(child_results, [row[id_index] for row in child_rows], nested)
+        by_parent = defaultdict(list)
+        for row, result in zip(children, child_results):
+            by_parent[row[0]].append(result)
+        for result, parent_id in zip(results, parent_ids):
+            result[name] = by_parent.get(parent_id, [])
@@ -0,0 +1,213 @@
+# Standard Library Imports
+import functools
+import hashlib
+import inspect
+import json
+import threading
+from datetime import timedelta
+from typing import Dict, Tuple
+
+# Third Party Library Imports
+from apistar import Response, http
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db import connection
+from django.utils import timezone
+
+# Local Imports
+from .cache import LocalCache
+from .models import IdempotencyKey
+
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+REPLAYED_HEADER = 'Idempotent-Replayed'
+# headers the renderer sets again when a stored response is replayed
+UNSTORED_HEADERS = ('content-type', 'content-length')
+# transient answers, such as a version check that kept failing, which a
+# retry with the same key may get past
+RETRYABLE_STATUSES = (409,)
+
+KEY_TTL = int(getattr(settings, 'IDEMPOTENCY_KEY_TTL', None) or 24 * 60 * 60)
+WAIT_SECONDS = float(getattr(settings, 'IDEMPOTENCY_WAIT', None) or 10)
+
+# Responses committed by this process, so retries that land here replay
+# without a query.
+replays = LocalCache(
+    max_size=int(getattr(settings, 'IDEMPOTENCY_CACHE_SIZE', None) or 10000), timeout=KEY_TTL)
+
+# requests being answered for `(user id, key)`; duplicates wait on the event
+_in_flight: Dict[Tuple[int, str], threading.Event] = {}
+_in_flight_lock = threading.Lock()
+# marks threads running the view of a keyed request, see `active()`
+_executing = threading.local()
+
+
+def fingerprint(request):
+    digest = hashlib.sha1()
+    digest.update('{} {}\n'.format(request.method, request.url).encode('utf-8'))
+    digest.update(request.body or b'')
+    return digest.hexdigest()
+
+
+def active():
+    """
+    Whether this thread is running the view of a request with an
+    `Idempotency-Key`. Its writes must commit in the request's transaction,
+    together with the stored response.
+    """
+    return getattr(_executing, 'active', False)
+
+
+def replay(status, headers, content):
+    response = Response(content, status=status, headers=headers, content_type='application/json')
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def mismatch():
+    return Response(
+        {'message': 'Idempotency-Key was already used for a different request'}, status=422)
+
+
+def replay_cached(cache_key, digest):
+    stored = replays.get(cache_key)
+    if stored is None:
+        return None
+    if stored[0] != digest:
+        return mismatch()
+    return replay(*stored[1:])
+
+
+def render(response):
+    """
+    `(status, headers, content)` of what a view returned, with the content
+    rendered to JSON bytes.
+    """
+    if not isinstance(response, Response):
+        response = Response(response)
+    content = response.content
+    if not isinstance(content, bytes):
+        content = json.dumps(content).encode('utf-8')
+    headers = [
+        (name, value) for name, value in response.headers.items()
+        if name not in UNSTORED_HEADERS
+    ]
+    return response.status, headers, content
+
+
+def claim(user_id, key, digest, now):
+    """
+    Record that this request owns `key`, or return the response to answer
+    with instead.
+
+    The insert waits on the unique index while another transaction holds
+    the same key, so concurrent duplicates from other processes run after
+    the first one commits and replay its response.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO {} (user_id, key, fingerprint, headers, content, created)
+            VALUES (%s, %s, %s, '', ''::bytea, %s)
+            ON CONFLICT (user_id, key) DO NOTHING
+            RETURNING id
+        """.format(IdempotencyKey._meta.db_table), [user_id, key, digest, now])
+        row = cursor.fetchone()
+    if row is not None:
+        return row[0], None
+    stored = IdempotencyKey.objects.get(user_id=user_id, key=key)
+    if stored.created <= now - timedelta(seconds=KEY_TTL):
+        stored.delete()
+        return claim(user_id, key, digest, now)
+    if stored.fingerprint != digest:
+        return None, mismatch()
+    if stored.status is None:
+        return None, Response(
+            {'message': 'A request with this Idempotency-Key is in progress'}, status=409)
+    return None, replay(stored.status, json.loads(stored.headers), bytes(stored.content))
+
+
+def execute(view, kwargs, user_id, key, digest, cache_key):
+    pk, answer = claim(user_id, key, digest, timezone.now())
+    if answer is not None:
+        return answer
+    _executing.active = True
+    try:
+        response = view(**kwargs)
+    finally:
+        _executing.active = False
+    status, headers, content = render(response)
+    if status in RETRYABLE_STATUSES or status >= 500:
+        # let the retry run again
+        IdempotencyKey.objects.filter(pk=pk).delete()
+        return response
+    IdempotencyKey.objects.filter(pk=pk).update(
+        status=status, headers=json.dumps(headers), content=content)
+    db_transaction.on_commit(
+        lambda: replays.set(cache_key, (digest, status, headers, content)))
+    return response
+
+
+def idempotent(view):
+    """
+    Let clients retry `view` safely with an `Idempotency-Key` header.
+
+    The first request with a key runs the view and stores its response in
+    the same transaction; retries with the same key replay that response
+    without running the view again, and the same key on a different
+    request is refused with 422. Duplicates arriving at this process while
+    the first is running wait for it instead of queueing on the database.
+    Responses of 409 and 5xx are not stored, so a retry runs the view
+    again. `view` must take `request`, `auth` and `session` parameters.
+    """
+    signature = inspect.signature(view)
+
+    @functools.wraps(view)
+    def wrapper(idempotency_key=None, **kwargs):
+        if not idempotency_key:
+            return view(**kwargs)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return Response({'message': 'Idempotency-Key is too long'}, status=400)
+        user_id = kwargs['auth'].user['id']
+        cache_key = (user_id, idempotency_key)
+        digest = fingerprint(kwargs['request'])
+        answer = replay_cached(cache_key, digest)
+        if answer is not None:
+            return answer
+
+        with _in_flight_lock:
+            event = _in_flight.get(cache_key)
+            leader = event is None
+            if leader:
+                event = _in_flight[cache_key] = threading.Event()
+        if not leader:
+            event.wait(WAIT_SECONDS)
+            answer = replay_cached(cache_key, digest)
+            if answer is not None:
+                return answer
+        if not leader:
+            return execute(view, kwargs, user_id, idempotency_key, digest, cache_key)
+        try:
+            response = execute(view, kwargs, user_id, idempotency_key, digest, cache_key)
+        except BaseException:
+            # the request's transaction rolls back, so waiters claim the key again
+            event.set()
+            raise
+        finally:
+            with _in_flight_lock:
+                del _in_flight[cache_key]
+        # waiters replay what this request stored, which they only see once it commits
+        db_transaction.on_commit(event.set)
+        return response
+
+    wrapper.__signature__ = signature.replace(parameters=list(signature.parameters.values()) + [
+        inspect.Parameter(
+            'idempotency_key', inspect.Parameter.KEYWORD_ONLY, annotation=http.Header)])
+    return wrapper
+
+
+def purge(now=None):
+    """
+    Delete stored responses older than `KEY_TTL`. Returns how many.
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=KEY_TTL)
+    deleted, _ = IdempotencyKey.objects.filter(created__lte=cutoff).delete()
+    return deleted
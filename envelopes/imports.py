@@ -0,0 +1,290 @@
+# Standard Library Imports
+import codecs
+import csv
+import io
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Third Party Library Imports
+from dateutil import parser as date_parser
+from django.db import transaction as db_transaction
+from django.db import connection
+from django.utils import timezone
+
+# Local Imports
+from . import schemas
+from .cache import row_cache
+from .categories import category_map
+from .models import Category, Envelope, LedgerTotals, Transaction
+from .streaming import iter_chunks
+from .utils import friendly_ids
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+CSV_REQUIRED_COLUMNS = ('date', 'amount')
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+OFX_DATE = re.compile(r'^(\d{8})(\d{6})?')
+
+# `created` is parsed, and validated, once per distinct date by the importer
+import_schema = schemas.Transaction(exclude=('id', 'created'), partial=('category_id', ))
+COPY_COLUMNS = (
+    'friendly_id', 'user_id', 'owner_id', 'created', 'envelope_id', 'action_type', 'delta',
+    'description', 'category_id', 'comment')
+
+
+class InvalidImport(ValueError):
+    """
+    The file could not be imported; `errors` lists the offending rows as
+    `{'line': ..., 'errors': ...}`.
+    """
+
+    def __init__(self, message, errors=()):
+        super().__init__(message)
+        self.errors = list(errors)
+
+
+def text_lines(stream, encoding='utf-8-sig'):
+    """
+    Decode a binary `stream` line by line, dropping a byte order mark.
+    Only needs `stream.read`, so request input streams qualify.
+    """
+    return codecs.getreader(encoding)(stream)
+
+
+def parse_csv(lines):
+    """
+    Yield `(line, record)` for every row of a CSV file with a header.
+
+    `date` and `amount` columns are required; `description`, `category`,
+    `comment` and `envelope` (an envelope uuid) are optional.
+    """
+    reader = csv.DictReader(lines)
+    columns = {name.strip().lower() for name in reader.fieldnames or ()}
+    missing = [name for name in CSV_REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise InvalidImport('CSV header is missing {}'.format(', '.join(missing)))
+    for row in reader:
+        yield reader.line_num, {
+            (key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+
+
+def parse_ofx_date(value):
+    match = OFX_DATE.match(value)
+    if match is None:
+        raise ValueError(value)
+    return datetime.strptime(match.group(1) + (match.group(2) or '000000'), '%Y%m%d%H%M%S')
+
+
+def parse_ofx(lines):
+    """
+    Yield `(line, record)` for every `STMTTRN` of an OFX statement.
+
+    Handles both SGML (OFX 1.x, unclosed leaf elements) and XML (OFX 2)
+    files, one line at a time.
+    """
+    record = None
+    for number, line in enumerate(lines, 1):
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and record is not None:
+                    yield record.pop('line'), record
+                    record = None
+                elif not closing:
+                    record = {'line': number}
+            elif record is not None and not closing:
+                record[tag] = value.strip()
+    if record is not None:
+        raise InvalidImport('Unterminated STMTTRN starting at line {}'.format(record['line']))
+
+
+def ofx_records(lines):
+    for number, record in parse_ofx(lines):
+        name, memo = record.get('NAME', ''), record.get('MEMO', '')
+        try:
+            date = parse_ofx_date(record.get('DTPOSTED', '')).isoformat()
+        except ValueError:
+            date = record.get('DTPOSTED', '')
+        yield number, {
+            'date': date,
+            'amount': record.get('TRNAMT', ''),
+            'description': name or memo,
+            'comment': memo if name else '',
+        }
+
+
+IMPORT_FORMATS = {
+    'csv': parse_csv,
+    'ofx': ofx_records,
+}
+
+
+class Importer:
+    """
+    Load bank statement rows into the envelopes of `owner`.
+
+    Records stream through a generator pipeline: parsed rows are mapped to
+    `Transaction` schema input, validated `IMPORT_CHUNK_SIZE` at a time and
+    written with one `bulk_create` per chunk. Category names resolve through
+    the preloaded category map, creating the ones not seen before. The
+    balance, rollup and spend changes are summed on the way and applied
+    once per envelope after the last chunk.
+
+    Runs in one transaction: when any row is invalid nothing is imported and
+    `InvalidImport` lists the first `MAX_REPORTED_ERRORS` bad rows.
+    """
+
+    def __init__(self, user, owner, envelope=None, chunk_size=None):
+        self.user = user
+        self.owner = owner
+        self.default_envelope = None if envelope is None else str(envelope)
+        self.chunk_size = chunk_size or IMPORT_CHUNK_SIZE
+        self.envelopes = {
+            str(uuid): (pk, account_id)
+            for pk, uuid, account_id in Envelope.objects.filter(owner_id=owner).values_list(
+                'id', 'uuid', 'account_id')
+        }
+        self.accounts = dict(self.envelopes.values())
+        self.categories = {
+            name.lower(): pk for name, pk in category_map().by_name.items()}
+        self.dates = {}
+        self.errors = []
+        self.error_count = 0
+        self.imported = 0
+        self.totals = LedgerTotals()
+
+    def category_id(self, name):
+        key = name.lower()
+        if key not in self.categories:
+            self.categories[key] = Category.objects.get_or_create(name=name)[0].pk
+        return self.categories[key]
+
+    def parse_date(self, value):
+        # statements repeat a few hundred dates across thousands of rows
+        if value not in self.dates:
+            try:
+                self.dates[value] = date_parser.parse(value)
+            except (ValueError, OverflowError):
+                self.dates[value] = None
+        return self.dates[value]
+
+    def error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def rows(self, records):
+        """
+        Yield `(line, created, schema input)` for `records`, reporting rows
+        that cannot be mapped.
+        """
+        for line, record in records:
+            errors = {}
+            envelope = record.get('envelope') or self.default_envelope
+            if envelope not in self.envelopes:
+                errors['envelope'] = ['Unknown envelope.']
+            created = self.parse_date(record.get('date', ''))
+            if created is None:
+                errors['date'] = ['Not a valid date.']
+            try:
+                amount = Decimal(record.get('amount', '').replace(',', ''))
+            except InvalidOperation:
+                errors['amount'] = ['Not a valid number.']
+            else:
+                if not amount.is_finite() or amount == 0:
+                    errors['amount'] = ['Amount must be a non-zero number.']
+            if errors:
+                self.error(line, errors)
+                continue
+            data = {
+                'user': self.user.pk,
+                'envelope': self.envelopes[envelope][0],
+                'action_type': (Transaction.ACTION_TYPE_DEPOSITED if amount > 0
+                                else Transaction.ACTION_TYPE_WITHDRAWN),
+                'delta': str(amount),
+                'description': record.get('description', ''),
+                'comment': record.get('comment', ''),
+            }
+            if record.get('category'):
+                data['category'] = self.category_id(record['category'])
+            yield line, created, data
+
+    def load_chunk(self, chunk):
+        data, errors = import_schema.load([row for _, _, row in chunk], many=True)
+        for index in sorted(errors):
+            self.error(chunk[index][0], errors[index])
+        if self.error_count:
+            # keep validating to report errors, but write nothing more
+            return
+        for row, (_, created, _), friendly_id in zip(
+                data, chunk, friendly_ids.next_ids(len(data))):
+            row['friendly_id'] = friendly_id
+            row['owner_id'] = self.owner
+            row['created'] = created
+            row.setdefault('category_id', None)
+            self.totals.add(
+                row['envelope_id'], self.accounts[row['envelope_id']], row['category_id'],
+                created, row['delta'])
+        write_rows(data)
+        self.imported += len(data)
+
+    def run(self, records, dt):
+        """
+        Import `records` and return the envelopes changed with their new
+        balances.
+        """
+        with db_transaction.atomic():
+            for chunk in iter_chunks(self.rows(records), self.chunk_size):
+                self.load_chunk(chunk)
+            if self.error_count:
+                raise InvalidImport(
+                    '{} rows could not be imported'.format(self.error_count), self.errors)
+            if not self.imported:
+                raise InvalidImport('The file holds no transactions')
+            changed = list(self.totals.balances)
+            # lock in id order, as every other balance writer does
+            list(Envelope.objects.select_for_update().filter(id__in=changed).order_by(
+                'id').values_list('id'))
+            self.totals.apply(dt)
+            envelopes = list(Envelope.objects.filter(id__in=changed).order_by('id'))
+            row_cache.invalidate('envelope', *[envelope.uuid for envelope in envelopes])
+        return envelopes
+
+
+def write_rows(rows):
+    """
+    Insert transaction rows given as dicts of `COPY_COLUMNS`: with `COPY` on
+    PostgreSQL, which skips building and compiling an `INSERT` per batch,
+    and with `bulk_create` elsewhere.
+    """
+    if connection.vendor != 'postgresql':
+        Transaction.objects.bulk_create([Transaction(**row) for row in rows])
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            '' if row[column] is None else row[column] for column in COPY_COLUMNS])
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        # unquoted empty fields are NULL in CSV, which only `category_id` may be
+        cursor.copy_expert(
+            'COPY {} ({}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (description, comment))'
+            .format(Transaction._meta.db_table, ', '.join(COPY_COLUMNS)), buffer)
+
+
+def import_transactions(stream, import_format, user, owner, envelope=None, dt=None):
+    """
+    Import a CSV or OFX file read from the binary `stream`. Returns how many
+    transactions were imported and the envelopes they changed.
+    """
+    if import_format not in IMPORT_FORMATS:
+        raise InvalidImport('Format must be one of "{}"'.format(sorted(IMPORT_FORMATS)))
+    importer = Importer(user, owner, envelope=envelope)
+    try:
+        records = IMPORT_FORMATS[import_format](text_lines(stream))
+        envelopes = importer.run(records, dt or timezone.now())
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise InvalidImport('Malformed {} file: {}'.format(import_format.upper(), e))
+    return importer.imported, envelopes
@@ -0,0 +1,336 @@
+# Standard Library Imports
+import functools
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Third Party Library Imports
+from apistar import Include, exceptions
+from apistar.frameworks.wsgi import WSGIApp
+from django.conf import settings
+from django.core import signals
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.utils import CursorWrapper
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_RECORDED_QUERIES = 200
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class ExecuteWrapperCursor(CursorWrapper):
+    """
+    Runs `execute`/`executemany` through the connection's execute wrappers.
+
+    Wraps the cursor Django would have returned (debug or not), so query
+    logging in `connection.queries_log` keeps working underneath.
+    """
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def execute(self, sql, params=None):
+        return self._execute_with_wrappers(
+            sql, params, False,
+            lambda sql, params, many, context: self.cursor.execute(sql, params))
+
+    def executemany(self, sql, param_list):
+        return self._execute_with_wrappers(
+            sql, param_list, True,
+            lambda sql, params, many, context: self.cursor.executemany(sql, params))
+
+    def _execute_with_wrappers(self, sql, params, many, executor):
+        context = {'connection': self.db, 'cursor': self}
+        for wrapper in reversed(self.db.execute_wrappers):
+            executor = functools.partial(wrapper, executor)
+        return executor(sql, params, many, context)
+
+
+def install_execute_wrappers(conn):
+    if 'execute_wrappers' in vars(conn):
+        return
+    conn.execute_wrappers = []
+    make_cursor, make_debug_cursor = conn.make_cursor, conn.make_debug_cursor
+    conn.make_cursor = lambda cursor: ExecuteWrapperCursor(make_cursor(cursor), conn)
+    conn.make_debug_cursor = lambda cursor: ExecuteWrapperCursor(make_debug_cursor(cursor), conn)
+
+
+@contextmanager
+def execute_wrapper(wrapper, using=DEFAULT_DB_ALIAS):
+    """
+    `connection.execute_wrapper()` for the current thread's connection.
+
+    Django 2.0 added execute wrappers; on older versions the connection's
+    cursor factories are wrapped once so the same `wrapper(execute, sql,
+    params, many, context)` callables can be installed.
+    """
+    conn = connections[using]
+    if hasattr(type(conn), 'execute_wrapper'):
+        with conn.execute_wrapper(wrapper):
+            yield
+        return
+    install_execute_wrappers(conn)
+    conn.execute_wrappers.append(wrapper)
+    try:
+        yield
+    finally:
+        conn.execute_wrappers.remove(wrapper)
+
+
+class RequestRecord:
+    """
+    Timings and SQL of one request; installed as an execute wrapper.
+    """
+
+    def __init__(self, route, method, path):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.status = '500'
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.db_time = 0.0
+        self.query_count = 0
+        self.statements = Counter()
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            took = time.perf_counter() - started
+            self.db_time += took
+            self.query_count += 1
+            self.statements[sql] += 1
+            if len(self.queries) < MAX_RECORDED_QUERIES:
+                self.queries.append((sql, took))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.statements.items() if count > 1}
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def to_dict(self):
+        return {
+            'route': self.route,
+            'method': self.method,
+            'path': self.path,
+            'status': int(self.status),
+            'started': self.started_at.isoformat() + 'Z',
+            'duration_ms': round(self.duration * 1000, 3),
+            'db_ms': round(self.db_time * 1000, 3),
+            'query_count': self.query_count,
+            'duplicate_queries': self.duplicate_count,
+            'queries': [
+                {'sql': sql, 'time_ms': round(took * 1000, 3)} for sql, took in self.queries],
+            'duplicates': [
+                {'sql': sql, 'count': count} for sql, count in self.duplicates.items()],
+        }
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_metric(name, kind, help_text, samples):
+    """
+    Prometheus text lines for one metric from `(suffix, labels, value)` samples.
+    """
+    lines = ['# HELP {} {}'.format(name, help_text), '# TYPE {} {}'.format(name, kind)]
+    for suffix, labels, value in samples:
+        label_text = ','.join(
+            '{}="{}"'.format(key, escape_label(str(label))) for key, label in labels)
+        lines.append('{}{}{{{}}} {}'.format(name, suffix, label_text, value))
+    return lines
+
+
+class RequestMetrics:
+    """
+    Per-route request counters, rendered in the Prometheus text format.
+
+    Requests slower than `slow_request_seconds` are kept, with their SQL
+    (statements only, never parameters), in a ring buffer holding the last
+    `slow_request_samples` of them.
+    """
+
+    def __init__(self, slow_request_seconds=0.5, slow_request_samples=100):
+        self.slow_request_seconds = slow_request_seconds
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self._duration = Counter()
+        self._count = Counter()
+        self._db_time = Counter()
+        self._queries = Counter()
+        self._duplicates = Counter()
+        self._slow = Counter()
+        self._slow_requests = deque(maxlen=slow_request_samples)
+
+    def observe(self, record):
+        route = record.route
+        slow = record.duration >= self.slow_request_seconds
+        with self._lock:
+            self._requests[route, record.status] += 1
+            buckets = self._buckets[route]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if record.duration <= bound:
+                    buckets[index] += 1
+            self._duration[route] += record.duration
+            self._count[route] += 1
+            self._db_time[route] += record.db_time
+            self._queries[route] += record.query_count
+            self._duplicates[route] += record.duplicate_count
+            if slow:
+                self._slow[route] += 1
+                self._slow_requests.append(record.to_dict())
+
+    def slow_requests(self):
+        with self._lock:
+            return list(reversed(self._slow_requests))
+
+    def render(self):
+        with self._lock:
+            lines = []
+
+            def metric(name, kind, help_text, samples):
+                lines.extend(format_metric(name, kind, help_text, samples))
+
+            metric('envelopes_requests_total', 'counter', 'Requests handled.', [
+                ('', (('route', route), ('status', status)), count)
+                for (route, status), count in sorted(self._requests.items())
+            ])
+            histogram = []
+            for route in sorted(self._count):
+                for bound, count in zip(DURATION_BUCKETS, self._buckets[route]):
+                    histogram.append(('_bucket', (('route', route), ('le', bound)), count))
+                count = self._count[route]
+                histogram.append(('_bucket', (('route', route), ('le', '+Inf')), count))
+                histogram.append(('_sum', (('route', route), ), self._duration[route]))
+                histogram.append(('_count', (('route', route), ), count))
+            metric(
+                'envelopes_request_duration_seconds', 'histogram', 'Request wall time.', histogram)
+            for name, help_text, values in [
+                ('envelopes_request_db_seconds_total', 'Time spent executing SQL.', self._db_time),
+                ('envelopes_request_queries_total', 'SQL statements executed.', self._queries),
+                ('envelopes_request_duplicate_queries_total',
+                 'Statements repeated within one request.', self._duplicates),
+                ('envelopes_slow_requests_total', 'Requests over the slow threshold.', self._slow),
+            ]:
+                metric(name, 'counter', help_text, [
+                    ('', (('route', route), ), value) for route, value in sorted(values.items())])
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics(
+    slow_request_seconds=float(getattr(settings, 'SLOW_REQUEST_SECONDS', None) or 0.5),
+    slow_request_samples=int(getattr(settings, 'SLOW_REQUEST_SAMPLES', None) or 100),
+)
+
+
+def route_templates(routes, prefix=''):
+    templates = {}
+    for entry in routes:
+        if isinstance(entry, Include):
+            templates.update(route_templates(entry.routes, prefix + entry.path))
+        else:
+            templates[entry.view, entry.method] = '{} {}'.format(entry.method, prefix + entry.path)
+    return templates
+
+
+class ClosingIterator:
+    """
+    Response body that calls `callback` once, when exhausted or closed.
+    """
+
+    def __init__(self, content, callback):
+        self._content = content
+        self._iterator = iter(content)
+        self._callback = callback
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if self._callback is None:
+            return
+        callback, self._callback = self._callback, None
+        try:
+            if hasattr(self._content, 'close'):
+                self._content.close()
+        finally:
+            callback()
+
+
+class InstrumentedApp(WSGIApp):
+    """
+    WSGI app recording wall time, SQL time and query counts per route.
+
+    Requests are labelled with their route template (`GET /accounts/{uuid}/`)
+    so the number of series stays bounded. Streamed responses are measured
+    until their body has been fully sent, since their queries run then.
+
+    Django's `request_started`/`request_finished` signals are sent around
+    each response, so connections are closed (or returned to the pool) per
+    `CONN_MAX_AGE` once the body is sent, as under Django's own handler.
+    """
+
+    def __init__(self, metrics=request_metrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+        self.route_templates = route_templates(kwargs.get('routes', []))
+
+    def route_for(self, path, method):
+        try:
+            view, _ = self.router.lookup(path, method)
+        except exceptions.HTTPException:
+            return UNMATCHED_ROUTE
+        return self.route_templates.get((view, method), UNMATCHED_ROUTE)
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD'].upper()
+        path = environ['PATH_INFO']
+        record = RequestRecord(self.route_for(path, method), method, path)
+        signals.request_started.send(sender=self.__class__, environ=environ)
+
+        def capture_status(status, headers, exc_info=None):
+            record.status = status.split(' ', 1)[0]
+            if exc_info is None:
+                return start_response(status, headers)
+            return start_response(status, headers, exc_info)
+
+        wrapper = execute_wrapper(record)
+        wrapper.__enter__()
+        try:
+            content = super().__call__(environ, capture_status)
+        except BaseException:
+            self.finish(wrapper, record)
+            raise
+        if isinstance(content, list):
+            self.finish(wrapper, record)
+            return content
+        return ClosingIterator(content, lambda: self.finish(wrapper, record))
+
+    def finish(self, wrapper, record):
+        wrapper.__exit__(None, None, None)
+        record.finish()
+        self.metrics.observe(record)
+        signals.request_finished.send(sender=self.__class__)
@@ -0,0 +1,172 @@
+# Standard Library Imports
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Third Party Library Imports
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db import connection
+
+# Local Imports
+from . import idempotency, models
+from .models import Envelope, LedgerEntry, uuid_key
+
+# sentinel that stops the writer thread
+STOP = object()
+
+
+class GroupCommit:
+    """
+    Write-behind queue that commits concurrent deposits and withdrawals
+    together.
+
+    Callers hand their entry to one writer thread and block on a future.
+    The writer takes the first queued entry, keeps collecting for up to
+    `window` seconds or `max_batch` entries, then writes the whole batch
+    with `Envelope.apply_entries` in one transaction, so one commit (and
+    one WAL flush) serves every caller in it. Each future resolves only
+    after that commit, so a caller is never acknowledged before its write
+    is durable. A batch that fails is retried entry by entry, so one bad
+    entry fails only its own caller.
+
+    Writes commit on the writer's connection, independently of the caller's
+    transaction, so callers must not hold locks on the envelopes they write.
+    """
+
+    def __init__(self, window=0.002, max_batch=100, clock=time.monotonic):
+        self.window = window
+        self.max_batch = max_batch
+        self.clock = clock
+        self.batches = 0
+        self.entries = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, entry):
+        """
+        Queue `entry` and return a future of its `(envelope, transaction)`.
+        """
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='ledger-group-commit', daemon=True)
+                self._thread.start()
+            self._queue.put((entry, future))
+        return future
+
+    def deposit(self, uuid, deposited_by, amount, dt, description=None, comment=None, owner=None):  # noqa; E501
+        assert amount > 0
+        return self.submit(LedgerEntry(
+            uuid, amount, deposited_by, dt, description, comment, None, owner)).result()
+
+    def withdraw(self, uuid, withdrawn_by, amount, dt, description=None, comment=None, category=None, owner=None):  # noqa; E501
+        assert amount > 0
+        return self.submit(LedgerEntry(
+            uuid, -amount, withdrawn_by, dt, description, comment, category, owner)).result()
+
+    def close(self):
+        """
+        Write what is queued, then stop the writer thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(STOP)
+        if thread is not None:
+            thread.join()
+
+    def stats(self):
+        return {'batches': self.batches, 'entries': self.entries}
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = self.clock() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - self.clock()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else (
+                    self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if item is STOP:
+                self._queue.put(STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is STOP:
+                    return
+                self._commit(self._collect(item))
+        finally:
+            connection.close()
+
+    def _commit(self, batch):
+        try:
+            with db_transaction.atomic():
+                envelopes, transactions = Envelope.apply_entries(
+                    [entry for entry, _ in batch], refresh=True)
+        except Exception as e:
+            connection.close_if_unusable_or_obsolete()
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            for item in batch:
+                self._commit([item])
+            return
+        self.batches += 1
+        self.entries += len(batch)
+        for (entry, future), transaction in zip(batch, transactions):
+            future.set_result((envelopes[uuid_key(entry.uuid)], transaction))
+
+
+def group_commit_from_settings():
+    """
+    The `GroupCommit` configured by `LEDGER_GROUP_COMMIT_WINDOW` (milliseconds),
+    or `None` when group commit is off.
+    """
+    window = float(getattr(settings, 'LEDGER_GROUP_COMMIT_WINDOW', None) or 0)
+    if window <= 0:
+        return None
+    return GroupCommit(
+        window=window / 1000,
+        max_batch=int(getattr(settings, 'LEDGER_GROUP_COMMIT_MAX_BATCH', None) or 100))
+
+
+group_commit = group_commit_from_settings()
+
+
+def deposit(uuid, deposited_by, amount, dt, description=None, comment=None, owner=None):
+    """
+    `Envelope.deposit`, through `group_commit` when it is on, and with an
+    optimistic version check under `OPTIMISTIC_WRITES`. Requests with an Idempotency-Key
+    write in their own transaction, which also stores their response.
+    """
+    if group_commit is None or idempotency.active():
+        return Envelope.deposit(
+            uuid, deposited_by, amount, dt, description=description, comment=comment,
+            optimistic=models.OPTIMISTIC_WRITES, owner=owner)
+    return group_commit.deposit(
+        uuid, deposited_by, amount, dt, description=description, comment=comment, owner=owner)
+
+
+def withdraw(uuid, withdrawn_by, amount, dt, description=None, comment=None, category=None, owner=None):  # noqa; E501
+    """
+    `Envelope.withdraw`, through `group_commit` when it is on, and with an
+    optimistic version check under `OPTIMISTIC_WRITES`. Requests with an Idempotency-Key
+    write in their own transaction, which also stores their response.
+    """
+    if group_commit is None or idempotency.active():
+        return Envelope.withdraw(
+            uuid, withdrawn_by, amount, dt, description=description, comment=comment,
+            category=category, optimistic=models.OPTIMISTIC_WRITES, owner=owner)
+    return group_commit.withdraw(
+        uuid, withdrawn_by, amount, dt, description=description, comment=comment,
+        category=category, owner=owner)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 11:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envelopes', '0004_auto_20171014_2131'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='transaction',
+            old_name='type',
+            new_name='action_type',
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=80, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['owner', '-created', '-id'], name='account_owner_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='envelope',
+            index=models.Index(fields=['-created', '-id'], name='envelope_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-created', '-id'], name='transaction_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 11:08
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envelopes', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountRollup',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='envelopes.Account')),
+                ('allocated', models.DecimalField(decimal_places=2, default=0, help_text='Sum of envelope balances', max_digits=14)),
+                ('budgeted', models.DecimalField(decimal_places=2, default=0, help_text='Sum of envelope budgets', max_digits=14)),
+                ('modified', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategorySpend',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('period', models.DateField(help_text='First day of the month')),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_spend', to='envelopes.Account')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='spend', to='envelopes.Category')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='categoryspend',
+            unique_together=set([('account', 'category', 'period')]),
+        ),
+    ]
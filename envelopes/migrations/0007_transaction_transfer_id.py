@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 11:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envelopes', '0006_account_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='transfer_id',
+            field=models.UUIDField(blank=True, db_index=True, help_text='Pairs the two sides of a transfer.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='action_type',
+            field=models.CharField(choices=[('CREATED', 'Created'), ('DEPOSITED', 'Deposited'), ('WITHDRAWN', 'Withdrawn'), ('TRANSFERRED', 'Transferred')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 10000
+
+
+def backfill_owner(apps, schema_editor):
+    """
+    Copy each envelope's account owner onto it, one id range at a time so no
+    single statement holds row locks on the whole table.
+    """
+    Account = apps.get_model('envelopes', 'Account')
+    Envelope = apps.get_model('envelopes', 'Envelope')
+    owner = Subquery(Account.objects.filter(pk=OuterRef('account_id')).values('owner_id')[:1])
+    last_id = Envelope.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id, BATCH_SIZE):
+        Envelope.objects.filter(
+            id__gt=start, id__lte=start + BATCH_SIZE, owner__isnull=True,
+        ).update(owner_id=owner)
+
+
+class Migration(migrations.Migration):
+    # each batch commits on its own; the field stays nullable until 0011
+    atomic = False
+
+    dependencies = [
+        ('envelopes', '0009_envelope_owner'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 16:40
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envelopes', '0010_backfill_envelope_owner'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='envelope',
+            name='owner',
+            field=models.ForeignKey(db_index=False, editable=False, help_text="Owner of the envelope's account.", on_delete=django.db.models.deletion.CASCADE, related_name='owned_envelopes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='envelope',
+            index=models.Index(fields=['owner', '-created', '-id'], name='envelope_owner_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 11:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envelopes', '0011_envelope_owner_not_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('as_of', models.DateTimeField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('txn_high_water_id', models.IntegerField(help_text='Highest transaction id when the snapshot was taken.')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['envelope', 'created'], name='transaction_envelope_created'),
+        ),
+        migrations.AddField(
+            model_name='balancesnapshot',
+            name='envelope',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='envelopes.Envelope'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='balancesnapshot',
+            unique_together=set([('envelope', 'as_of')]),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 10000
+
+
+def backfill_owner(apps, schema_editor):
+    """
+    Copy each transaction's envelope owner onto it, one id range at a time
+    so no single statement holds row locks on the whole table.
+    """
+    Envelope = apps.get_model('envelopes', 'Envelope')
+    Transaction = apps.get_model('envelopes', 'Transaction')
+    owner = Subquery(Envelope.objects.filter(pk=OuterRef('envelope_id')).values('owner_id')[:1])
+    last_id = Transaction.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id, BATCH_SIZE):
+        Transaction.objects.filter(
+            id__gt=start, id__lte=start + BATCH_SIZE, owner__isnull=True,
+        ).update(owner_id=owner)
+
+
+class Migration(migrations.Migration):
+    # each batch commits on its own; the field stays nullable until 0016
+    atomic = False
+
+    dependencies = [
+        ('envelopes', '0014_transaction_owner'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 12:38
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envelopes', '0016_transaction_owner_not_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountRollupDelta',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('allocated', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('budgeted', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created', models.DateTimeField()),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollup_deltas', to='envelopes.Account')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 18:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envelopes', '0017_account_rollup_delta'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='envelope',
+            index=models.Index(fields=['account', '-created', '-id'], name='envelope_account_created_idx'),
+        ),
+    ]
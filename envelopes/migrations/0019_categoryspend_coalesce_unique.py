@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.4 on 2026-10-18 21:05
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('envelopes', '0018_envelope_account_created_idx'),
+    ]
+
+    operations = [
+        # NULL categories never conflicted, so uncategorized spend may have
+        # several rows per account and period; fold them into the first.
+        migrations.RunSQL(
+            """
+            UPDATE envelopes_categoryspend AS spend SET spent = merged.spent
+            FROM (
+                SELECT min(id) AS id, sum(spent) AS spent
+                FROM envelopes_categoryspend
+                WHERE category_id IS NULL
+                GROUP BY account_id, period
+                HAVING count(*) > 1
+            ) AS merged
+            WHERE spend.id = merged.id;
+            DELETE FROM envelopes_categoryspend AS spend
+            USING envelopes_categoryspend AS kept
+            WHERE spend.category_id IS NULL AND kept.category_id IS NULL
+                AND spend.account_id = kept.account_id AND spend.period = kept.period
+                AND spend.id > kept.id;
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            """
+            CREATE UNIQUE INDEX categoryspend_account_category_period_uniq
+            ON envelopes_categoryspend (account_id, (COALESCE(category_id, 0)), period);
+            """,
+            'DROP INDEX categoryspend_account_category_period_uniq;',
+        ),
+        migrations.AlterUniqueTogether(
+            name='categoryspend',
+            unique_together=set([]),
+        ),
+    ]
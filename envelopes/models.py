@@ -1,16 +1,101 @@
 # Standard Library Imports
 import json
+import random
+import time
 import uuid
+from collections import defaultdict, namedtuple
+from decimal import Decimal
 from itertools import chain
 
 # Third Party Library Imports
 from behaviors.behaviors import Timestamped
 from django.conf import settings
 from django.db import transaction as db_transaction
-from django.db import models
+from django.db import IntegrityError, connection, models
+from django.db.models import Case, F, Max, Q, Sum, When
+from django.utils import timezone
 
 # Local Imports
-from .utils import encode
+from .cache import row_cache
+from .utils import friendly_ids
+
+OPTIMISTIC_RETRIES = 5
+OPTIMISTIC_BACKOFF = 0.005
+# How long `BalanceSnapshot.take` waits for in-flight ledger writes, in seconds.
+SNAPSHOT_SETTLE_TIMEOUT = 60
+SNAPSHOT_SETTLE_POLL = 0.05
+# Ledger writes check the envelope's version instead of locking it, and
+# defer their account rollup changes to `AccountRollup.fold`.
+OPTIMISTIC_WRITES = str(getattr(settings, 'OPTIMISTIC_LEDGER_WRITES', None) or '').lower() in (
+    '1', 'true', 'yes', 'on')
+
+
+# One deposit (positive `amount`) or withdrawal (negative) for `apply_entries`.
+LedgerEntry = namedtuple(
+    'LedgerEntry', 'uuid amount user dt description comment category owner')
+
+
+def uuid_key(value):
+    """
+    `value` in the canonical form `str(envelope.uuid)` has, so an upper-case
+    uuid from a url keys the same envelope. Malformed values raise
+    `ValidationError`.
+    """
+    return str(models.UUIDField().to_python(value))
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+class ConcurrentUpdate(Exception):
+    pass
+
+
+class LedgerNotSettled(Exception):
+    pass
+
+
+class Versioned(models.Model):
+    """
+    Row version counter for optimistic concurrency control.
+
+    Every save of an existing row bumps `version`; `save_versioned` only
+    writes when the row still carries the version this instance was read at.
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        self.version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'version'}
+        super().save(*args, **kwargs)
+        self.invalidate_cache()
+
+    def save_versioned(self, fields):
+        if isinstance(self, Timestamped):
+            self.modified = timezone.now()
+            fields = set(fields) | {'modified'}
+        values = {name: getattr(self, name) for name in fields}
+        updated = type(self).objects.filter(pk=self.pk, version=self.version).update(
+            version=F('version') + 1, **values)
+        if updated:
+            self.version += 1
+            self.invalidate_cache()
+        return bool(updated)
+
+    def delete(self, *args, **kwargs):
+        self.invalidate_cache()
+        return super().delete(*args, **kwargs)
+
+    def invalidate_cache(self):
+        row_cache.invalidate(self._meta.model_name, self.uuid)
 
 
 class JsonModelMixin:
@@ -37,18 +122,60 @@ class JsonModelMixin:
         return json.dumps(self.to_dict(include, exclude))
 
 
-class Account(JsonModelMixin, Timestamped):
+class Account(JsonModelMixin, Versioned, Timestamped):
     id = models.AutoField(primary_key=True)
     uuid = models.UUIDField(
         unique=True, default=uuid.uuid4, editable=False, verbose_name='Public Identifier')
     balance = models.DecimalField(max_digits=14, decimal_places=2)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-created', '-id'], name='account_owner_created_id_idx'),
+        ]
+
     def __str__(self):
         return 'Owner: {} balance: {}'.format(self.owner, self.balance)
 
+    def delete(self, *args, **kwargs):
+        # the account's envelopes go with it and are cached under its owner
+        row_cache.invalidate_owner(self.owner_id)
+        return super().delete(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        account = super().from_db(db, field_names, values)
+        account._loaded_owner_id = account.__dict__.get('owner_id')
+        return account
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.sync_envelope_owners()
 
-class Envelope(models.Model):
+    def save_versioned(self, fields):
+        updated = super().save_versioned(fields)
+        if updated:
+            self.sync_envelope_owners()
+        return updated
+
+    def sync_envelope_owners(self):
+        """
+        Copy a changed `owner` onto the account's envelopes (`Envelope.owner`)
+        and their transactions (`Transaction.owner`).
+        """
+        if self.owner_id == getattr(self, '_loaded_owner_id', self.owner_id):
+            return
+        moved = Envelope.objects.filter(account_id=self.pk).exclude(owner_id=self.owner_id)
+        envelopes = list(moved.values_list('id', 'uuid'))
+        if envelopes:
+            moved.update(owner_id=self.owner_id)
+            Transaction.objects.filter(envelope_id__in=[pk for pk, _ in envelopes]).exclude(
+                owner_id=self.owner_id).update(owner_id=self.owner_id)
+            row_cache.invalidate('envelope', *[uuid_ for _, uuid_ in envelopes])
+        self._loaded_owner_id = self.owner_id
+
+
+class Envelope(Versioned, models.Model):
     id = models.AutoField(primary_key=True)
     uuid = models.UUIDField(
         unique=True, default=uuid.uuid4, editable=False, verbose_name='Envelope Identifier')
@@ -63,15 +190,75 @@ class Envelope(models.Model):
     budget = models.DecimalField(max_digits=14, decimal_places=2)
     balance = models.DecimalField(max_digits=14, decimal_places=2)
     account = models.ForeignKey(Account, related_name='envelopes')
+    # Denormalized `account.owner`, so owner-scoped reads need no join. The
+    # composite index below leads with it, hence no index of its own.
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        editable=False,
+        db_index=False,
+        help_text="Owner of the envelope's account.",
+        related_name='owned_envelopes',
+    )
     created = models.DateTimeField(blank=True)
     modified = models.DateTimeField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='envelope_created_id_idx'),
+            models.Index(
+                fields=['owner', '-created', '-id'], name='envelope_owner_created_id_idx'),
+            models.Index(
+                fields=['account', '-created', '-id'], name='envelope_account_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        envelope = super().from_db(db, field_names, values)
+        envelope._loaded_owner_id = envelope.__dict__.get('owner_id')
+        return envelope
+
+    def sync_owner(self):
+        # the account is usually at hand (forms, factories); otherwise look it up
+        if Envelope.account.is_cached(self):
+            self.owner_id = self.account.owner_id
+        else:
+            self.owner_id = Account.objects.values_list('owner_id', flat=True).get(
+                pk=self.account_id)
+
+    def sync_transaction_owners(self):
+        """
+        Copy a changed `owner`, after a move to another owner's account, onto
+        the envelope's transactions (`Transaction.owner`).
+        """
+        loaded = getattr(self, '_loaded_owner_id', None)
+        if loaded is not None and loaded != self.owner_id:
+            Transaction.objects.filter(envelope_id=self.pk).update(owner_id=self.owner_id)
+        self._loaded_owner_id = self.owner_id
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'account' in update_fields:
+            self.sync_owner()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'owner'}
+        super().save(*args, **kwargs)
+        self.sync_transaction_owners()
+
+    def save_versioned(self, fields):
+        if 'account' in fields:
+            self.sync_owner()
+            fields = set(fields) | {'owner_id'}
+        updated = super().save_versioned(fields)
+        if updated:
+            self.sync_transaction_owners()
+        return updated
+
     @classmethod
     def create(cls, user, dt, account, **kwargs):
         # get budget, default to 0
-        budget = kwargs.get('budget', 0)
+        budget = kwargs.pop('budget', 0)
         # if balance not exist, default to initial budget amount
-        balance = kwargs.get('balance', budget)
+        balance = kwargs.pop('balance', budget)
         with db_transaction.atomic():
             envelope = cls.objects.create(
                 creator=user,
@@ -82,63 +269,297 @@ class Envelope(models.Model):
                 balance=balance,
                 **kwargs,
             )
+            # the opening balance is the first ledger entry
             transaction = Transaction.create(
                 user=user,
                 envelope=envelope,
                 action_type=Transaction.ACTION_TYPE_CREATED,
-                delta=0,
-                created=dt,
+                delta=balance,
+                dt=dt,
             )
+            AccountRollup.apply(envelope.account_id, dt, allocated=balance, budgeted=budget)
         return envelope, transaction
 
     @classmethod
-    def deposit(cls, uuid, deposited_by, amount, dt, description=None, comment=None):
-        assert amount > 0
-        description = '' if description is None else description
-        comment = '' if comment is None else comment
-        with db_transaction.atomic():
-            envelope = cls.objects.select_for_update().get(uuid=uuid)
-            envelope.balance += amount
+    def adjust_balance(cls, uuid, delta, dt, optimistic=False, owner=None):
+        """
+        Add `delta` to the balance of the envelope with `uuid`.
+
+        With `owner`, only an envelope belonging to that user is changed;
+        any other raises `DoesNotExist`.
+
+        By default the row is locked with `SELECT ... FOR UPDATE`. With
+        `optimistic=True` it is read without a lock and written back only if
+        its version is unchanged, retrying with jittered exponential backoff
+        up to `OPTIMISTIC_RETRIES` times before raising `ConcurrentUpdate`.
+        Must be called inside an atomic block.
+        """
+        queryset = cls.objects.filter(uuid=uuid)
+        if owner is not None:
+            queryset = queryset.filter(owner_id=owner)
+        if not optimistic:
+            envelope = queryset.select_for_update().get()
+            envelope.balance += delta
             envelope.modified = dt
             envelope.save(update_fields=[
                 'balance',
                 'modified',
             ])
+            return envelope
+        for attempt in range(OPTIMISTIC_RETRIES):
+            envelope = queryset.get()
+            envelope.balance += delta
+            envelope.modified = dt
+            if envelope.save_versioned(['balance', 'modified']):
+                return envelope
+            time.sleep(OPTIMISTIC_BACKOFF * 2 ** attempt * random.random())
+        raise ConcurrentUpdate('Envelope {} kept changing, gave up after {} attempts'.format(
+            uuid, OPTIMISTIC_RETRIES))
+
+    @classmethod
+    def deposit(cls, uuid, deposited_by, amount, dt, description=None, comment=None, optimistic=False, owner=None):  # noqa; E501
+        assert amount > 0
+        description = '' if description is None else description
+        comment = '' if comment is None else comment
+        with db_transaction.atomic():
+            envelope = cls.adjust_balance(uuid, amount, dt, optimistic=optimistic, owner=owner)
             transaction = Transaction.create(
                 user=deposited_by,
                 envelope=envelope,
-                type=Transaction.ACTION_TYPE_DEPOSITED,
+                action_type=Transaction.ACTION_TYPE_DEPOSITED,
                 delta=amount,
-                created=dt,
+                dt=dt,
                 description=description,
                 comment=comment,
             )
+            AccountRollup.apply(envelope.account_id, dt, allocated=amount)
         return envelope, transaction
 
     @classmethod
-    def withdraw(cls, uuid, withdrawn_by, amount, dt, description=None, comment=None):
+    def withdraw(cls, uuid, withdrawn_by, amount, dt, description=None, comment=None, category=None, optimistic=False, owner=None):  # noqa; E501
         assert amount > 0
         description = '' if description is None else description
         comment = '' if comment is None else comment
         with db_transaction.atomic():
-            envelope = cls.objects.select_for_update().get(uuid=uuid)
-            envelope.balance -= amount
-            envelope.modified = dt
-            envelope.save(update_fields=[
-                'balance',
-                'modified',
-            ])
+            envelope = cls.adjust_balance(uuid, -amount, dt, optimistic=optimistic, owner=owner)
             transaction = Transaction.create(
                 user=withdrawn_by,
                 envelope=envelope,
-                type=Transaction.ACTION_TYPE_WITHDRAWN,
+                action_type=Transaction.ACTION_TYPE_WITHDRAWN,
                 delta=-amount,
-                created=dt,
+                dt=dt,
                 description=description,
                 comment=comment,
+                category=category,
             )
+            AccountRollup.apply(envelope.account_id, dt, allocated=-amount)
+            CategorySpend.record(envelope.account_id, category, dt, amount)
         return envelope, transaction
 
+    @classmethod
+    def apply_movements(cls, user, movements, dt, description=None, comment=None, owner=None):
+        """
+        Deposit into or withdraw from many envelopes in one transaction.
+
+        `movements` is a sequence of `(uuid, amount)` pairs; positive amounts
+        are deposits and negative amounts withdrawals. See `apply_entries`.
+        """
+        assert movements
+        entries = [
+            LedgerEntry(uuid_, Decimal(amount), user, dt, description, comment, None, owner)
+            for uuid_, amount in movements
+        ]
+        _, transactions = cls.apply_entries(entries)
+        return transactions
+
+    @classmethod
+    def apply_entries(cls, entries, refresh=False):
+        """
+        Write a batch of `LedgerEntry` deposits and withdrawals, possibly
+        from different users, in one transaction.
+
+        Every target row is locked by a single `SELECT ... FOR UPDATE`
+        ordered by id, so concurrent batches always take their locks in the
+        same order and cannot deadlock against each other. Balances are moved
+        with one `UPDATE` and the ledger rows are written with one
+        `bulk_create`. An entry whose envelope is missing, or not owned by
+        its `owner`, raises `DoesNotExist` for the whole batch.
+
+        Returns the envelopes by uuid and the ledger rows in entry order.
+        The envelopes only carry their ids unless `refresh` reloads them
+        after the update.
+        """
+        assert entries
+        assert all(entry.amount != 0 for entry in entries)
+        deltas = defaultdict(Decimal)
+        for entry in entries:
+            deltas[uuid_key(entry.uuid)] += entry.amount
+        queryset = cls.objects.select_for_update().filter(uuid__in=list(deltas))
+        owners = {entry.owner for entry in entries}
+        if len(owners) == 1 and None not in owners:
+            queryset = queryset.filter(owner_id=owners.pop())
+        with db_transaction.atomic():
+            envelopes = {
+                str(envelope.uuid): envelope
+                for envelope in queryset.only('id', 'uuid', 'account_id', 'owner_id').order_by(
+                    'id')
+            }
+            if len(envelopes) != len(deltas) or any(
+                    entry.owner is not None and
+                    envelopes[uuid_key(entry.uuid)].owner_id != entry.owner for entry in entries):
+                raise cls.DoesNotExist('Envelope matching query does not exist.')
+            modified = max(entry.dt for entry in entries)
+            totals = LedgerTotals()
+            for entry in entries:
+                envelope = envelopes[uuid_key(entry.uuid)]
+                totals.add(envelope.id, envelope.account_id, entry.category, entry.dt,
+                           entry.amount)
+            totals.apply(modified)
+            row_cache.invalidate('envelope', *deltas)
+            transactions = Transaction.objects.bulk_create([
+                Transaction.build(
+                    user=entry.user,
+                    envelope=envelopes[uuid_key(entry.uuid)],
+                    action_type=(Transaction.ACTION_TYPE_DEPOSITED if entry.amount > 0
+                                 else Transaction.ACTION_TYPE_WITHDRAWN),
+                    delta=entry.amount,
+                    dt=entry.dt,
+                    description=entry.description,
+                    comment=entry.comment,
+                    category=entry.category,
+                    friendly_id=friendly_id,
+                )
+                for entry, friendly_id in zip(entries, friendly_ids.next_ids(len(entries)))
+            ])
+            if refresh:
+                envelopes = {str(envelope.uuid): envelope for envelope in cls.objects.filter(
+                    id__in=[e.id for e in envelopes.values()])}
+        return envelopes, transactions
+
+    @classmethod
+    def transfer(cls, source, target, transferred_by, amount, dt, description=None, comment=None, allow_overdraft=True, owner=None):  # noqa; E501
+        """
+        Move `amount` from the `source` envelope to the `target` envelope.
+
+        Both balances change in one `UPDATE` whose CTE locks the two rows in
+        id order, so transfers in opposite directions cannot deadlock and no
+        balance is ever read into Python and written back. With
+        `allow_overdraft=False` the same statement refuses to run unless the
+        locked source balance covers the amount. Returns the transfer id and
+        the paired ledger rows.
+        """
+        assert amount > 0
+        assert str(source) != str(target)
+        params = {
+            'source': str(source),
+            'target': str(target),
+            'amount': amount,
+            'modified': dt,
+            'allow_overdraft': allow_overdraft,
+            'owner': owner,
+        }
+        owned = '' if owner is None else 'AND owner_id = %(owner)s'
+        sql = """
+            WITH locked AS (
+                SELECT id, uuid, balance FROM {table}
+                WHERE uuid IN (%(source)s, %(target)s) {owned}
+                ORDER BY id
+                FOR UPDATE
+            )
+            UPDATE {table} AS envelope
+            SET balance = CASE WHEN envelope.uuid = %(source)s
+                               THEN envelope.balance - %(amount)s
+                               ELSE envelope.balance + %(amount)s END,
+                modified = %(modified)s,
+                version = envelope.version + 1
+            FROM locked
+            WHERE envelope.id = locked.id
+              AND (SELECT count(*) FROM locked) = 2
+              AND (%(allow_overdraft)s OR
+                   (SELECT balance FROM locked WHERE uuid = %(source)s) >= %(amount)s)
+            RETURNING envelope.id, envelope.uuid, envelope.account_id, envelope.owner_id
+        """.format(table=cls._meta.db_table, owned=owned)
+        with db_transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            if len(rows) != 2:
+                found = cls.objects.filter(uuid__in=[params['source'], params['target']])
+                if owner is not None:
+                    found = found.filter(owner_id=owner)
+                if found.count() == 2:
+                    raise InsufficientFunds('Source envelope balance is below {}'.format(amount))
+                raise cls.DoesNotExist('Envelope matching query does not exist.')
+            row_cache.invalidate('envelope', params['source'], params['target'])
+            envelopes = {
+                str(uuid_): cls(id=id_, uuid=uuid_, account_id=account_id, owner_id=owner_id)
+                for (id_, uuid_, account_id, owner_id) in rows
+            }
+            transfer_id = uuid.uuid4()
+            transactions = Transaction.objects.bulk_create([
+                Transaction.build(
+                    user=transferred_by,
+                    envelope=envelopes[key],
+                    action_type=Transaction.ACTION_TYPE_TRANSFERRED,
+                    delta=delta,
+                    dt=dt,
+                    description=description,
+                    comment=comment,
+                    transfer_id=transfer_id,
+                    friendly_id=friendly_id,
+                )
+                for (key, delta), friendly_id in zip(
+                    ((params['source'], -amount), (params['target'], amount)),
+                    friendly_ids.next_ids(2))
+            ])
+            source_account = envelopes[params['source']].account_id
+            target_account = envelopes[params['target']].account_id
+            if source_account != target_account:
+                for account_id, delta in sorted([(source_account, -amount),
+                                                 (target_account, amount)]):
+                    AccountRollup.apply(account_id, dt, allocated=delta)
+        return transfer_id, transactions
+
+
+class LedgerTotals:
+    """
+    Net effect of a batch of ledger rows, applied with one balance `UPDATE`,
+    one rollup update per account and one spend upsert per account,
+    category and month, in key order so concurrent batches lock rows
+    consistently. The envelope rows must already be locked.
+    """
+
+    def __init__(self):
+        self.balances = defaultdict(Decimal)
+        self.allocated = defaultdict(Decimal)
+        # withdrawals by (account id, category id or 0, month)
+        self.spent = defaultdict(Decimal)
+
+    def add(self, envelope_id, account_id, category, dt, delta):
+        self.balances[envelope_id] += delta
+        self.allocated[account_id] += delta
+        if delta < 0:
+            category_id = getattr(category, 'pk', category) or 0
+            self.spent[account_id, category_id, CategorySpend.period_for(dt)] -= delta
+
+    def apply(self, dt):
+        if self.balances:
+            Envelope.objects.filter(id__in=list(self.balances)).update(
+                balance=Case(
+                    *[When(id=envelope_id, then=F('balance') + delta)
+                      for envelope_id, delta in self.balances.items()],
+                    output_field=models.DecimalField()
+                ),
+                modified=dt,
+                version=F('version') + 1,
+            )
+        for account_id in sorted(self.allocated):
+            AccountRollup.apply(account_id, dt, allocated=self.allocated[account_id])
+        for account_id, category_id, period in sorted(self.spent):
+            CategorySpend.add(
+                account_id, category_id or None, period,
+                self.spent[account_id, category_id, period])
+
 
 class Category(models.Model):
     id = models.AutoField(primary_key=True)
@@ -152,12 +573,20 @@ class Transaction(models.Model):
     ACTION_TYPE_CREATED = 'CREATED'
     ACTION_TYPE_DEPOSITED = 'DEPOSITED'
     ACTION_TYPE_WITHDRAWN = 'WITHDRAWN'
+    ACTION_TYPE_TRANSFERRED = 'TRANSFERRED'
     ACTION_TYPE_CHOICES = (
         (ACTION_TYPE_CREATED, 'Created'),
         (ACTION_TYPE_DEPOSITED, 'Deposited'),
         (ACTION_TYPE_WITHDRAWN, 'Withdrawn'),
+        (ACTION_TYPE_TRANSFERRED, 'Transferred'),
     )
 
+    # `apistar partition_transactions` widens the primary key to `(id, created)`
+    # and the `friendly_id` constraint to `(friendly_id, created)`, which Django
+    # cannot express. The fields keep describing the unpartitioned table, so a
+    # migration that alters either must skip its database side on a
+    # partitioned table (`SeparateDatabaseAndState`) and change the
+    # constraints by hand, as `partitions.convert_table` does.
     id = models.AutoField(primary_key=True)
     friendly_id = models.CharField(max_length=30, unique=True, editable=False)
     user = models.ForeignKey(
@@ -168,19 +597,44 @@ class Transaction(models.Model):
     )
     created = models.DateTimeField(blank=True)
     envelope = models.ForeignKey(Envelope, related_name='transactions')
+    # Denormalized `envelope.owner`, so listing a user's transactions is one
+    # range of the composite index below instead of a join.
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        editable=False,
+        db_index=False,
+        help_text="Owner of the envelope's account.",
+        related_name='owned_transactions',
+    )
     action_type = models.CharField(max_length=30, choices=ACTION_TYPE_CHOICES)
     delta = models.DecimalField(max_digits=14, decimal_places=2, help_text="Balance delta")
     description = models.CharField(max_length=100, blank=True)
     category = models.ForeignKey(Category, blank=True, null=True, related_name='transactions')
     comment = models.TextField(blank=True)
+    transfer_id = models.UUIDField(
+        blank=True, null=True, db_index=True, help_text='Pairs the two sides of a transfer.')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='transaction_created_id_idx'),
+            models.Index(fields=['envelope', 'created'], name='transaction_envelope_created'),
+            models.Index(
+                fields=['owner', '-created', '-id'], name='transaction_owner_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.owner_id is None:
+            self.owner_id = self.envelope.owner_id
+        super().save(*args, **kwargs)
 
     @classmethod
-    def create(cls, user, envelope, action_type, delta, dt, description=None, comment=None, **kwargs):  # noqa; E501
+    def build(cls, user, envelope, action_type, delta, dt, description=None, comment=None, friendly_id=None, **kwargs):  # noqa; E501
         assert dt is not None
         description = '' if description is None else description
         comment = '' if comment is None else comment
-        friendly_id = encode(dt.timestamp(), delta, envelope.pk, user.pk)
-        return cls.objects.create(
+        friendly_id = friendly_ids.next_id() if friendly_id is None else friendly_id
+        kwargs.setdefault('owner_id', envelope.owner_id)
+        return cls(
             friendly_id=friendly_id,
             created=dt,
             user=user,
@@ -191,3 +645,356 @@ class Transaction(models.Model):
             comment=comment,
             **kwargs
         )
+
+    @classmethod
+    def create(cls, *args, **kwargs):
+        transaction = cls.build(*args, **kwargs)
+        transaction.save(force_insert=True)
+        return transaction
+
+
+class BalanceSnapshot(models.Model):
+    """
+    Balance of an envelope as of `as_of`, taken by a periodic batch job.
+
+    A snapshot covers the ledger rows created up to `as_of` whose id is at
+    most `txn_high_water_id`, a transaction id below which every row had
+    committed or rolled back when it was taken. The balance at a later time
+    is the snapshot plus the rows created after `as_of`, plus any backdated
+    rows written after the snapshot (id above the high-water mark), so reads
+    only sum recent history.
+    """
+    id = models.AutoField(primary_key=True)
+    envelope = models.ForeignKey(
+        Envelope, on_delete=models.CASCADE, related_name='balance_snapshots')
+    as_of = models.DateTimeField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    txn_high_water_id = models.IntegerField(
+        help_text='Highest transaction id when the snapshot was taken.')
+
+    class Meta:
+        unique_together = ('envelope', 'as_of')
+
+    # Balances of every envelope as of `as_of` (all time when NULL) from the
+    # snapshots taken at `since` plus the ledger rows they do not cover.
+    # Rows are first narrowed with conditions on the `created` and primary
+    # key indexes alone, so only the history since `since` is read.
+    LEDGER_SQL = """
+        SELECT envelope.id, envelope.uuid, envelope.balance,
+               COALESCE(prev.balance, 0) + COALESCE(recent.total, 0)
+        FROM {envelope} envelope
+        LEFT JOIN {snapshot} prev ON prev.envelope_id = envelope.id AND prev.as_of = %(since)s
+        LEFT JOIN (
+            SELECT entry.envelope_id, sum(entry.delta) AS total
+            FROM {transaction} entry
+            LEFT JOIN {snapshot} prev
+                   ON prev.envelope_id = entry.envelope_id AND prev.as_of = %(since)s
+            WHERE (%(as_of)s IS NULL OR entry.created <= %(as_of)s)
+              AND (%(high_water)s IS NULL OR entry.id <= %(high_water)s)
+              AND (%(since)s IS NULL OR entry.created > %(since)s OR entry.id > %(since_id)s)
+              AND (prev.id IS NULL OR entry.created > prev.as_of
+                   OR entry.id > prev.txn_high_water_id)
+            GROUP BY entry.envelope_id
+        ) recent ON recent.envelope_id = envelope.id
+    """
+
+    @classmethod
+    def ledger_sql(cls):
+        return cls.LEDGER_SQL.format(
+            envelope=Envelope._meta.db_table,
+            snapshot=cls._meta.db_table,
+            transaction=Transaction._meta.db_table,
+        )
+
+    @classmethod
+    def previous_batch(cls, as_of=None):
+        """
+        `(as_of, txn_high_water_id)` of the latest snapshots taken before
+        `as_of`, or `(None, None)` when there are none.
+        """
+        queryset = cls.objects.all()
+        if as_of is not None:
+            queryset = queryset.filter(as_of__lt=as_of)
+        since = queryset.order_by('-as_of').values_list('as_of', flat=True).first()
+        if since is None:
+            return None, None
+        since_id = cls.objects.filter(as_of=since).aggregate(
+            since_id=models.Min('txn_high_water_id'))['since_id']
+        return since, since_id
+
+    @classmethod
+    def settled_high_water(cls, timeout=None):
+        """
+        The highest committed transaction id, once every ledger row with a
+        lower id has committed or rolled back.
+
+        `max(id)` alone is not enough: a lower id may belong to a write that
+        commits after the snapshot reads the ledger, with `created` before
+        `as_of`, and the mark would exclude it from every later tail. Any
+        transaction holding such an id started before the mark was read, so
+        this waits for those that have written, or are running a statement,
+        to end. Raises `LedgerNotSettled` after `timeout` seconds.
+        """
+        timeout = SNAPSHOT_SETTLE_TIMEOUT if timeout is None else timeout
+        with connection.cursor() as cursor:
+            if connection.vendor != 'postgresql':
+                # a single writer at a time, so no lower id is in flight
+                cursor.execute('SELECT max(id) FROM {}'.format(Transaction._meta.db_table))
+                return cursor.fetchone()[0] or 0
+            cursor.execute('SELECT max(id), statement_timestamp() FROM {}'.format(
+                Transaction._meta.db_table))
+            high_water, read_at = cursor.fetchone()
+            deadline = time.monotonic() + timeout
+            while True:
+                cursor.execute("""
+                    SELECT count(*) FROM pg_stat_activity
+                    WHERE datname = current_database()
+                      AND backend_type = 'client backend'
+                      AND pid <> pg_backend_pid()
+                      AND xact_start < %s
+                      AND (backend_xid IS NOT NULL OR state = 'active')
+                """, [read_at])
+                if not cursor.fetchone()[0]:
+                    return high_water or 0
+                if time.monotonic() >= deadline:
+                    raise LedgerNotSettled(
+                        'Ledger writes started before {} are still running'.format(read_at))
+                time.sleep(SNAPSHOT_SETTLE_POLL)
+
+    @classmethod
+    def take(cls, as_of):
+        """
+        Snapshot every envelope's balance as of `as_of`, starting from the
+        previous snapshots. Envelopes already snapshotted at `as_of` are
+        left alone. Returns the number of snapshots written.
+        """
+        since, since_id = cls.previous_batch(as_of)
+        high_water = cls.settled_high_water()
+        with db_transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO {snapshot} (envelope_id, as_of, balance, txn_high_water_id)
+                SELECT ledger.id, %(as_of)s, ledger.total, %(high_water)s
+                FROM ({ledger}) AS ledger (id, uuid, balance, total)
+                ON CONFLICT (envelope_id, as_of) DO NOTHING
+            """.format(snapshot=cls._meta.db_table, ledger=cls.ledger_sql()), {
+                'as_of': as_of,
+                'high_water': high_water,
+                'since': since,
+                'since_id': since_id,
+            })
+            return cursor.rowcount
+
+    @classmethod
+    def balance_at(cls, envelope_id, at):
+        """
+        Balance of the envelope with `envelope_id` at `at`, from the nearest
+        earlier snapshot and the ledger rows it does not cover.
+        """
+        snapshot = cls.objects.filter(envelope_id=envelope_id, as_of__lte=at).order_by(
+            '-as_of').values_list('as_of', 'balance', 'txn_high_water_id').first()
+        tail = Transaction.objects.filter(envelope_id=envelope_id, created__lte=at)
+        if snapshot is None:
+            balance = Decimal(0)
+        else:
+            as_of, balance, high_water = snapshot
+            tail = tail.filter(Q(created__gt=as_of) | Q(id__gt=high_water))
+        return balance + (tail.aggregate(total=Sum('delta'))['total'] or 0)
+
+    @classmethod
+    def reconcile(cls, full=False):
+        """
+        `(id, uuid, balance, ledger)` for every envelope whose stored balance
+        differs from its ledger. The ledger is summed from the latest
+        snapshots, or over all history with `full`.
+        """
+        since, since_id = (None, None) if full else cls.previous_batch()
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, uuid, balance, total
+                FROM ({ledger}) AS ledger (id, uuid, balance, total)
+                WHERE balance <> total
+                ORDER BY id
+            """.format(ledger=cls.ledger_sql()), {
+                'as_of': None,
+                'high_water': None,
+                'since': since,
+                'since_id': since_id,
+            })
+            return cursor.fetchall()
+
+
+class AccountRollup(models.Model):
+    """
+    Envelope totals per account, kept current by the envelope balance methods.
+
+    Rows are adjusted with `F()` expressions inside the same atomic block as
+    the envelope change, so reading totals never needs an aggregate query.
+
+    With `OPTIMISTIC_WRITES`, `apply` inserts an `AccountRollupDelta`
+    instead, so concurrent writers to one account do not queue on this row.
+    `fold` moves the deltas into the rollup and `add_pending` adds the ones
+    not folded yet, so reads grow with the fold lag.
+    """
+    account = models.OneToOneField(
+        Account, on_delete=models.CASCADE, primary_key=True, related_name='rollup')
+    allocated = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, help_text='Sum of envelope balances')
+    budgeted = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, help_text='Sum of envelope budgets')
+    modified = models.DateTimeField()
+
+    @property
+    def unallocated(self):
+        return self.account.balance - self.allocated
+
+    @classmethod
+    def apply(cls, account_id, dt, allocated=0, budgeted=0):
+        if OPTIMISTIC_WRITES:
+            AccountRollupDelta.objects.create(
+                account_id=account_id, allocated=allocated, budgeted=budgeted, created=dt)
+            return
+        updated = cls.objects.filter(account_id=account_id).update(
+            allocated=F('allocated') + allocated,
+            budgeted=F('budgeted') + budgeted,
+            modified=dt,
+        )
+        if updated:
+            return
+        try:
+            with db_transaction.atomic():
+                cls.objects.create(
+                    account_id=account_id, allocated=allocated, budgeted=budgeted, modified=dt)
+        except IntegrityError:
+            # lost the race to create the row, so it exists now
+            cls.apply(account_id, dt, allocated=allocated, budgeted=budgeted)
+
+    @classmethod
+    def current(cls, account_id):
+        """
+        The rollup of `account_id` including the deltas not folded yet.
+        """
+        rollup = cls.objects.filter(account_id=account_id).first()
+        if rollup is None:
+            rollup = cls(account_id=account_id)
+        rollup.add_pending()
+        return rollup
+
+    def add_pending(self):
+        if not OPTIMISTIC_WRITES:
+            return
+        pending = AccountRollupDelta.objects.filter(account_id=self.account_id).aggregate(
+            allocated=Sum('allocated'), budgeted=Sum('budgeted'), modified=Max('created'))
+        self.allocated += pending['allocated'] or 0
+        self.budgeted += pending['budgeted'] or 0
+        if pending['modified'] and (self.modified is None or pending['modified'] > self.modified):
+            self.modified = pending['modified']
+
+    @classmethod
+    def fold(cls):
+        """
+        Move every pending delta into its account's rollup with one
+        statement, returning the number of deltas folded.
+
+        The deltas are claimed with `DELETE ... RETURNING`, so concurrent
+        folds never add one twice, and writers keep inserting meanwhile.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                WITH folded AS (
+                    DELETE FROM {delta} RETURNING account_id, allocated, budgeted, created
+                ), totals AS (
+                    INSERT INTO {rollup} (account_id, allocated, budgeted, modified)
+                    SELECT account_id, sum(allocated), sum(budgeted), max(created)
+                    FROM folded
+                    GROUP BY account_id
+                    ORDER BY account_id
+                    ON CONFLICT (account_id) DO UPDATE SET
+                        allocated = {rollup}.allocated + EXCLUDED.allocated,
+                        budgeted = {rollup}.budgeted + EXCLUDED.budgeted,
+                        modified = greatest({rollup}.modified, EXCLUDED.modified)
+                )
+                SELECT count(*) FROM folded
+            """.format(delta=AccountRollupDelta._meta.db_table, rollup=cls._meta.db_table))
+            return cursor.fetchone()[0]
+
+    @classmethod
+    def rebuild(cls, account_id, dt):
+        with db_transaction.atomic():
+            AccountRollupDelta.objects.filter(account_id=account_id).delete()
+            totals = Envelope.objects.filter(account_id=account_id).aggregate(
+                allocated=Sum('balance'), budgeted=Sum('budget'))
+            cls.objects.update_or_create(account_id=account_id, defaults={
+                'allocated': totals['allocated'] or 0,
+                'budgeted': totals['budgeted'] or 0,
+                'modified': dt,
+            })
+
+
+class AccountRollupDelta(models.Model):
+    """
+    Change to an account's envelope totals not yet folded into its
+    `AccountRollup`.
+    """
+    id = models.BigAutoField(primary_key=True)
+    account = models.ForeignKey(
+        Account, on_delete=models.CASCADE, related_name='rollup_deltas')
+    allocated = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    budgeted = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created = models.DateTimeField()
+
+
+class CategorySpend(models.Model):
+    """
+    Amount withdrawn per account and category for a monthly period.
+
+    Unique on `(account, COALESCE(category, 0), period)`, an expression index
+    created by migration 0019, so at most one row holds uncategorized spend.
+    """
+    id = models.AutoField(primary_key=True)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='category_spend')
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, blank=True, null=True, related_name='spend')
+    period = models.DateField(help_text='First day of the month')
+    spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    @staticmethod
+    def period_for(dt):
+        return dt.date().replace(day=1)
+
+    @classmethod
+    def record(cls, account_id, category, dt, amount):
+        cls.add(account_id, getattr(category, 'pk', category), cls.period_for(dt), amount)
+
+    @classmethod
+    def add(cls, account_id, category_id, period, amount):
+        """
+        Add `amount` to the period's spend in one statement. The unique index
+        coalesces a NULL category to 0, so uncategorized spend conflicts like
+        any other instead of inserting a second row.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO {table} (account_id, category_id, period, spent)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (account_id, (COALESCE(category_id, 0)), period) DO UPDATE SET
+                    spent = {table}.spent + EXCLUDED.spent
+            """.format(table=cls._meta.db_table), [account_id, category_id, period, amount])
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response to a request made with an `Idempotency-Key` header, replayed
+    when the client retries the request with the same key.
+    """
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=40, help_text='SHA-1 of the method, url and body.')
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+    headers = models.TextField(blank=True, help_text='Response headers as a JSON list.')
+    content = models.BinaryField(blank=True)
+    created = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
@@ -0,0 +1,103 @@
+# Standard Library Imports
+import base64
+import json
+from operator import attrgetter
+
+# Third Party Library Imports
+from dateutil import parser as date_parser
+from django.db import connection
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+DIRECTION_NEXT = 'n'
+DIRECTION_PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created, pk, direction):
+    payload = json.dumps([created.isoformat(), pk, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        created, pk, direction = json.loads(
+            base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        created = date_parser.parse(created)
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(pk, int) or direction not in (DIRECTION_NEXT, DIRECTION_PREVIOUS):
+        raise InvalidCursor('Malformed cursor')
+    return created, pk, direction
+
+
+def get_page_size(limit):
+    if limit is None or limit == '':
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise InvalidCursor('Malformed limit')
+    if limit < 1:
+        raise InvalidCursor('Malformed limit')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def seek(queryset, created, pk, operator):
+    """
+    Narrow `queryset` to the rows whose `(created, id)` compares with
+    `operator` to `(created, pk)`.
+
+    A row value comparison, unlike the equivalent `OR` of two conditions,
+    is a single index condition, so the scan starts right at the cursor.
+    """
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    return queryset.extra(
+        where=['({table}.{created}, {table}.{id}) {operator} (%s, %s)'.format(
+            table=table, created=connection.ops.quote_name('created'),
+            id=connection.ops.quote_name('id'), operator=operator)],
+        params=[created, pk])
+
+
+def paginate(queryset, params, key=attrgetter('created', 'id')):
+    """
+    Keyset paginate `queryset` newest first on `(created, id)`.
+
+    The seek predicate matches the composite `(..., created, id)` indexes so
+    every page is a bounded index range scan regardless of how deep the
+    cursor is.
+    `key` extracts `(created, id)` from a row, which lets `values_list()`
+    querysets be paginated too. Raises `InvalidCursor` for a malformed
+    `cursor` or `limit` parameter.
+    """
+    limit = get_page_size(params.get('limit'))
+    cursor = params.get('cursor')
+    direction = DIRECTION_NEXT
+    if cursor:
+        created, pk, direction = decode_cursor(cursor)
+        queryset = seek(queryset, created, pk, '<' if direction == DIRECTION_NEXT else '>')
+
+    if direction == DIRECTION_NEXT:
+        queryset = queryset.order_by('-created', '-id')
+    else:
+        queryset = queryset.order_by('created', 'id')
+
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == DIRECTION_PREVIOUS:
+        rows.reverse()
+
+    has_next = has_more if direction == DIRECTION_NEXT else bool(cursor)
+    has_previous = has_more if direction == DIRECTION_PREVIOUS else bool(cursor)
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(*key(rows[-1]), direction=DIRECTION_NEXT)
+    if rows and has_previous:
+        previous_cursor = encode_cursor(*key(rows[0]), direction=DIRECTION_PREVIOUS)
+    return rows, next_cursor, previous_cursor
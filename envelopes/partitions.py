@@ -0,0 +1,269 @@
+# Standard Library Imports
+import csv
+import gzip
+import io
+import os
+import re
+from datetime import datetime
+
+# Third Party Library Imports
+from dateutil import parser as date_parser
+from django.db import connection, transaction
+
+# Local Imports
+from .models import Transaction
+
+TABLE = Transaction._meta.db_table
+PARTITION_KEY = 'created'
+DEFAULT_PARTITION = TABLE + '_default'
+PARTITION_NAME = re.compile(r'^' + re.escape(TABLE) + r'_y(\d{4})m(\d{2})$')
+RANGE_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class PartitionError(Exception):
+    pass
+
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def months_between(start, end):
+    """
+    First days of the months from `start`'s up to, not including, `end`'s.
+    """
+    month, end = month_start(start), month_start(end)
+    while month < end:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month):
+    return '{}_y{:04d}m{:02d}'.format(TABLE, month.year, month.month)
+
+
+def partition_month(name):
+    match = PARTITION_NAME.match(os.path.basename(name).split('.', 1)[0])
+    if match is None:
+        raise PartitionError('{!r} is not a monthly {} partition'.format(name, TABLE))
+    return datetime(int(match.group(1)), int(match.group(2)), 1)
+
+
+def check_vendor():
+    if connection.vendor != 'postgresql':
+        raise PartitionError('Partitioning needs PostgreSQL, not {}'.format(connection.vendor))
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    return cursor.fetchone()[0] == 'p'
+
+
+def list_partitions(cursor):
+    """
+    `(name, lower, upper)` for each range partition, oldest first.
+    The default partition is left out.
+    """
+    cursor.execute("""
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = %s::regclass
+    """, [TABLE])
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = RANGE_BOUND.search(bound)
+        if match is not None:
+            # `created` is a timestamptz; bounds print in the connection's time zone
+            lower, upper = (
+                date_parser.parse(value).replace(tzinfo=None) for value in match.groups())
+            partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def has_default_partition(cursor):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [DEFAULT_PARTITION])
+    return cursor.fetchone()[0]
+
+
+def stray_months(cursor):
+    """
+    Months of the rows that landed in the default partition.
+    """
+    if not has_default_partition(cursor):
+        return []
+    cursor.execute("SELECT DISTINCT date_trunc('month', {key})::timestamp FROM {}".format(
+        DEFAULT_PARTITION, key=PARTITION_KEY))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_partitions(cursor, months):
+    """
+    Create the missing monthly partitions for `months`.
+
+    Rows already routed to the default partition for those months are moved
+    into the new partitions, which PostgreSQL would otherwise refuse to
+    create. Returns the names of the partitions created.
+    """
+    existing = {name for name, _, _ in list_partitions(cursor)}
+    missing = [month for month in months if partition_name(month) not in existing]
+    if not missing:
+        return []
+    lower, upper = min(missing), add_months(max(missing), 1)
+    sweep = False
+    if has_default_partition(cursor):
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM {} WHERE {key} >= %s AND {key} < %s)'.format(
+                DEFAULT_PARTITION, key=PARTITION_KEY), [lower, upper])
+        sweep = cursor.fetchone()[0]
+    if sweep:
+        # ALTER TABLE refuses to run while deferred foreign key checks are pending
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(TABLE, DEFAULT_PARTITION))
+    for month in missing:
+        cursor.execute('CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)'.format(
+            partition_name(month), TABLE), [month, add_months(month, 1)])
+    if sweep:
+        cursor.execute("""
+            WITH moved AS (
+                DELETE FROM {default} WHERE {key} >= %s AND {key} < %s RETURNING *
+            )
+            INSERT INTO {table} SELECT * FROM moved
+        """.format(default=DEFAULT_PARTITION, table=TABLE, key=PARTITION_KEY), [lower, upper])
+        cursor.execute('ALTER TABLE {} ATTACH PARTITION {} DEFAULT'.format(
+            TABLE, DEFAULT_PARTITION))
+    return [partition_name(month) for month in missing]
+
+
+def convert_table(cursor, now):
+    """
+    Rebuild the unpartitioned transaction table as a table range partitioned
+    by month on `created`, holding the same rows, indexes and constraints.
+
+    A partitioned table's unique constraints must include the partition key,
+    so the primary key becomes `(id, created)` and `friendly_id` is unique
+    per `created`; both stay unique in practice because ids come from the
+    sequence and friendly ids from the snowflake generator. The model keeps
+    `unique=True` on `friendly_id`, see the note on `Transaction.id`.
+    """
+    legacy = TABLE + '_unpartitioned'
+    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    cursor.execute('LOCK TABLE {} IN ACCESS EXCLUSIVE MODE'.format(TABLE))
+    cursor.execute("""
+        SELECT conname, contype, pg_get_constraintdef(oid),
+               ARRAY(SELECT attname FROM unnest(conkey) WITH ORDINALITY AS k(attnum, n)
+                     JOIN pg_attribute ON attrelid = conrelid AND pg_attribute.attnum = k.attnum
+                     ORDER BY n)
+        FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')
+        ORDER BY contype, conname
+    """, [TABLE])
+    constraints = cursor.fetchall()
+    cursor.execute("""
+        SELECT pg_get_indexdef(indexrelid) FROM pg_index
+        WHERE indrelid = %s::regclass
+          AND indexrelid NOT IN (SELECT conindid FROM pg_constraint WHERE conrelid = %s::regclass)
+        ORDER BY indexrelid
+    """, [TABLE, TABLE])
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+    sequence = cursor.fetchone()[0]
+    cursor.execute('SELECT min({key}) FROM {}'.format(TABLE, key=PARTITION_KEY))
+    oldest = cursor.fetchone()[0] or now
+
+    cursor.execute('ALTER TABLE {} RENAME TO {}'.format(TABLE, legacy))
+    cursor.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS) PARTITION BY RANGE ({})'.format(
+        TABLE, legacy, PARTITION_KEY))
+    cursor.execute('CREATE TABLE {} PARTITION OF {} DEFAULT'.format(DEFAULT_PARTITION, TABLE))
+    create_partitions(cursor, list(months_between(oldest, add_months(month_start(now), 1))))
+    cursor.execute('INSERT INTO {} SELECT * FROM {}'.format(TABLE, legacy))
+    if sequence:
+        cursor.execute('ALTER SEQUENCE {} OWNED BY NONE'.format(sequence))
+    cursor.execute('DROP TABLE {}'.format(legacy))
+    if sequence:
+        cursor.execute('ALTER SEQUENCE {} OWNED BY {}.id'.format(sequence, TABLE))
+
+    for name, kind, definition, columns in constraints:
+        if kind == 'f':
+            cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} {}'.format(TABLE, name, definition))
+            continue
+        if PARTITION_KEY not in columns:
+            columns = list(columns) + [PARTITION_KEY]
+        cursor.execute('ALTER TABLE {} ADD CONSTRAINT {} {} ({})'.format(
+            TABLE, name, 'PRIMARY KEY' if kind == 'p' else 'UNIQUE', ', '.join(columns)))
+    for definition in indexes:
+        cursor.execute(definition)
+    cursor.execute('ANALYZE {}'.format(TABLE))
+
+
+def partition(now=None, months_ahead=3):
+    """
+    Partition the transaction table if it is not yet, then create the
+    partitions for the current month, the `months_ahead` after it and any
+    month with rows in the default partition. Returns whether the table was
+    converted and the partitions created.
+    """
+    check_vendor()
+    now = now or datetime.now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        converted = not is_partitioned(cursor)
+        if converted:
+            convert_table(cursor, now)
+        current = month_start(now)
+        months = set(months_between(current, add_months(current, months_ahead + 1)))
+        months.update(stray_months(cursor))
+        return converted, create_partitions(cursor, sorted(months))
+
+
+def archive(directory, now=None, retention_months=24):
+    """
+    Move every monthly partition that ends more than `retention_months`
+    before the current month into `directory` as a gzipped CSV file, then
+    drop it. Returns the paths written.
+    """
+    check_vendor()
+    cutoff = add_months(month_start(now or datetime.now()), -retention_months)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    with connection.cursor() as cursor:
+        for name, lower, upper in list_partitions(cursor):
+            if upper > cutoff:
+                break
+            path = os.path.join(directory, name + '.csv.gz')
+            with transaction.atomic():
+                # holds off writers until the partition is dropped
+                cursor.execute('LOCK TABLE {} IN SHARE MODE'.format(name))
+                partial = path + '.partial'
+                with open(partial, 'wb') as raw:
+                    with gzip.open(raw, 'wt', encoding='utf-8', newline='') as f:
+                        cursor.copy_expert(
+                            'COPY {} TO STDOUT WITH (FORMAT csv, HEADER)'.format(name), f)
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                os.replace(partial, path)
+                cursor.execute('ALTER TABLE {} DETACH PARTITION {}'.format(TABLE, name))
+                cursor.execute('DROP TABLE {}'.format(name))
+            paths.append(path)
+    return paths
+
+
+def restore(path):
+    """
+    Load a file written by `archive` back into its monthly partition.
+    Returns the number of rows restored.
+    """
+    check_vendor()
+    month = partition_month(path)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            raise PartitionError('{} is not partitioned'.format(TABLE))
+        create_partitions(cursor, [month])
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+            columns = next(csv.reader(io.StringIO(f.readline())))
+            cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                partition_name(month), ', '.join(columns)), f)
+        return cursor.rowcount
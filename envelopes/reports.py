@@ -0,0 +1,193 @@
+# Standard Library Imports
+import calendar
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Third Party Library Imports
+import numpy as np
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncYear
+
+# Local Imports
+from .categories import category_map
+from .models import Envelope, Transaction
+
+PERIODS = {'day': TruncDay, 'month': TruncMonth, 'year': TruncYear}
+MAX_HISTORY_DAYS = 366
+MAX_HORIZON_MONTHS = 24
+
+
+class InvalidReport(ValueError):
+    pass
+
+
+def to_cents(amounts):
+    """
+    Fixed-point `int64` cents for an iterable of two-place decimals.
+    """
+    return np.array([int(amount.scaleb(2)) for amount in amounts], dtype=np.int64)
+
+
+def from_cents(cents):
+    return str(Decimal(int(cents)).scaleb(-2))
+
+
+def parse_int(value, default, name, low, high):
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise InvalidReport('Malformed {}'.format(name))
+    if not low <= value <= high:
+        raise InvalidReport('{} must be between {} and {}'.format(name, low, high))
+    return value
+
+
+def parse_month(value, today):
+    if not value:
+        return date(today.year, today.month, 1)
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise InvalidReport('Malformed month, expected YYYY-MM')
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def spending(account_id):
+    """
+    Withdrawals from the envelopes of the account with `account_id`.
+    """
+    return Transaction.objects.filter(
+        envelope__account_id=account_id, action_type=Transaction.ACTION_TYPE_WITHDRAWN)
+
+
+def spend_by_category(transactions, period='month'):
+    """
+    Spend per category and period from the withdrawals in `transactions`.
+
+    The database groups by `(period, category)`; the rows are then laid out
+    as a categories-by-periods matrix of cents, so the response carries each
+    period label once instead of once per category.
+    """
+    if period not in PERIODS:
+        raise InvalidReport('Period must be one of "{}"'.format(sorted(PERIODS)))
+    rows = list(
+        transactions.annotate(period=PERIODS[period]('created'))
+        .values_list('period', 'category_id')
+        .annotate(total=Sum('delta'))
+        .order_by('period', 'category_id'))
+    periods = sorted({row[0] for row in rows})
+    category_ids = sorted({row[1] for row in rows}, key=lambda pk: (pk is not None, pk))
+    spent = np.zeros((len(category_ids), len(periods)), dtype=np.int64)
+    if rows:
+        period_index = {value: i for i, value in enumerate(periods)}
+        category_index = {pk: i for i, pk in enumerate(category_ids)}
+        spent[[category_index[row[1]] for row in rows],
+              [period_index[row[0]] for row in rows]] = -to_cents(row[2] for row in rows)
+    names = category_map().by_id
+    return {
+        'period': period,
+        'periods': [value.date().isoformat() for value in periods],
+        'categories': [
+            {
+                'category': pk,
+                'name': names.get(pk),
+                'spent': [from_cents(cents) for cents in spent[i]],
+            }
+            for i, pk in enumerate(category_ids)
+        ],
+        'totals': [from_cents(cents) for cents in spent.sum(axis=0)],
+    }
+
+
+def budget_vs_actual(account_id, month):
+    """
+    Each envelope's budget against what was withdrawn from it in `month`.
+    """
+    envelopes = list(Envelope.objects.filter(account_id=account_id).order_by('id').values_list(
+        'id', 'uuid', 'name', 'budget'))
+    spent_by_envelope = dict(
+        spending(account_id)
+        .filter(created__gte=month, created__lt=next_month(month))
+        .values_list('envelope_id')
+        .annotate(total=Sum('delta'))
+        .order_by())
+    budget = to_cents(row[3] for row in envelopes)
+    spent = -to_cents(spent_by_envelope.get(row[0], Decimal(0)) for row in envelopes)
+    remaining = budget - spent
+    # percent of budget used, floored; undefined without a budget
+    used = np.where(budget > 0, spent * 100 // np.maximum(budget, 1), -1)
+    return {
+        'month': month.isoformat()[:7],
+        'envelopes': [
+            {
+                'envelope': str(uuid),
+                'name': name,
+                'budget': from_cents(budget[i]),
+                'spent': from_cents(spent[i]),
+                'remaining': from_cents(remaining[i]),
+                'used': None if used[i] < 0 else int(used[i]),
+            }
+            for i, (_, uuid, name, _) in enumerate(envelopes)
+        ],
+        'totals': {
+            'budget': from_cents(budget.sum()),
+            'spent': from_cents(spent.sum()),
+            'remaining': from_cents(remaining.sum()),
+        },
+    }
+
+
+def burn_rate_projection(account_id, now, history_days=90, horizon_months=3):
+    """
+    Project every envelope's balance to the end of each of the next
+    `horizon_months` months at its average daily spend over the last
+    `history_days` days.
+
+    All envelopes are projected at once as an envelopes-by-dates matrix of
+    cents, in integer arithmetic so no rounding drift creeps into the series.
+    """
+    today = now.date()
+    start = datetime.combine(today - timedelta(days=history_days), datetime.min.time())
+    envelopes = list(Envelope.objects.filter(account_id=account_id).order_by('id').values_list(
+        'id', 'uuid', 'name', 'balance'))
+    spent_by_envelope = dict(
+        spending(account_id)
+        .filter(created__gte=start, created__lt=now)
+        .values_list('envelope_id')
+        .annotate(total=Sum('delta'))
+        .order_by())
+    balance = to_cents(row[3] for row in envelopes)
+    spent = -to_cents(spent_by_envelope.get(row[0], Decimal(0)) for row in envelopes)
+
+    dates = []
+    month = date(today.year, today.month, 1)
+    for _ in range(horizon_months):
+        dates.append(month.replace(day=calendar.monthrange(month.year, month.month)[1]))
+        month = next_month(month)
+    days = np.array([(value - today).days for value in dates], dtype=np.int64)
+    projected = balance[:, None] - spent[:, None] * days[None, :] // history_days
+    burning = (spent > 0) & (balance > 0)
+    days_left = np.where(burning, balance * history_days // np.maximum(spent, 1), -1)
+    return {
+        'as_of': now.isoformat(),
+        'history_days': history_days,
+        'dates': [value.isoformat() for value in dates],
+        'envelopes': [
+            {
+                'envelope': str(uuid),
+                'name': name,
+                'balance': from_cents(balance[i]),
+                'daily_burn': from_cents(spent[i] // history_days),
+                'depletes_on': (
+                    (today + timedelta(days=int(days_left[i]))).isoformat()
+                    if days_left[i] >= 0 else None),
+                'projected': [from_cents(cents) for cents in projected[i]],
+            }
+            for i, (_, uuid, name, _) in enumerate(envelopes)
+        ],
+    }
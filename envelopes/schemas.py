@@ -12,6 +12,7 @@ class Account(Schema):
     owner_id = fields.Integer(min=1, required=True, load_from='owner', dump_to='owner')
     created = fields.DateTime()
     modified = fields.DateTime(allow_none=True)
+    version = fields.Integer(dump_only=True)
 
     @post_load
     def make_account(self, data):
@@ -29,12 +30,60 @@ class Envelope(Schema):
     account_id = fields.Integer(min=1, required=True, load_from='account', dump_to='account')
     created = fields.DateTime()
     modified = fields.DateTime(allow_none=True)
+    version = fields.Integer(dump_only=True)
 
     @post_load
     def make_envelope(self, data):
         return self.context['session'].Envelope(**data)
 
 
+def must_not_be_zero(data):
+    if data == 0:
+        raise ValidationError('Amount must not be zero')
+
+
+class Movement(Schema):
+    envelope = fields.UUID(required=True)
+    amount = fields.Decimal(places=2, required=True, as_string=True, validate=[must_not_be_zero])
+
+
+class Movements(Schema):
+    movements = fields.Nested(
+        Movement, many=True, required=True, validate=[validate.Length(min=1)])
+    description = fields.String(validate=[validate.Length(max=100)])
+    comment = fields.String()
+
+
+class Deposit(Schema):
+    amount = fields.Decimal(places=2, required=True, as_string=True, validate=[
+        validate.Range(min=0, error='Amount must be positive'), must_not_be_zero])
+    description = fields.String(validate=[validate.Length(max=100)])
+    comment = fields.String()
+
+
+class Withdrawal(Deposit):
+    category = fields.Integer(min=1, allow_none=True)
+
+
+class EnvelopeBalance(Schema):
+    envelope = fields.UUID()
+    at = fields.DateTime()
+    balance = fields.Decimal(places=2, as_string=True)
+
+
+class AccountRollup(Schema):
+    allocated = fields.Decimal(places=2, as_string=True)
+    budgeted = fields.Decimal(places=2, as_string=True)
+    unallocated = fields.Decimal(places=2, as_string=True)
+    modified = fields.DateTime(allow_none=True)
+
+
+class CategorySpend(Schema):
+    category_id = fields.Integer(allow_none=True, dump_to='category')
+    period = fields.Date()
+    spent = fields.Decimal(places=2, as_string=True)
+
+
 class Category(Schema):
     id = fields.Integer(min=1)
     name = fields.String(validate=[validate.Length(max=80)])
@@ -63,3 +112,14 @@ class Transaction(Schema):
     description = fields.String(validate=[validate.Length(max=100)])
     category_id = fields.Integer(min=1, required=True, load_from='category', dump_to='category')
     comment = fields.String()
+    transfer_id = fields.UUID(allow_none=True, dump_only=True)
+
+
+class Transfer(Schema):
+    source = fields.UUID(required=True)
+    target = fields.UUID(required=True)
+    amount = fields.Decimal(places=2, required=True, as_string=True, validate=[
+        validate.Range(min=0, error='Amount must be positive'), must_not_be_zero])
+    allow_overdraft = fields.Boolean(missing=True)
+    description = fields.String(validate=[validate.Length(max=100)])
+    comment = fields.String()
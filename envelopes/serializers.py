@@ -0,0 +1,96 @@
+# Standard Library Imports
+import decimal
+
+# Third Party Library Imports
+from marshmallow import fields, utils
+
+
+def compile_field(name, field):
+    """
+    Return a function formatting one raw column value the way `field` does.
+
+    Common field types get a direct formatter; anything else goes through
+    the field's own `serialize` so the output always matches `dump()`.
+    """
+    column = field.attribute or name
+    if isinstance(field, fields.Decimal) and field.places is not None and not field.allow_nan:
+        places, rounding, as_string = field.places, field.rounding, field.as_string
+
+        def format_decimal(value):
+            if value is None:
+                return None
+            if not isinstance(value, decimal.Decimal) or not value.is_finite():
+                return field.serialize(name, {column: value})
+            value = value.quantize(places, rounding=rounding)
+            return format(value, 'f') if as_string else value
+        return format_decimal
+
+    if isinstance(field, fields.Integer) and not field.as_string and not field.strict:
+        return lambda value: None if value is None else int(value)
+
+    if isinstance(field, (fields.UUID, fields.String)):
+        return lambda value: None if value is None else str(value)
+
+    if (isinstance(field, fields.DateTime) and not field.localtime and
+            (field.dateformat or field.DEFAULT_FORMAT) == 'iso'):
+        def format_datetime(value):
+            if value is None:
+                return None
+            if value.tzinfo is None:
+                return value.isoformat() + '+00:00'
+            return utils.isoformat(value)
+        return format_datetime
+
+    return lambda value: field.serialize(name, {column: value})
+
+
+class CompiledSerializer:
+    """
+    Dumps `values_list()` rows with the output of a marshmallow schema.
+
+    The schema's fields are resolved once into a column list and a formatter
+    per column, so serializing a row is a single pass over a tuple with no
+    per-object attribute lookups or field dispatch. Rows may carry extra
+    trailing columns (for example pagination keys); they are ignored.
+
+    `keys` restricts the output, and the columns read, to those output keys.
+    """
+
+    def __init__(self, schema, keys=None):
+        self.schema = schema
+        names = [
+            name for name in schema._declared_fields
+            if name in schema.fields and not schema.fields[name].load_only
+        ]
+        if keys is not None:
+            names = [name for name in names if (schema.fields[name].dump_to or name) in keys]
+        self.columns = tuple(schema.fields[name].attribute or name for name in names)
+        self.keys = tuple(schema.fields[name].dump_to or name for name in names)
+        self.formatters = tuple(compile_field(name, schema.fields[name]) for name in names)
+        self._plan = tuple(zip(range(len(names)), self.keys, self.formatters))
+        self._projections = {}
+
+    def project(self, keys):
+        """
+        Return a serializer for the subset `keys` of this one's output keys.
+        Raises `ValueError` naming any key it does not dump.
+        """
+        keys = frozenset(keys)
+        unknown = keys.difference(self.keys)
+        if unknown:
+            raise ValueError('Unknown fields "{}"'.format(', '.join(sorted(unknown))))
+        if keys == frozenset(self.keys):
+            return self
+        if keys not in self._projections:
+            self._projections[keys] = CompiledSerializer(self.schema, keys)
+        return self._projections[keys]
+
+    def columns_with(self, *extra):
+        return self.columns + tuple(column for column in extra if column not in self.columns)
+
+    def dump(self, row):
+        return {key: formatter(row[index]) for index, key, formatter in self._plan}
+
+    def dump_many(self, rows):
+        plan = self._plan
+        return [{key: formatter(row[index]) for index, key, formatter in plan} for row in rows]
@@ -0,0 +1,76 @@
+# Standard Library Imports
+import csv
+import io
+import json
+from itertools import islice
+
+EXPORT_CHUNK_SIZE = 500
+
+CONTENT_TYPE_NDJSON = 'application/x-ndjson'
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_CSV = 'text/csv; charset=utf-8'
+
+
+def iter_chunks(iterable, size=EXPORT_CHUNK_SIZE):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_dumped(queryset, schema, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield lists of serialized rows, `chunk_size` at a time.
+
+    `.iterator()` streams the rows through a server-side cursor on Postgres
+    instead of filling the queryset result cache, so only one chunk of model
+    instances and their dumped dicts is ever held in memory.
+    """
+    for chunk in iter_chunks(queryset.iterator(), chunk_size):
+        yield schema.dump(chunk, many=True).data
+
+
+def field_names(schema):
+    """
+    Output keys of `schema` in declaration order, honouring `dump_to`.
+    """
+    return [
+        schema.fields[name].dump_to or name
+        for name in schema._declared_fields
+        if name in schema.fields
+    ]
+
+
+def ndjson_stream(queryset, schema, chunk_size=EXPORT_CHUNK_SIZE):
+    for rows in iter_dumped(queryset, schema, chunk_size):
+        yield ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+
+
+def json_array_stream(queryset, schema, chunk_size=EXPORT_CHUNK_SIZE):
+    separator = '['
+    for rows in iter_dumped(queryset, schema, chunk_size):
+        yield (separator + ','.join(json.dumps(row) for row in rows)).encode('utf-8')
+        separator = ','
+    yield b'[]' if separator == '[' else b']'
+
+
+def csv_stream(queryset, schema, chunk_size=EXPORT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=field_names(schema), extrasaction='ignore')
+    writer.writeheader()
+    for rows in iter_dumped(queryset, schema, chunk_size):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_stream, CONTENT_TYPE_NDJSON),
+    'json': (json_array_stream, CONTENT_TYPE_JSON),
+    'csv': (csv_stream, CONTENT_TYPE_CSV),
+}
@@ -42,6 +42,7 @@ class ActionTypeEnum(typesystem.Enum):
         models.Transaction.ACTION_TYPE_CREATED,
         models.Transaction.ACTION_TYPE_DEPOSITED,
         models.Transaction.ACTION_TYPE_WITHDRAWN,
+        models.Transaction.ACTION_TYPE_TRANSFERRED,
     ]
 
 
@@ -57,4 +58,5 @@ class Transaction(typesystem.Object):
         'description': typesystem.string(max_length=100),
         'category': typesystem.integer(minimum=1),
         'comment': typesystem.string(),
+        'transfer_id': typesystem.string(),
     }
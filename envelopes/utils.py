@@ -1,6 +1,13 @@
+# Standard Library Imports
+import os
+import threading
+import time
+
 # Third Party Library Imports
 from django.conf import settings
-from hashids import Hashids
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from hashids import Hashids, _hash, _reorder
 
 hashid = Hashids(
     min_length=8,
@@ -8,6 +15,171 @@ hashid = Hashids(
     alphabet='0123456789ACDEFGHIJKLOQRSTUVWXYZ',
 )
 
+# 2017-07-14T02:40:00Z, before the first transaction was recorded
+FRIENDLY_ID_EPOCH_MS = 1500000000000
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+# first key of the advisory locks that lease worker numbers ('FRID')
+WORKER_LOCK_SPACE = 0x46524944
+
 
 def encode(num):
     return hashid.encode(num)
+
+
+class WorkerLease:
+    """
+    A friendly id worker number held for as long as this object's database
+    session lives.
+
+    The number is a PostgreSQL session advisory lock on
+    `(WORKER_LOCK_SPACE, worker)`, taken on a connection of the lease's own,
+    so no two live processes, on any host, hold the same number and a
+    process that dies gives its number back with its session.
+    """
+
+    def __init__(self, db_connection, worker):
+        self.connection = db_connection
+        self.worker = worker
+
+    @classmethod
+    def acquire(cls, start=0):
+        """
+        Lease the first free worker number from `start` on, wrapping around.
+        Raises `ImproperlyConfigured` when the database cannot hand out
+        leases or every number is taken.
+        """
+        if connection.vendor != 'postgresql':
+            raise ImproperlyConfigured(
+                'Friendly id workers are leased from PostgreSQL; on {} set a distinct '
+                'FRIENDLY_ID_WORKER for every process'.format(connection.vendor))
+        db_connection = connection.Database.connect(**connection.get_connection_params())
+        db_connection.autocommit = True
+        with db_connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT worker
+                FROM (SELECT (n + %(start)s) %% %(count)s AS worker
+                      FROM generate_series(0, %(count)s - 1) AS n) candidates
+                WHERE pg_try_advisory_lock(%(space)s, worker)
+                LIMIT 1
+            """, {'start': start, 'count': MAX_WORKER + 1, 'space': WORKER_LOCK_SPACE})
+            row = cursor.fetchone()
+        if row is None:
+            db_connection.close()
+            raise ImproperlyConfigured(
+                'All {} friendly id workers are leased'.format(MAX_WORKER + 1))
+        return cls(db_connection, row[0])
+
+    def release(self):
+        self.connection.close()
+
+
+class FriendlyIdGenerator:
+    """
+    Snowflake ids encoded with the configured Hashids alphabet.
+
+    Each id packs milliseconds since `FRIENDLY_ID_EPOCH_MS`, a worker number
+    and a per-millisecond sequence into one integer, so ids are unique
+    across workers, increase monotonically within a process and need no
+    database round trip. When the sequence of a millisecond is exhausted the
+    clock is advanced logically instead of sleeping, and a clock that steps
+    backwards is ignored, so ids never repeat or decrease.
+
+    Every process needs a worker number of its own. A configured `worker`
+    (`FRIENDLY_ID_WORKER`) is used as is, so only set it when each process
+    gets a distinct value. Otherwise `lease()` is called, in each process
+    and again after a fork, for a `WorkerLease`. Without either, asking for
+    an id raises `ImproperlyConfigured` rather than risk a collision.
+    """
+
+    def __init__(self, hashids, worker=None, lease=None):
+        self._hashids = hashids
+        self._configured_worker = worker
+        self._lease = lease
+        self._leases = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._worker_bits = 0
+        self._last_ms = -1
+        self._sequence = 0
+        # Encoding a single number only depends on `number % 100`, so the
+        # lottery character and shuffled alphabet are precomputed per value
+        # with the library's own helpers; output is identical to `encode()`.
+        alphabet = hashids._alphabet
+        self._alphabets = []
+        for values_hash in range(100):
+            lottery = alphabet[values_hash % len(alphabet)]
+            shuffled = _reorder(alphabet, (lottery + hashids._salt + alphabet)[:len(alphabet)])
+            self._alphabets.append((lottery, shuffled))
+
+    def _worker(self):
+        if self._configured_worker not in (None, ''):
+            worker = int(self._configured_worker)
+            if not 0 <= worker <= MAX_WORKER:
+                raise ImproperlyConfigured(
+                    'FRIENDLY_ID_WORKER must be between 0 and {}'.format(MAX_WORKER))
+            return worker
+        if self._lease is None:
+            raise ImproperlyConfigured('Set FRIENDLY_ID_WORKER or lease friendly id workers')
+        # Leases taken before a fork stay referenced: closing the parent's
+        # connection from here would end its session and free its number.
+        self._leases.append(self._lease())
+        return self._leases[-1].worker
+
+    def release(self):
+        """
+        Give back the worker number this process leased; the next id leases
+        one again.
+        """
+        with self._lock:
+            if self._pid == os.getpid() and self._leases:
+                self._leases.pop().release()
+            self._pid = None
+
+    def next_numbers(self, count):
+        """
+        Reserve `count` consecutive snowflake numbers.
+        """
+        numbers = []
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                # the clock state carries over, so a re-leased number never repeats an id
+                self._pid, self._worker_bits = pid, self._worker() << SEQUENCE_BITS
+            now = int(time.time() * 1000) - FRIENDLY_ID_EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms, self._sequence = now, 0
+            while count:
+                available = MAX_SEQUENCE + 1 - self._sequence
+                if not available:
+                    self._last_ms, self._sequence = self._last_ms + 1, 0
+                    continue
+                taken = min(count, available)
+                base = (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | self._worker_bits
+                numbers.extend(range(base | self._sequence, base | (self._sequence + taken)))
+                self._sequence += taken
+                count -= taken
+        return numbers
+
+    def encode(self, number):
+        lottery, alphabet = self._alphabets[number % 100]
+        encoded = lottery + _hash(number, alphabet)
+        if len(encoded) < self._hashids._min_length:
+            return self._hashids.encode(number)
+        return encoded
+
+    def next_id(self):
+        return self.encode(self.next_numbers(1)[0])
+
+    def next_ids(self, count):
+        encode = self.encode
+        return [encode(number) for number in self.next_numbers(count)]
+
+
+friendly_ids = FriendlyIdGenerator(
+    hashid,
+    worker=getattr(settings, 'FRIENDLY_ID_WORKER', None),
+    lease=lambda: WorkerLease.acquire(start=os.getpid() & MAX_WORKER),
+)
@@ -1,28 +1,115 @@
+# Standard Library Imports
+import hashlib
+from collections import defaultdict
+from decimal import Decimal
+from operator import itemgetter
+
 # Third Party Library Imports
 from apistar import Response, http
 from apistar.backends.django_orm import Session
 from apistar.interfaces import Auth
-from django.core.exceptions import ObjectDoesNotExist
+from dateutil import parser as date_parser
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.utils import timezone
+from werkzeug.http import http_date, parse_date
 
 # Local Imports
-from . import schemas
+from . import fieldsets, imports, ledger, reports, schemas
+from .cache import row_cache
+from .categories import category_map
+from .db.pool import render_pool_metrics
+from .fieldsets import InvalidFieldset, Relation
 from .forms import AccountForm, CategoryForm, EnvelopeForm, TransactionForm
+from .idempotency import idempotent
+from .instrumentation import request_metrics
+from .models import ConcurrentUpdate, Envelope, InsufficientFunds, Transaction
+from .pagination import InvalidCursor, paginate
+from .serializers import CompiledSerializer
+from .streaming import EXPORT_FORMATS
 
 account_schema = schemas.Account(exclude=('id',))
 category_schema = schemas.Category(exclude=('id',))
 envelope_schema = schemas.Envelope(exclude=('id',))
-transaction_schema = schemas.Envelope(exclude=('id',))
+transaction_schema = schemas.Transaction(exclude=('id',))
+rollup_schema = schemas.AccountRollup()
+category_spend_schema = schemas.CategorySpend()
+movements_schema = schemas.Movements()
+transfer_schema = schemas.Transfer()
+deposit_schema = schemas.Deposit()
+withdrawal_schema = schemas.Withdrawal()
+envelope_balance_schema = schemas.EnvelopeBalance()
+
+account_serializer = CompiledSerializer(account_schema)
+envelope_serializer = CompiledSerializer(envelope_schema)
+transaction_serializer = CompiledSerializer(transaction_schema)
+
+transaction_relation = Relation(
+    'transactions', Transaction, 'envelope_id', transaction_serializer)
+envelope_relations = {'transactions': transaction_relation}
+account_relations = {
+    'envelopes': Relation(
+        'envelopes', Envelope, 'account_id', envelope_serializer,
+        children=[transaction_relation]),
+}
 
 
 def retrieve(queryset):
     try:
-        if queryset.exists():
-            return {'obj': queryset.get(), 'error': False, 'exception': None}
-    except ObjectDoesNotExist as e:
+        return {'obj': queryset.get(), 'error': False, 'exception': None}
+    except ObjectDoesNotExist:
+        return {'obj': None, 'error': True, 'exception': None}
+    except Exception as e:
         return {'obj': None, 'error': True, 'exception': e}
-    except Exception as f:
-        return {'obj': None, 'error': True, 'exception': f}
-    return {'obj': queryset, 'error': True, 'exception': None}
+
+
+def request_user(session, auth):
+    # reference the authenticated user by key without loading the row
+    return session.User(pk=auth.user['id'])
+
+
+def etag(version):
+    return '"{}"'.format(version)
+
+
+def etag_matches(header, tag, weak=False):
+    tags = [value.strip() for value in header.split(',')]
+    if weak:
+        tags = [value[2:] if value.startswith('W/') else value for value in tags]
+    return '*' in tags or tag in tags
+
+
+def precondition_failed(if_match, obj):
+    return bool(if_match) and not etag_matches(if_match, etag(obj.version))
+
+
+def last_modified(data):
+    # rows that were never updated carry no `modified`; HTTP dates are UTC seconds
+    stamp = data.get('modified') or data.get('created')
+    if not stamp:
+        return None
+    modified = date_parser.parse(stamp)
+    return modified.astimezone(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def conditional_response(data, if_none_match, if_modified_since):
+    """
+    Respond with `data`, or with 304 when the client's copy is current.
+
+    `If-None-Match` is compared weakly against the version ETag and, when
+    present, `If-Modified-Since` is ignored as RFC 7232 requires.
+    """
+    headers = {'ETag': etag(data['version'])}
+    modified = last_modified(data)
+    if modified is not None:
+        headers['Last-Modified'] = http_date(modified)
+    if if_none_match:
+        fresh = etag_matches(if_none_match, headers['ETag'], weak=True)
+    else:
+        since = parse_date(if_modified_since) if if_modified_since else None
+        fresh = since is not None and modified is not None and modified <= since
+    if fresh:
+        return Response(b'', status=304, headers=headers)
+    return Response(data, headers=headers)
 
 
 def handle_error(props):
@@ -31,23 +118,80 @@ def handle_error(props):
     return Response({'message': 'Not found'}, status=404)
 
 
-def list_accounts(request: http.Request, auth: Auth, session: Session):
+def filter_created(queryset, params):
+    """
+    Narrow `queryset` to `since <= created < until` from the query string.
+
+    Transactions are partitioned by month on `created`, so a bounded range
+    only reads the partitions it overlaps. Raises `ValueError` for a
+    malformed bound.
+    """
+    bounds = {}
+    for param, lookup in (('since', 'created__gte'), ('until', 'created__lt')):
+        value = params.get(param)
+        if value:
+            try:
+                bounds[lookup] = date_parser.parse(value)
+            except (ValueError, OverflowError):
+                raise ValueError('Malformed {}'.format(param))
+    return queryset.filter(**bounds)
+
+
+def list_page(queryset, params, serializer, if_none_match=None, relations=None):
+    """
+    One keyset page of `queryset`. `?fields=` narrows the columns read and
+    the keys dumped, and `?include=` embeds the newest rows of `relations`
+    under every result with one query per relation.
+    """
+    try:
+        serializer = fieldsets.project(serializer, params.get('fields'))
+        included = fieldsets.resolve_includes(params.get('include'), relations or {})
+    except InvalidFieldset as e:
+        return Response({'message': str(e)}, status=400)
+    columns = serializer.columns_with('created', 'id')
+    key = itemgetter(columns.index('created'), columns.index('id'))
+    id_index = columns.index('id')
+    try:
+        rows, next_cursor, previous_cursor = paginate(
+            queryset.values_list(*columns), params, key=key)
+        loaded = fieldsets.load(rows, id_index, included, params)
+    except (InvalidCursor, InvalidFieldset) as e:
+        return Response({'message': str(e)}, status=400)
+    # the page body is a pure function of its rows, embedded rows and cursors,
+    # so a matching validator is answered without serializing anything
+    page = repr((
+        columns, rows, fieldsets.fingerprint(loaded), next_cursor, previous_cursor,
+    )).encode('utf-8')
+    headers = {'ETag': '"{}"'.format(hashlib.sha1(page).hexdigest())}
+    if if_none_match and etag_matches(if_none_match, headers['ETag'], weak=True):
+        return Response(b'', status=304, headers=headers)
+    results = serializer.dump_many(rows)
+    fieldsets.embed(results, [row[id_index] for row in rows], loaded)
+    return Response({
+        'results': results,
+        'next': next_cursor,
+        'previous': previous_cursor,
+    }, headers=headers)
+
+
+def list_accounts(request: http.Request, auth: Auth, session: Session, params: http.QueryParams, if_none_match: http.Header):  # noqa; E501
     queryset = session.Account.objects.filter(owner=auth.user['id'])
-    accounts = account_schema.dump(queryset, many=True)
-    return accounts.data
+    return list_page(queryset, params, account_serializer, if_none_match, account_relations)
 
 
-def get_account(request: http.Request, auth: Auth, session: Session, uuid):
-    queryset = session.Account.objects.filter(uuid=uuid).filter(owner=auth.user['id'])
-    props = retrieve(queryset)
-    if props['error']:
-        return handle_error(props)
-    account, errors = account_schema.dump(props['obj'])
-    if errors:
-        return Response(errors, status=400)
-    return account
+def get_account(request: http.Request, auth: Auth, session: Session, uuid, if_none_match: http.Header, if_modified_since: http.Header):  # noqa; E501
+    key, account = row_cache.get('account', auth.user['id'], uuid)
+    if account is None:
+        queryset = session.Account.objects.filter(uuid=uuid, owner=auth.user['id'])
+        props = retrieve(queryset.values_list(*account_serializer.columns))
+        if props['error']:
+            return handle_error(props)
+        account = account_serializer.dump(props['obj'])
+        row_cache.set(key, account)
+    return conditional_response(account, if_none_match, if_modified_since)
 
 
+@idempotent
 def create_account(request: http.Request, auth: Auth, session: Session, data: http.RequestData):
     account_schema.context['session'] = session
     if hasattr(data, 'get') and not data.get('owner'):
@@ -59,44 +203,135 @@ def create_account(request: http.Request, auth: Auth, session: Session, data: ht
     return Response(account_schema.dump(account).data, status=201)
 
 
-def update_account(request: http.Request, auth: Auth, session: Session, data: http.RequestData, uuid):  # noqa; E501
-    queryset = session.Account.objects.filter(uuid=uuid).filter(owner=auth.user['id'])
+def update_account(request: http.Request, auth: Auth, session: Session, data: http.RequestData, uuid, if_match: http.Header):  # noqa; E501
+    queryset = session.Account.objects.filter(uuid=uuid, owner=auth.user['id'])
     props = retrieve(queryset)
     if props['error']:
         return handle_error(props)
+    if precondition_failed(if_match, props['obj']):
+        return Response({'message': 'Precondition failed'}, status=412)
     form = AccountForm(data, instance=props['obj'])
     if form.is_valid():
-        account = form.save()
-        return account_schema.dump(account).data
+        account = form.save(commit=False)
+        if not account.save_versioned(form._meta.fields):
+            return Response({'message': 'Conflict'}, status=409)
+        return Response(account_schema.dump(account).data, headers={'ETag': etag(account.version)})
     return Response(form.errors, status=400)
 
 
-def delete_account(request: http.Request, auth: Auth, session: Session, uuid):
-    queryset = session.Account.objects.filter(uuid=uuid).filter(owner=auth.user['id'])
+def delete_account(request: http.Request, auth: Auth, session: Session, uuid, if_match: http.Header):  # noqa; E501
+    queryset = session.Account.objects.filter(uuid=uuid, owner=auth.user['id'])
     props = retrieve(queryset)
     if props['error']:
         return handle_error(props)
+    if precondition_failed(if_match, props['obj']):
+        return Response({'message': 'Precondition failed'}, status=412)
     props['obj'].delete()
     return Response(None, status=204)
 
 
-def list_envelopes(request: http.Request, auth: Auth, session: Session):
-    queryset = session.Envelope.objects.filter(account__owner_id=auth.user['id'])
-    envelopes = envelope_schema.dump(queryset, many=True)
-    return envelopes.data
-
-
-def get_envelope(request: http.Request, auth: Auth, session: Session, uuid):
-    queryset = session.Envelope.objects.filter(uuid=uuid).filter(account__owner_id=auth.user['id'])
+def get_account_summary(request: http.Request, auth: Auth, session: Session, uuid):
+    queryset = session.Account.objects.select_related('rollup').filter(
+        uuid=uuid, owner=auth.user['id'])
     props = retrieve(queryset)
     if props['error']:
         return handle_error(props)
-    envelope, errors = envelope_schema.dump(props['obj'])
-    if errors:
-        return Response(errors, status=400)
-    return envelope
-
-
+    account = props['obj']
+    try:
+        rollup = account.rollup
+    except ObjectDoesNotExist:
+        rollup = session.AccountRollup(account=account)
+    rollup.add_pending()
+    period = session.CategorySpend.period_for(timezone.now())
+    spend = session.CategorySpend.objects.filter(account=account, period=period)
+    summary = rollup_schema.dump(rollup).data
+    summary['account'] = str(account.uuid)
+    summary['period'] = period.isoformat()
+    summary['spend'] = category_spend_schema.dump(spend, many=True).data
+    return summary
+
+
+def report_account_id(session, auth, uuid):
+    return session.Account.objects.filter(uuid=uuid, owner=auth.user['id']).values_list(
+        'id', flat=True).first()
+
+
+def get_spend_report(request: http.Request, auth: Auth, session: Session, params: http.QueryParams, uuid):  # noqa; E501
+    account_id = report_account_id(session, auth, uuid)
+    if account_id is None:
+        return Response({'message': 'Not found'}, status=404)
+    try:
+        transactions = filter_created(reports.spending(account_id), params)
+        report = reports.spend_by_category(transactions, params.get('period') or 'month')
+    except ValueError as e:
+        return Response({'message': str(e)}, status=400)
+    report['account'] = uuid
+    return report
+
+
+def get_budget_report(request: http.Request, auth: Auth, session: Session, params: http.QueryParams, uuid):  # noqa; E501
+    account_id = report_account_id(session, auth, uuid)
+    if account_id is None:
+        return Response({'message': 'Not found'}, status=404)
+    try:
+        month = reports.parse_month(params.get('month'), timezone.now())
+    except ValueError as e:
+        return Response({'message': str(e)}, status=400)
+    report = reports.budget_vs_actual(account_id, month)
+    report['account'] = uuid
+    return report
+
+
+def get_projection_report(request: http.Request, auth: Auth, session: Session, params: http.QueryParams, uuid):  # noqa; E501
+    account_id = report_account_id(session, auth, uuid)
+    if account_id is None:
+        return Response({'message': 'Not found'}, status=404)
+    try:
+        history_days = reports.parse_int(
+            params.get('history'), 90, 'history', 1, reports.MAX_HISTORY_DAYS)
+        horizon_months = reports.parse_int(
+            params.get('months'), 3, 'months', 1, reports.MAX_HORIZON_MONTHS)
+    except ValueError as e:
+        return Response({'message': str(e)}, status=400)
+    report = reports.burn_rate_projection(
+        account_id, timezone.now(), history_days=history_days, horizon_months=horizon_months)
+    report['account'] = uuid
+    return report
+
+
+def apply_rollups(session, dt, changes):
+    """
+    Apply `(account_id, allocated, budgeted)` deltas to the account rollups,
+    one per account.
+    """
+    totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    for account_id, allocated, budgeted in changes:
+        totals[account_id][0] += allocated
+        totals[account_id][1] += budgeted
+    for account_id in sorted(totals):
+        allocated, budgeted = totals[account_id]
+        if allocated or budgeted:
+            session.AccountRollup.apply(account_id, dt, allocated=allocated, budgeted=budgeted)
+
+
+def list_envelopes(request: http.Request, auth: Auth, session: Session, params: http.QueryParams, if_none_match: http.Header):  # noqa; E501
+    queryset = session.Envelope.objects.filter(owner_id=auth.user['id'])
+    return list_page(queryset, params, envelope_serializer, if_none_match, envelope_relations)
+
+
+def get_envelope(request: http.Request, auth: Auth, session: Session, uuid, if_none_match: http.Header, if_modified_since: http.Header):  # noqa; E501
+    key, envelope = row_cache.get('envelope', auth.user['id'], uuid)
+    if envelope is None:
+        queryset = session.Envelope.objects.filter(uuid=uuid, owner_id=auth.user['id'])
+        props = retrieve(queryset.values_list(*envelope_serializer.columns))
+        if props['error']:
+            return handle_error(props)
+        envelope = envelope_serializer.dump(props['obj'])
+        row_cache.set(key, envelope)
+    return conditional_response(envelope, if_none_match, if_modified_since)
+
+
+@idempotent
 def create_envelope(request: http.Request, auth: Auth, session: Session, data: http.RequestData):
     envelope_schema.context['session'] = session
     if hasattr(data, 'get') and not data.get('creator'):
@@ -104,31 +339,200 @@ def create_envelope(request: http.Request, auth: Auth, session: Session, data: h
     envelope, errors = envelope_schema.load(data)
     if errors:
         return Response(errors, status=400)
+    account = session.Account.objects.only('id', 'owner_id').filter(
+        pk=envelope.account_id, owner=auth.user['id']).first()
+    if account is None:
+        return Response({'account': ['Unknown account.']}, status=400)
+    now = timezone.now()
+    envelope.account = account
+    envelope.created = envelope.created or now
+    envelope.modified = envelope.modified or envelope.created
     envelope.save()
+    # the opening balance is the first ledger entry
+    session.Transaction.create(
+        request_user(session, auth), envelope, session.Transaction.ACTION_TYPE_CREATED,
+        envelope.balance, envelope.created)
+    apply_rollups(session, now, [(account.id, envelope.balance, envelope.budget)])
     return Response(envelope_schema.dump(envelope).data, status=201)
 
 
-def update_envelope(request: http.Request, auth: Auth, session: Session, data: http.RequestData, uuid):  # noqa; E501
-    queryset = session.Envelope.objects.filter(uuid=uuid).filter(account__owner_id=auth.user['id'])
+def update_envelope(request: http.Request, auth: Auth, session: Session, data: http.RequestData, uuid, if_match: http.Header):  # noqa; E501
+    queryset = session.Envelope.objects.filter(uuid=uuid, owner_id=auth.user['id'])
     props = retrieve(queryset)
     if props['error']:
         return handle_error(props)
+    if precondition_failed(if_match, props['obj']):
+        return Response({'message': 'Precondition failed'}, status=412)
+    before = (props['obj'].account_id, props['obj'].balance, props['obj'].budget)
     form = EnvelopeForm(data, instance=props['obj'])
+    form.fields['account'].queryset = session.Account.objects.filter(owner=auth.user['id'])
     if form.is_valid():
-        envelope = form.save()
-        return envelope_schema.dump(envelope).data
+        envelope = form.save(commit=False)
+        envelope.modified = timezone.now()
+        if not envelope.save_versioned(set(form._meta.fields) | {'modified'}):
+            return Response({'message': 'Conflict'}, status=409)
+        account_id, balance, budget = before
+        if envelope.balance != balance:
+            # keep the ledger summing to the edited balance
+            delta = envelope.balance - balance
+            session.Transaction.create(
+                request_user(session, auth), envelope,
+                session.Transaction.ACTION_TYPE_DEPOSITED if delta > 0 else
+                session.Transaction.ACTION_TYPE_WITHDRAWN,
+                delta, envelope.modified, description='Balance edited')
+        apply_rollups(session, envelope.modified, [
+            (account_id, -balance, -budget),
+            (envelope.account_id, envelope.balance, envelope.budget),
+        ])
+        envelope_data = envelope_schema.dump(envelope).data
+        return Response(envelope_data, headers={'ETag': etag(envelope.version)})
     return Response(form.errors, status=400)
 
 
-def delete_envelope(request: http.Request, auth: Auth, session: Session, uuid):
-    queryset = session.Envelope.objects.filter(uuid=uuid).filter(account__owner=auth.user['id'])
+def delete_envelope(request: http.Request, auth: Auth, session: Session, uuid, if_match: http.Header):  # noqa; E501
+    queryset = session.Envelope.objects.filter(uuid=uuid, owner_id=auth.user['id']).only(
+        'id', 'uuid', 'version', 'account_id', 'balance', 'budget')
     props = retrieve(queryset)
     if props['error']:
         return handle_error(props)
-    props['obj'].delete()
+    envelope = props['obj']
+    if precondition_failed(if_match, envelope):
+        return Response({'message': 'Precondition failed'}, status=412)
+    envelope.delete()
+    apply_rollups(
+        session, timezone.now(), [(envelope.account_id, -envelope.balance, -envelope.budget)])
     return Response(None, status=204)
 
 
+def get_envelope_balance(request: http.Request, auth: Auth, session: Session, params: http.QueryParams, uuid):  # noqa; E501
+    envelope_id = session.Envelope.objects.filter(
+        uuid=uuid, owner_id=auth.user['id']).values_list('id', flat=True).first()
+    if envelope_id is None:
+        return Response({'message': 'Not found'}, status=404)
+    at = params.get('at')
+    if at:
+        try:
+            at = date_parser.parse(at)
+        except (ValueError, OverflowError):
+            return Response({'message': 'Malformed at'}, status=400)
+    else:
+        at = timezone.now()
+    return envelope_balance_schema.dump({
+        'envelope': uuid,
+        'at': at,
+        'balance': session.BalanceSnapshot.balance_at(envelope_id, at),
+    }).data
+
+
+def balance_change_response(envelope, transaction):
+    return Response({
+        'envelope': envelope_schema.dump(envelope).data,
+        'transaction': transaction_schema.dump(transaction).data,
+    }, status=201, headers={'ETag': etag(envelope.version)})
+
+
+@idempotent
+def deposit_into_envelope(request: http.Request, auth: Auth, session: Session, data: http.RequestData, uuid):  # noqa; E501
+    deposit, errors = deposit_schema.load(data)
+    if errors:
+        return Response(errors, status=400)
+    try:
+        envelope, transaction = ledger.deposit(
+            uuid,
+            request_user(session, auth),
+            deposit['amount'],
+            timezone.now(),
+            description=deposit.get('description'),
+            comment=deposit.get('comment'),
+            owner=auth.user['id'],
+        )
+    except ValidationError:
+        return Response({'message': 'Bad request'}, status=400)
+    except ObjectDoesNotExist:
+        return Response({'message': 'Not found'}, status=404)
+    except ConcurrentUpdate:
+        return Response({'message': 'Conflict'}, status=409)
+    return balance_change_response(envelope, transaction)
+
+
+@idempotent
+def withdraw_from_envelope(request: http.Request, auth: Auth, session: Session, data: http.RequestData, uuid):  # noqa; E501
+    withdrawal, errors = withdrawal_schema.load(data)
+    if errors:
+        return Response(errors, status=400)
+    category = withdrawal.get('category')
+    if category is not None:
+        if category not in category_map():
+            return Response({'category': ['Unknown category.']}, status=400)
+        category = session.Category(pk=category)
+    try:
+        envelope, transaction = ledger.withdraw(
+            uuid,
+            request_user(session, auth),
+            withdrawal['amount'],
+            timezone.now(),
+            description=withdrawal.get('description'),
+            comment=withdrawal.get('comment'),
+            category=category,
+            owner=auth.user['id'],
+        )
+    except ValidationError:
+        return Response({'message': 'Bad request'}, status=400)
+    except ObjectDoesNotExist:
+        return Response({'message': 'Not found'}, status=404)
+    except ConcurrentUpdate:
+        return Response({'message': 'Conflict'}, status=409)
+    return balance_change_response(envelope, transaction)
+
+
+@idempotent
+def move_envelope_funds(request: http.Request, auth: Auth, session: Session, data: http.RequestData):  # noqa; E501
+    batch, errors = movements_schema.load(data)
+    if errors:
+        return Response(errors, status=400)
+    try:
+        transactions = session.Envelope.apply_movements(
+            request_user(session, auth),
+            [(movement['envelope'], movement['amount']) for movement in batch['movements']],
+            timezone.now(),
+            description=batch.get('description'),
+            comment=batch.get('comment'),
+            owner=auth.user['id'],
+        )
+    except ObjectDoesNotExist:
+        return Response({'message': 'Not found'}, status=404)
+    return Response(transaction_schema.dump(transactions, many=True).data, status=201)
+
+
+@idempotent
+def transfer_envelope_funds(request: http.Request, auth: Auth, session: Session, data: http.RequestData):  # noqa; E501
+    transfer, errors = transfer_schema.load(data)
+    if errors:
+        return Response(errors, status=400)
+    if transfer['source'] == transfer['target']:
+        return Response({'message': 'Source and target must differ'}, status=400)
+    try:
+        transfer_id, transactions = session.Envelope.transfer(
+            transfer['source'],
+            transfer['target'],
+            request_user(session, auth),
+            transfer['amount'],
+            timezone.now(),
+            description=transfer.get('description'),
+            comment=transfer.get('comment'),
+            allow_overdraft=transfer['allow_overdraft'],
+            owner=auth.user['id'],
+        )
+    except ObjectDoesNotExist:
+        return Response({'message': 'Not found'}, status=404)
+    except InsufficientFunds as e:
+        return Response({'message': str(e)}, status=409)
+    return Response({
+        'transfer_id': str(transfer_id),
+        'transactions': transaction_schema.dump(transactions, many=True).data,
+    }, status=201)
+
+
 def list_categories(request: http.Request, auth: Auth, session: Session):
     queryset = session.Category.objects.all()
     categories = category_schema.dump(queryset, many=True)
@@ -136,11 +540,10 @@ def list_categories(request: http.Request, auth: Auth, session: Session):
 
 
 def get_category(request: http.Request, auth: Auth, session: Session, name):
-    queryset = session.Category.objects.filter(name=name)
-    props = retrieve(queryset)
-    if props['error']:
-        return handle_error(props)
-    category, errors = category_schema.dump(props['obj'])
+    pk = category_map().by_name.get(name)
+    if pk is None:
+        return Response({'message': 'Not found'}, status=404)
+    category, errors = category_schema.dump(session.Category(pk=pk, name=name))
     if errors:
         return Response(errors, status=400)
     return category
@@ -156,11 +559,10 @@ def create_category(request: http.Request, auth: Auth, session: Session, data: h
 
 
 def update_category(request: http.Request, auth: Auth, session: Session, data: http.RequestData, name):  # noqa; E501
-    queryset = session.Category.objects.filter(name=name)
-    props = retrieve(queryset)
-    if props['error']:
-        return handle_error(props)
-    form = CategoryForm(data, instance=props['obj'])
+    pk = category_map().by_name.get(name)
+    if pk is None:
+        return Response({'message': 'Not found'}, status=404)
+    form = CategoryForm(data, instance=session.Category(pk=pk, name=name))
     if form.is_valid():
         category = form.save()
         return category_schema.dump(category).data
@@ -176,21 +578,59 @@ def delete_category(request: http.Request, auth: Auth, session: Session, name):
     return Response(None, status=204)
 
 
-def list_transactions(request: http.Request, auth: Auth, session: Session):
-    queryset = session.Transaction.objects.all()
-    transactions = transaction_schema.dump(queryset, many=True)
-    return transactions.data
+def list_transactions(request: http.Request, auth: Auth, session: Session, params: http.QueryParams, if_none_match: http.Header):  # noqa; E501
+    queryset = session.Transaction.objects.filter(owner_id=auth.user['id'])
+    try:
+        queryset = filter_created(queryset, params)
+    except ValueError as e:
+        return Response({'message': str(e)}, status=400)
+    return list_page(queryset, params, transaction_serializer, if_none_match)
+
+
+def export_transactions(request: http.Request, auth: Auth, session: Session, params: http.QueryParams):  # noqa; E501
+    export_format = params.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {'message': 'Format must be one of "{}"'.format(sorted(EXPORT_FORMATS))}, status=400)
+    stream, content_type = EXPORT_FORMATS[export_format]
+    queryset = session.Transaction.objects.filter(owner_id=auth.user['id'])
+    try:
+        queryset = filter_created(queryset, params).order_by('created', 'id')
+    except ValueError as e:
+        return Response({'message': str(e)}, status=400)
+    return Response(stream(queryset, transaction_schema), status=200, content_type=content_type)
 
 
-def get_transaction(request: http.Request, auth: Auth, session: Session, friendly_id):
-    queryset = session.Transaction.objects.filter(friendly_id=friendly_id)
-    props = retrieve(queryset)
+# no `http.Request` here: building it reads the body that `stream` yields
+def import_transactions(auth: Auth, session: Session, params: http.QueryParams, stream: http.RequestStream):  # noqa; E501
+    try:
+        imported, envelopes = imports.import_transactions(
+            stream,
+            params.get('format', 'csv'),
+            request_user(session, auth),
+            auth.user['id'],
+            envelope=params.get('envelope'),
+            dt=timezone.now(),
+        )
+    except imports.InvalidImport as e:
+        return Response({'message': str(e), 'errors': e.errors}, status=400)
+    return Response({
+        'imported': imported,
+        'envelopes': envelope_schema.dump(envelopes, many=True).data,
+    }, status=201)
+
+
+def get_transaction(request: http.Request, auth: Auth, session: Session, params: http.QueryParams, friendly_id):  # noqa; E501
+    queryset = session.Transaction.objects.filter(
+        friendly_id=friendly_id, owner_id=auth.user['id'])
+    try:
+        queryset = filter_created(queryset, params)
+    except ValueError as e:
+        return Response({'message': str(e)}, status=400)
+    props = retrieve(queryset.values_list(*transaction_serializer.columns))
     if props['error']:
         return handle_error(props)
-    transaction, errors = transaction_schema.dump(props['obj'])
-    if errors:
-        return Response(errors, status=400)
-    return transaction
+    return transaction_serializer.dump(props['obj'])
 
 
 def create_transaction(request: http.Request, auth: Auth, session: Session, data: http.RequestData):  # noqa; E501
@@ -221,3 +661,23 @@ def delete_transaction(request: http.Request, auth: Auth, session: Session, frie
         return handle_error(props)
     props['obj'].delete()
     return Response(None, status=204)
+
+
+def is_staff(session, auth):
+    return session.User.objects.filter(
+        pk=auth.user['id'], is_staff=True, is_active=True).exists()
+
+
+def get_metrics(auth: Auth, session: Session):
+    if not is_staff(session, auth):
+        return Response({'message': 'Forbidden'}, status=403)
+    return Response(
+        (request_metrics.render() + render_pool_metrics()).encode('utf-8'), status=200,
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def list_slow_requests(auth: Auth, session: Session):
+    # samples carry other users' paths and SQL statements, though never their parameters
+    if not is_staff(session, auth):
+        return Response({'message': 'Forbidden'}, status=403)
+    return request_metrics.slow_requests()
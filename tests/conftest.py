@@ -0,0 +1,18 @@
+# Standard Library Imports
+import os
+
+# Third Party Library Imports
+import pytest
+
+# The test run is a single process, so the in-process row cache is coherent.
+os.environ.setdefault('ROW_CACHE_BACKEND', 'local')
+
+# Importing the app configures Django before any test module imports models.
+import app  # noqa; F401
+
+
+@pytest.fixture(autouse=True)
+def clear_row_cache():
+    from envelopes.cache import row_cache
+    if row_cache.enabled:
+        row_cache.backend.clear()
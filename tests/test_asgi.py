@@ -0,0 +1,141 @@
+# Standard Library Imports
+import asyncio
+import json
+from datetime import datetime
+
+# Third Party Library Imports
+import pytest
+from django.contrib.auth import get_user_model
+
+# First Party Library Imports
+from app import app
+from envelopes.asgi import ASGIAdapter, environ_from_scope
+from envelopes.models import Account, Envelope, Transaction
+from tests.test_views import create_auth
+
+User = get_user_model()
+
+
+@pytest.fixture()
+def adapter():
+    adapter = ASGIAdapter(app, max_workers=2)
+    yield adapter
+    adapter.close()
+
+
+@pytest.fixture()
+def auth():
+    user, _ = User.objects.get_or_create(email='test@example.com', password='12345abc')
+    return create_auth(user)
+
+
+def call(adapter, method, path, headers=None, body=b'', chunk_size=None, query_string=b''):
+    """
+    Run one request through `adapter` and return `(status, headers, body)`.
+    """
+    chunk_size = chunk_size or max(len(body), 1)
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b'']
+    incoming = [
+        {'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent = []
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query_string,
+        'headers': [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in (headers or {}).items()
+        ],
+    }
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.get_event_loop().run_until_complete(adapter(scope, receive, send))
+    start, messages = sent[0], sent[1:]
+    assert start['type'] == 'http.response.start'
+    assert all(message['type'] == 'http.response.body' for message in messages)
+    assert messages[-1]['more_body'] is False
+    return start['status'], dict(start['headers']), b''.join(m['body'] for m in messages)
+
+
+def test_environ_from_scope():
+    environ = environ_from_scope({
+        'type': 'http',
+        'method': 'POST',
+        'path': '/accounts/',
+        'query_string': b'limit=2',
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'x-tag', b'a'),
+            (b'x-tag', b'b'),
+        ],
+    }, b'{}')
+    assert environ['PATH_INFO'] == '/accounts/'
+    assert environ['QUERY_STRING'] == 'limit=2'
+    assert environ['CONTENT_TYPE'] == 'application/json'
+    assert environ['HTTP_X_TAG'] == 'a,b'
+    assert environ['wsgi.input'].read() == b'{}'
+
+
+def test_get_and_post(adapter, auth):
+    Account.objects.filter(owner=auth['user']).delete()
+    headers = dict(auth['header'], **{'Content-Type': 'application/json'})
+
+    body = json.dumps({'balance': '12.50', 'owner': auth['user'].id}).encode()
+    status, _, content = call(adapter, 'POST', '/accounts/', headers, body, chunk_size=4)
+    assert status == 201
+    assert json.loads(content.decode())['balance'] == '12.50'
+
+    status, response_headers, content = call(adapter, 'GET', '/accounts/', auth['header'])
+    assert status == 200
+    assert response_headers[b'content-type'] == b'application/json'
+    assert [row['balance'] for row in json.loads(content.decode())['results']] == ['12.50']
+
+    status, _, _ = call(adapter, 'GET', '/accounts/')
+    assert status == 401
+
+
+def test_streamed_response(adapter, auth):
+    Account.objects.filter(owner=auth['user']).delete()
+    account = Account.objects.create(balance=100, owner=auth['user'])
+    dt = datetime(2017, 1, 1)
+    envelope = Envelope.objects.create(
+        creator=auth['user'], name='Groceries', budget=100, balance=100, account=account,
+        created=dt, modified=dt)
+    friendly_ids = []
+    for i in range(40):
+        friendly_ids.append('ASGI-{}-{}'.format(envelope.pk, i))
+        Transaction.objects.create(
+            friendly_id=friendly_ids[-1], user=auth['user'], envelope=envelope,
+            action_type=Transaction.ACTION_TYPE_DEPOSITED, delta=1, created=dt)
+    try:
+        status, headers, content = call(
+            adapter, 'GET', '/transactions/export', auth['header'])
+        assert status == 200
+        assert headers[b'content-type'] == b'application/x-ndjson'
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        assert [row['friendly_id'] for row in rows] == friendly_ids
+    finally:
+        account.delete()
+
+
+def test_lifespan(adapter):
+    incoming = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.get_event_loop().run_until_complete(
+        adapter({'type': 'lifespan'}, receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
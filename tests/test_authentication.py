@@ -0,0 +1,68 @@
+# Standard Library Imports
+import time
+
+# Third Party Library Imports
+import pytest
+from apistar_jwt.exceptions import AuthenticationFailed
+from apistar_jwt.token import JWT
+
+# First Party Library Imports
+from envelopes.authentication import CachedJWTAuthentication
+
+SETTINGS = {'JWT': {'SECRET': 'cache-secret', 'ID': 'user'}}
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+def bearer(**payload):
+    return 'Bearer {}'.format(JWT.encode(payload, SETTINGS['JWT']['SECRET']))
+
+
+def test_cached_authentication_hits_and_misses():
+    authentication = CachedJWTAuthentication(max_size=2, clock=Clock())
+    header = bearer(user=1, username='one@example.com')
+
+    first = authentication.authenticate(header, SETTINGS)
+    assert first.user == {'id': 1, 'name': 'one@example.com'}
+    assert authentication.authenticate(header, SETTINGS) is first
+    assert authentication.stats() == {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+
+    authentication.authenticate(bearer(user=2), SETTINGS)
+    authentication.authenticate(bearer(user=3), SETTINGS)
+    assert authentication.stats()['size'] == 2
+    assert authentication.stats()['evictions'] == 1
+
+
+def test_cached_authentication_never_serves_expired_tokens():
+    clock = Clock()
+    authentication = CachedJWTAuthentication(clock=clock)
+    header = bearer(user=1, exp=int(clock.now) + 60)
+    authentication.authenticate(header, SETTINGS)
+    assert authentication.authenticate(header, SETTINGS).user['id'] == 1
+    assert authentication.stats()['hits'] == 1
+
+    # past the exp claim the token goes back to the wrapped authenticator
+    clock.now += 61
+    authentication.authenticate(header, SETTINGS)
+    assert authentication.stats()['hits'] == 1
+    assert authentication.stats()['misses'] == 2
+
+    expired = bearer(user=1, exp=int(time.time()) - 1)
+    with pytest.raises(AuthenticationFailed):
+        authentication.authenticate(expired, SETTINGS)
+
+
+def test_cached_authentication_does_not_cache_failures():
+    authentication = CachedJWTAuthentication(clock=Clock())
+    header = 'Bearer {}'.format(JWT.encode({'user': 1}, 'wrong-secret'))
+    for _ in range(2):
+        with pytest.raises(AuthenticationFailed):
+            authentication.authenticate(header, SETTINGS)
+    assert authentication.stats()['misses'] == 2
+    assert authentication.stats()['size'] == 0
@@ -0,0 +1,139 @@
+# Standard Library Imports
+from datetime import datetime
+from decimal import Decimal
+
+# Third Party Library Imports
+import pytest
+from apistar import TestClient
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+
+# First Party Library Imports
+from app import app
+from envelopes.cache import LocalCache, RowCache, backend_from_settings, row_cache
+from envelopes.models import Account, Envelope
+from tests.test_views import create_auth
+from tests.utils import assert_num_queries
+
+User = get_user_model()
+
+
+@pytest.fixture()
+def owner():
+    user, _ = User.objects.get_or_create(email='cache-test@example.com', password='12345abc')
+    return user
+
+
+@pytest.fixture()
+def envelopes(owner):
+    account = Account.objects.create(balance=100, owner=owner)
+    dt = datetime(2017, 10, 1)
+    return [
+        Envelope.create(owner, dt, account, name=name, budget=10)[0]
+        for name in ('Groceries', 'Rent')
+    ]
+
+
+def cache_envelope(envelope, owner):
+    key, value = row_cache.get('envelope', owner.pk, envelope.uuid)
+    assert value is None
+    row_cache.set(key, {'balance': str(envelope.balance)})
+    return key
+
+
+def test_local_cache_evicts_least_recently_used_and_expired():
+    now = [0]
+    cache = LocalCache(max_size=2, timeout=10, clock=lambda: now[0])
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+    assert not cache.add('a', 4)
+    cache.set('d', 4, None)
+    now[0] = 11
+    assert cache.get('c') is None
+    assert cache.get('d') == 4
+    assert cache.add('c', 5)
+
+
+def test_lost_generation_never_revives_old_entries():
+    cache = RowCache(LocalCache())
+    key, _ = cache.get('envelope', 1, '6b4b3b4e-3f3a-4a4f-9f55-1b1f1f3a6e10')
+    cache.set(key, {'balance': '1.00'})
+    cache.backend.delete(cache.generation_key('envelope', '6b4b3b4e3f3a4a4f9f551b1f1f3a6e10'))
+    assert cache.get('envelope', 1, '6b4b3b4e-3f3a-4a4f-9f55-1b1f1f3a6e10')[1] is None
+    assert cache.get('envelope', 1, 'not-a-uuid') == (None, None)
+
+
+def test_row_cache_needs_a_shared_backend(monkeypatch):
+    cache = RowCache(None)
+    assert not cache.enabled
+    key, value = cache.get('envelope', 1, '6b4b3b4e-3f3a-4a4f-9f55-1b1f1f3a6e10')
+    assert (key, value) == (None, None)
+    cache.set(key, {'balance': '1.00'})
+    cache.invalidate('envelope', '6b4b3b4e-3f3a-4a4f-9f55-1b1f1f3a6e10')
+    cache.invalidate_table('category')
+    assert cache.table_version('category') is None
+
+    monkeypatch.setattr(settings, 'ROW_CACHE_BACKEND', None)
+    assert backend_from_settings() is None
+    monkeypatch.setattr(settings, 'ROW_CACHE_BACKEND', 'local')
+    assert isinstance(backend_from_settings(), LocalCache)
+    monkeypatch.setattr(settings, 'ROW_CACHE_BACKEND', 'default')
+    with pytest.raises(ImproperlyConfigured):
+        backend_from_settings()
+
+
+def test_account_reads_are_cached_until_written(owner):
+    account = Account.objects.create(balance=100, owner=owner)
+    client = TestClient(app)
+    url = '/accounts/{}/'.format(account.uuid)
+    auth = create_auth(owner)
+
+    with assert_num_queries(1):
+        first = client.get(url, headers=auth['header'])
+    with assert_num_queries(0):
+        second = client.get(url, headers=auth['header'])
+    assert first.json() == second.json()
+    assert first.headers['ETag'] == second.headers['ETag']
+
+    data = {'balance': '321.00', 'owner': owner.id}
+    assert client.patch(url, headers=auth['header'], data=data).status_code == 200
+    with assert_num_queries(1):
+        res = client.get(url, headers=auth['header'])
+    assert res.json()['balance'] == '321.00'
+    assert res.headers['ETag'] != first.headers['ETag']
+
+    assert client.delete(url, headers=auth['header']).status_code == 204
+    assert client.get(url, headers=auth['header']).status_code == 404
+
+
+def test_balance_changes_invalidate_envelopes(owner, envelopes):
+    source, target = envelopes
+    for change in [
+        lambda: Envelope.deposit(source.uuid, owner, Decimal(5), datetime.now()),
+        lambda: Envelope.withdraw(source.uuid, owner, Decimal(5), datetime.now(), optimistic=True),
+        lambda: Envelope.apply_movements(owner, [(source.uuid, Decimal(1))], datetime.now()),
+        lambda: Envelope.transfer(target.uuid, source.uuid, owner, Decimal(1), datetime.now()),
+    ]:
+        cache_envelope(source, owner)
+        change()
+        assert row_cache.get('envelope', owner.pk, source.uuid)[1] is None
+
+
+def test_stale_read_racing_a_write_is_unreachable(owner, envelopes):
+    envelope = envelopes[0]
+    # a reader takes its key, then a write commits before the reader stores
+    key, _ = row_cache.get('envelope', owner.pk, envelope.uuid)
+    Envelope.deposit(envelope.uuid, owner, Decimal(5), datetime.now())
+    row_cache.set(key, {'balance': str(envelope.balance)})
+    assert row_cache.get('envelope', owner.pk, envelope.uuid)[1] is None
+
+
+def test_account_delete_invalidates_its_envelopes(owner, envelopes):
+    envelope = envelopes[0]
+    cache_envelope(envelope, owner)
+    envelope.account.delete()
+    assert row_cache.get('envelope', owner.pk, envelope.uuid)[1] is None
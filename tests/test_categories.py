@@ -0,0 +1,113 @@
+# Standard Library Imports
+from datetime import datetime
+
+# Third Party Library Imports
+import pytest
+from apistar import TestClient
+from django.contrib.auth import get_user_model
+from django.db import transaction as db_transaction
+
+# First Party Library Imports
+from app import app
+from envelopes.cache import LocalCache, RowCache
+from envelopes.categories import CategoryIndex, category_map
+from envelopes.models import Account, Category, Envelope
+from tests.test_views import create_auth
+from tests.utils import assert_num_queries
+
+User = get_user_model()
+
+
+@pytest.fixture()
+def index(monkeypatch):
+    index = CategoryIndex(RowCache(LocalCache()))
+    monkeypatch.setattr('envelopes.categories.category_index', index)
+    return index
+
+
+def test_category_index_refreshes_on_change(index):
+    Category.objects.filter(name__startswith='Index ').delete()
+    with assert_num_queries(1):
+        assert 'Index Food' not in index.current().by_name
+    food = Category.objects.create(name='Index Food')
+    with assert_num_queries(1):
+        snapshot = index.current()
+    assert snapshot.by_name['Index Food'] == food.pk
+    assert snapshot.by_id[food.pk] == 'Index Food'
+    with assert_num_queries(0):
+        assert index.current() is snapshot
+        assert food.pk in category_map()
+    with pytest.raises(TypeError):
+        snapshot.by_name['Index Fuel'] = 0
+
+    food.name = 'Index Groceries'
+    food.save()
+    assert index.current().by_id[food.pk] == 'Index Groceries'
+
+    with pytest.raises(ValueError):
+        with db_transaction.atomic():
+            Category.objects.create(name='Index Fuel')
+            raise ValueError
+    with assert_num_queries(0):
+        assert 'Index Fuel' not in index.current().by_name
+
+    Category.objects.filter(pk=food.pk).delete()
+    assert food.pk not in index.current()
+    assert index.loads == 4
+
+
+def test_category_index_without_row_cache_counts_changes(monkeypatch):
+    now = [0.0]
+    index = CategoryIndex(RowCache(None), max_age=60, clock=lambda: now[0])
+    monkeypatch.setattr('envelopes.categories.category_index', index)
+    food, _ = Category.objects.get_or_create(name='Index Uncached')
+    with assert_num_queries(1):
+        snapshot = index.current()
+    assert snapshot.by_id[food.pk] == 'Index Uncached'
+    with assert_num_queries(0):
+        for _ in range(3):
+            assert index.current() is snapshot
+
+    food.name = 'Index Renamed'
+    food.save()
+    with assert_num_queries(1):
+        assert index.current().by_id[food.pk] == 'Index Renamed'
+
+    with pytest.raises(ValueError):
+        with db_transaction.atomic():
+            Category.objects.create(name='Index Uncached Fuel')
+            raise ValueError
+    with assert_num_queries(0):
+        assert 'Index Uncached Fuel' not in index.current().by_name
+
+    Category.objects.filter(pk=food.pk).update(name='Index Updated')
+    with assert_num_queries(0):
+        assert index.current().by_id[food.pk] == 'Index Renamed'
+    now[0] = 60
+    with assert_num_queries(1):
+        assert index.current().by_id[food.pk] == 'Index Updated'
+    food.delete()
+    assert food.pk not in index.current()
+    assert index.loads == 4
+
+
+def test_withdraw_resolves_category_without_query(index):
+    user, _ = User.objects.get_or_create(email='categories@example.com')
+    Account.objects.filter(owner=user).delete()
+    account = Account.objects.create(balance=100, owner=user)
+    dt = datetime(2017, 10, 1)
+    envelope = Envelope.objects.create(
+        creator=user, name='Food', budget=100, balance=100, account=account,
+        created=dt, modified=dt)
+    food, _ = Category.objects.get_or_create(name='Categories Food')
+    client = TestClient(app)
+    url = '/envelopes/{}/withdraw/'.format(envelope.uuid)
+    headers = create_auth(user)['header']
+    index.current()
+
+    with assert_num_queries(None) as queries:
+        res = client.post(url, headers=headers, json={'amount': '5.00', 'category': food.pk})
+    assert res.status_code == 201, res.content
+    assert res.json()['transaction']['category'] == food.pk
+    assert not [query for query in queries if 'FROM "envelopes_category"' in query['sql']]
+    account.delete()
@@ -0,0 +1,103 @@
+# Standard Library Imports
+from datetime import datetime, timedelta
+
+# Third Party Library Imports
+import pytest
+from apistar import TestClient
+from django.contrib.auth import get_user_model
+
+# First Party Library Imports
+from app import app
+from envelopes.models import Account, Envelope, Transaction
+from envelopes.serializers import CompiledSerializer
+from tests.test_views import create_auth
+from tests.utils import assert_num_queries
+
+User = get_user_model()
+
+
+def create_account(user, dt, envelopes=2, transactions=3):
+    account = Account.objects.create(balance=100, owner=user, created=dt)
+    for i in range(envelopes):
+        envelope = Envelope.objects.create(
+            creator=user, name='Envelope {}'.format(i), budget=10, balance=0, account=account,
+            created=dt + timedelta(minutes=i), modified=dt)
+        for day in range(transactions):
+            Transaction.create(
+                user, envelope, Transaction.ACTION_TYPE_DEPOSITED, day + 1,
+                dt + timedelta(days=day))
+    return account
+
+
+@pytest.fixture()
+def dashboard():
+    user, _ = User.objects.get_or_create(email='fieldsets@example.com')
+    Account.objects.filter(owner=user).delete()
+    dt = datetime(2017, 10, 1)
+    accounts = [create_account(user, dt + timedelta(hours=i)) for i in range(2)]
+    yield {'auth': create_auth(user), 'accounts': accounts}
+    Account.objects.filter(owner=user).delete()
+
+
+def test_sparse_fieldsets(dashboard):
+    client = TestClient(app)
+    headers = dashboard['auth']['header']
+
+    with assert_num_queries(1) as queries:
+        res = client.get('/accounts/?fields=uuid, balance', headers=headers)
+    assert res.status_code == 200
+    assert [sorted(item) for item in res.json()['results']] == [['balance', 'uuid']] * 2
+    assert '"version"' not in queries[0]['sql']
+    assert res.headers['ETag'] != client.get('/accounts/', headers=headers).headers['ETag']
+
+    res = client.get('/accounts/?fields=uuid,password', headers=headers)
+    assert res.status_code == 400
+    assert res.json() == {'message': 'Unknown fields "password"'}
+
+
+def test_include_embeds_latest_rows(dashboard, monkeypatch):
+    client = TestClient(app)
+    headers = dashboard['auth']['header']
+    url = ('/accounts/?include=envelopes,transactions&fields=uuid&fields[envelopes]=name'
+           '&fields[transactions]=delta,created&limit[transactions]=2')
+
+    # accounts, their envelopes and the envelopes' transactions
+    with assert_num_queries(3):
+        res = client.get(url, headers=headers)
+    assert res.status_code == 200
+    results = res.json()['results']
+    assert [item['uuid'] for item in results] == [
+        str(account.uuid) for account in reversed(dashboard['accounts'])]
+    assert [envelope['name'] for envelope in results[0]['envelopes']] == [
+        'Envelope 1', 'Envelope 0']
+    assert results[0]['envelopes'][0]['transactions'] == [
+        {'delta': '3.00', 'created': '2017-10-03T01:00:00+00:00'},
+        {'delta': '2.00', 'created': '2017-10-02T01:00:00+00:00'},
+    ]
+    etag = res.headers['ETag']
+
+    # a matching validator is answered from the raw rows, before anything is serialized
+    def dump_many(self, rows):
+        raise AssertionError('serialized a 304')
+
+    monkeypatch.setattr(CompiledSerializer, 'dump_many', dump_many)
+    with assert_num_queries(3):
+        res = client.get(url, headers=dict(headers, **{'If-None-Match': etag}))
+    assert res.status_code == 304
+    monkeypatch.undo()
+
+    create_account(dashboard['auth']['user'], datetime(2017, 11, 1))
+    with assert_num_queries(3):
+        res = client.get(url, headers=headers)
+    assert len(res.json()['results']) == 3
+    assert res.headers['ETag'] != etag
+
+    res = client.get('/envelopes/?include=transactions&limit[transactions]=1', headers=headers)
+    assert res.status_code == 200
+    assert [len(item['transactions']) for item in res.json()['results']] == [1] * 6
+
+    for query in ('include=transactions', 'include=envelopes&limit[envelopes]=0'):
+        res = client.get('/accounts/?' + query, headers=headers)
+        assert res.status_code == 400
+    res = client.get('/envelopes/?include=envelopes', headers=headers)
+    assert res.json() == {'message': 'Cannot include "envelopes"'}
@@ -0,0 +1,154 @@
+# Standard Library Imports
+import threading
+from datetime import datetime, timedelta
+
+# Third Party Library Imports
+import pytest
+from apistar import TestClient
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+# First Party Library Imports
+from app import app
+from envelopes import idempotency, ledger
+from envelopes.models import (
+    Account, ConcurrentUpdate, Envelope, IdempotencyKey, Transaction)
+from tests.test_views import create_auth
+
+User = get_user_model()
+
+
+@pytest.fixture()
+def auth():
+    return create_auth(User.objects.get_or_create(email='idempotency@example.com')[0])
+
+
+@pytest.fixture()
+def envelope(auth):
+    IdempotencyKey.objects.filter(user=auth['user']).delete()
+    idempotency.replays.clear()
+    Account.objects.filter(owner=auth['user']).delete()
+    account = Account.objects.create(balance=100, owner=auth['user'])
+    dt = datetime(2017, 10, 1)
+    envelope = Envelope.objects.create(
+        creator=auth['user'], name='Groceries', budget=100, balance=100, account=account,
+        created=dt, modified=dt)
+    yield envelope
+    account.delete()
+    IdempotencyKey.objects.filter(user=auth['user']).delete()
+
+
+def deposits(envelope):
+    return Transaction.objects.filter(
+        envelope=envelope, action_type=Transaction.ACTION_TYPE_DEPOSITED).count()
+
+
+def test_replay(auth, envelope):
+    client = TestClient(app)
+    url = '/envelopes/{}/deposit/'.format(envelope.uuid)
+    headers = dict(auth['header'], **{'Idempotency-Key': 'deposit-1'})
+
+    first = client.post(url, headers=headers, json={'amount': '25.00'})
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+
+    # from this process's cache, then from the database as another process would
+    for _ in range(2):
+        retry = client.post(url, headers=headers, json={'amount': '25.00'})
+        assert retry.status_code == 201
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+        assert retry.headers['ETag'] == first.headers['ETag']
+        assert retry.json() == first.json()
+        idempotency.replays.clear()
+    assert Envelope.objects.get(pk=envelope.pk).balance == 125
+    assert deposits(envelope) == 1
+
+    res = client.post(url, headers=headers, json={'amount': '30.00'})
+    assert res.status_code == 422
+    res = client.post(url, headers=auth['header'], json={'amount': '25.00'})
+    assert res.status_code == 201
+    assert Envelope.objects.get(pk=envelope.pk).balance == 150
+
+    # keys are per user
+    other = create_auth(User.objects.get_or_create(email='idempotency-other@example.com')[0])
+    res = client.post(url, headers=dict(other['header'], **{'Idempotency-Key': 'deposit-1'}),
+                      json={'amount': '25.00'})
+    assert res.status_code == 404
+
+
+def test_failed_request_is_replayed(auth, envelope):
+    client = TestClient(app)
+    url = '/envelopes/{}/withdraw/'.format(envelope.uuid)
+    headers = dict(auth['header'], **{'Idempotency-Key': 'unknown-category'})
+    data = {'amount': '5.00', 'category': 999999}
+
+    res = client.post(url, headers=headers, json=data)
+    assert res.status_code == 400
+    res = client.post(url, headers=headers, json=data)
+    assert res.status_code == 400
+    assert res.headers['Idempotent-Replayed'] == 'true'
+    assert res.json() == {'category': ['Unknown category.']}
+    assert Envelope.objects.get(pk=envelope.pk).balance == 100
+
+    res = client.post(url, headers=dict(headers, **{'Idempotency-Key': 'x' * 256}),
+                      json={'amount': '1.00'})
+    assert res.status_code == 400
+
+
+def test_conflict_is_not_replayed(auth, envelope, monkeypatch):
+    client = TestClient(app)
+    url = '/envelopes/{}/deposit/'.format(envelope.uuid)
+    headers = dict(auth['header'], **{'Idempotency-Key': 'deposit-conflict'})
+
+    def conflict(*args, **kwargs):
+        raise ConcurrentUpdate('Envelope kept changing')
+
+    monkeypatch.setattr(ledger, 'deposit', conflict)
+    res = client.post(url, headers=headers, json={'amount': '5.00'})
+    assert res.status_code == 409
+    assert not IdempotencyKey.objects.filter(user=auth['user'], key='deposit-conflict').exists()
+
+    monkeypatch.undo()
+    res = client.post(url, headers=headers, json={'amount': '5.00'})
+    assert res.status_code == 201
+    assert 'Idempotent-Replayed' not in res.headers
+    assert Envelope.objects.get(pk=envelope.pk).balance == 105
+
+
+def test_concurrent_duplicates_run_once(auth, envelope):
+    url = '/envelopes/{}/deposit/'.format(envelope.uuid)
+    headers = dict(auth['header'], **{'Idempotency-Key': 'deposit-concurrent'})
+    start = threading.Barrier(4)
+    responses = []
+
+    def post():
+        client = TestClient(app)
+        start.wait()
+        try:
+            responses.append(client.post(url, headers=headers, json={'amount': '10.00'}))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=post) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [res.status_code for res in responses] == [201] * 4
+    assert len({res.json()['transaction']['friendly_id'] for res in responses}) == 1
+    assert sum('Idempotent-Replayed' in res.headers for res in responses) == 3
+    assert Envelope.objects.get(pk=envelope.pk).balance == 110
+    assert deposits(envelope) == 1
+
+
+def test_purge(auth, envelope):
+    client = TestClient(app)
+    url = '/envelopes/{}/deposit/'.format(envelope.uuid)
+    headers = dict(auth['header'], **{'Idempotency-Key': 'deposit-old'})
+    assert client.post(url, headers=headers, json={'amount': '1.00'}).status_code == 201
+
+    later = timezone.now() + timedelta(seconds=idempotency.KEY_TTL + 1)
+    assert idempotency.purge(now=later) >= 1
+    assert not IdempotencyKey.objects.filter(user=auth['user'], key='deposit-old').exists()
@@ -0,0 +1,138 @@
+# Standard Library Imports
+import io
+from datetime import datetime
+from decimal import Decimal
+
+# Third Party Library Imports
+import pytest
+from apistar import TestClient
+from django.contrib.auth import get_user_model
+
+# First Party Library Imports
+from app import app
+from envelopes import imports
+from envelopes.models import Account, AccountRollup, Category, CategorySpend, Envelope, Transaction
+from tests.test_views import create_auth
+
+User = get_user_model()
+
+OFX = b"""OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20171003120000.000[-5:EST]
+<TRNAMT>-12.34
+<FITID>1001
+<NAME>CORNER MARKET
+<MEMO>Card 1234
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20171005<TRNAMT>100.00<FITID>1002<MEMO>Payroll</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+@pytest.fixture()
+def statement():
+    user, _ = User.objects.get_or_create(email='imports@example.com')
+    Account.objects.filter(owner=user).delete()
+    account = Account.objects.create(balance=200, owner=user)
+    dt = datetime(2017, 10, 1)
+    envelopes = [
+        Envelope.objects.create(
+            creator=user, name=name, budget=100, balance=100, account=account,
+            created=dt, modified=dt)
+        for name in ('Checking', 'Savings')
+    ]
+    AccountRollup.rebuild(account.pk, dt)
+    yield {'auth': create_auth(user), 'account': account, 'envelopes': envelopes}
+    account.delete()
+
+
+def test_parse_csv_and_ofx():
+    lines = imports.text_lines(io.BytesIO(
+        b'\xef\xbb\xbfDate, Amount ,Description\n2017-10-02,-5.00,"Coffee, large"\n'))
+    assert list(imports.parse_csv(lines)) == [
+        (2, {'date': '2017-10-02', 'amount': '-5.00', 'description': 'Coffee, large'})]
+    with pytest.raises(imports.InvalidImport):
+        list(imports.parse_csv(imports.text_lines(io.BytesIO(b'when,amount\n'))))
+
+    records = list(imports.ofx_records(imports.text_lines(io.BytesIO(OFX))))
+    assert records == [
+        (5, {'date': '2017-10-03T12:00:00', 'amount': '-12.34',
+             'description': 'CORNER MARKET', 'comment': 'Card 1234'}),
+        (13, {'date': '2017-10-05T00:00:00', 'amount': '100.00', 'description': 'Payroll',
+              'comment': ''}),
+    ]
+
+
+def test_import_csv(statement):
+    client = TestClient(app)
+    checking, savings = statement['envelopes']
+    Category.objects.filter(name='Import Coffee').delete()
+    groceries, _ = Category.objects.get_or_create(name='Import Groceries')
+    body = '\n'.join([
+        'date,amount,description,category,envelope',
+        '2017-10-02,-5.00,Coffee,Import Coffee,',
+        '2017-10-03,-20.00,Market,import groceries,',
+        '2017-10-04,-4.50,Coffee,Import Coffee,',
+        '2017-11-01,50.00,Interest,,{}'.format(savings.uuid),
+    ]).encode('utf-8')
+    url = '/transactions/import?format=csv&envelope={}'.format(checking.uuid)
+
+    res = client.post(url, headers=statement['auth']['header'], data=body)
+    assert res.status_code == 201, res.content
+    assert res.json()['imported'] == 4
+    assert [row['balance'] for row in res.json()['envelopes']] == ['70.50', '150.00']
+    assert Envelope.objects.get(pk=checking.pk).balance == Decimal('70.50')
+    assert Envelope.objects.get(pk=savings.pk).balance == 150
+    coffee = Category.objects.get(name='Import Coffee')
+    rows = Transaction.objects.filter(envelope=checking).order_by('created')
+    assert [(row.delta, row.category_id, row.action_type) for row in rows] == [
+        (Decimal('-5.00'), coffee.pk, Transaction.ACTION_TYPE_WITHDRAWN),
+        (Decimal('-20.00'), groceries.pk, Transaction.ACTION_TYPE_WITHDRAWN),
+        (Decimal('-4.50'), coffee.pk, Transaction.ACTION_TYPE_WITHDRAWN),
+    ]
+    account = statement['account']
+    assert AccountRollup.current(account.pk).allocated == Decimal('220.50')
+    assert CategorySpend.objects.get(account=account, category=coffee).spent == Decimal('9.50')
+
+
+def test_import_ofx(statement):
+    client = TestClient(app)
+    checking, _ = statement['envelopes']
+    url = '/transactions/import?format=ofx&envelope={}'.format(checking.uuid)
+    res = client.post(url, headers=statement['auth']['header'], data=OFX)
+    assert res.status_code == 201, res.content
+    assert res.json()['envelopes'][0]['balance'] == '187.66'
+    assert set(Transaction.objects.filter(envelope=checking).values_list(
+        'description', 'comment')) == {('CORNER MARKET', 'Card 1234'), ('Payroll', '')}
+
+
+def test_invalid_import_writes_nothing(statement, monkeypatch):
+    client = TestClient(app)
+    checking, _ = statement['envelopes']
+    monkeypatch.setattr(imports, 'IMPORT_CHUNK_SIZE', 2)
+    body = '\n'.join(
+        ['date,amount,description'] + ['2017-10-02,-1.00,Fine'] * 3 +
+        ['yesterday-ish,-1.00,Bad date', '2017-10-02,abc,Bad amount', '2017-10-02,0,Zero'] +
+        ['2017-10-02,-1.00,' + 'x' * 101],
+    ).encode('utf-8')
+    url = '/transactions/import?envelope={}'.format(checking.uuid)
+
+    res = client.post(url, headers=statement['auth']['header'], data=body)
+    assert res.status_code == 400
+    assert [error['line'] for error in res.json()['errors']] == [5, 6, 7, 8]
+    assert 'description' in res.json()['errors'][-1]['errors']
+    assert not Transaction.objects.filter(envelope=checking).exists()
+    assert Envelope.objects.get(pk=checking.pk).balance == 100
+
+    other = create_auth(User.objects.get_or_create(email='imports-other@example.com')[0])
+    res = client.post(url, headers=other['header'], data=b'date,amount\n2017-10-02,1\n')
+    assert res.status_code == 400
+    assert res.json()['errors'][0]['errors'] == {'envelope': ['Unknown envelope.']}
+    res = client.post(url + '&format=qif', headers=statement['auth']['header'], data=body)
+    assert res.status_code == 400
+    res = client.post(url, headers=statement['auth']['header'], data=b'date,amount\n')
+    assert res.status_code == 400
@@ -0,0 +1,92 @@
+# Third Party Library Imports
+import pytest
+from apistar import TestClient
+from django.contrib.auth import get_user_model
+
+# First Party Library Imports
+from app import app
+from envelopes import views
+from envelopes.instrumentation import RequestMetrics, RequestRecord, execute_wrapper
+from envelopes.models import Account
+from tests.test_views import create_auth
+from tests.utils import assert_num_queries
+
+User = get_user_model()
+
+
+@pytest.fixture()
+def metrics(monkeypatch):
+    metrics = RequestMetrics(slow_request_seconds=0, slow_request_samples=2)
+    monkeypatch.setattr(app, 'metrics', metrics)
+    monkeypatch.setattr(views, 'request_metrics', metrics)
+    return metrics
+
+
+@pytest.fixture()
+def auth():
+    user, _ = User.objects.get_or_create(email='test@example.com', password='12345abc')
+    return create_auth(user)
+
+
+def test_execute_wrapper_records_queries():
+    record = RequestRecord('GET /accounts/', 'GET', '/accounts/')
+    with assert_num_queries(4):
+        with execute_wrapper(record):
+            Account.objects.count()
+            Account.objects.count()
+            Account.objects.exists()
+        Account.objects.count()
+    assert record.query_count == 3
+    assert record.duplicate_count == 1
+    assert list(record.duplicates.values()) == [2]
+    assert record.db_time > 0
+
+
+def test_requests_are_recorded_per_route(metrics, auth):
+    client = TestClient(app)
+    for _ in range(3):
+        assert client.get('/accounts/', headers=auth['header']).status_code == 200
+    assert client.get('/accounts/{}/'.format(
+        '00000000-0000-0000-0000-000000000000'), headers=auth['header']).status_code == 404
+    assert client.get('/missing/').status_code == 404
+
+    text = metrics.render()
+    assert 'envelopes_requests_total{route="GET /accounts/",status="200"} 3' in text
+    assert 'envelopes_requests_total{route="GET /accounts/{uuid}/",status="404"} 1' in text
+    assert 'envelopes_requests_total{route="unmatched",status="404"} 1' in text
+    assert ('envelopes_request_duration_seconds_bucket'
+            '{route="GET /accounts/",le="+Inf"} 3') in text
+    assert 'envelopes_request_queries_total{route="GET /accounts/"} 3' in text
+
+    slow = metrics.slow_requests()
+    assert len(slow) == 2
+    assert slow[0]['route'] == 'unmatched'
+    assert slow[1]['route'] == 'GET /accounts/{uuid}/'
+    assert slow[1]['query_count'] == 1
+    assert slow[1]['queries'][0]['sql'].startswith('SELECT')
+
+
+def test_streamed_responses_are_measured_until_sent(metrics, auth):
+    client = TestClient(app)
+    res = client.get('/transactions/export', headers=auth['header'])
+    assert res.status_code == 200
+    assert 'envelopes_request_queries_total{route="GET /transactions/export"} 1' in (
+        metrics.render())
+
+
+def test_metrics_route(metrics, auth):
+    client = TestClient(app)
+    staff, _ = User.objects.get_or_create(email='metrics-staff@example.com', is_staff=True)
+    headers = create_auth(staff)['header']
+    client.get('/metrics', headers=headers)
+    res = client.get('/metrics', headers=headers)
+    assert res.status_code == 200
+    assert res.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert 'envelopes_requests_total{route="GET /metrics",status="200"} 1' in res.text
+    assert client.get('/metrics/slow', headers=headers).json()[0]['route'] == 'GET /metrics'
+
+    for url in ('/metrics', '/metrics/slow'):
+        assert client.get(url).status_code == 401
+        res = client.get(url, headers=auth['header'])
+        assert res.status_code == 403
+        assert res.json() == {'message': 'Forbidden'}
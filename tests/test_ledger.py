@@ -0,0 +1,117 @@
+# Standard Library Imports
+from datetime import datetime
+from decimal import Decimal
+
+# Third Party Library Imports
+import pytest
+from apistar import TestClient
+from django.contrib.auth import get_user_model
+
+# First Party Library Imports
+from app import app
+from envelopes import idempotency, ledger
+from envelopes.models import (
+    Account, Category, CategorySpend, Envelope, IdempotencyKey, LedgerEntry, Transaction)
+from tests.test_views import create_auth
+
+User = get_user_model()
+
+
+@pytest.fixture()
+def envelopes():
+    user, _ = User.objects.get_or_create(email='ledger@example.com')
+    Account.objects.filter(owner=user).delete()
+    IdempotencyKey.objects.filter(user=user).delete()
+    idempotency.replays.clear()
+    account = Account.objects.create(balance=200, owner=user)
+    dt = datetime(2017, 10, 1)
+    yield [
+        Envelope.objects.create(
+            creator=user, name=name, budget=100, balance=100, account=account,
+            created=dt, modified=dt)
+        for name in ('Rent', 'Groceries')
+    ]
+    account.delete()
+    IdempotencyKey.objects.filter(user=user).delete()
+
+
+@pytest.fixture()
+def group_commit(monkeypatch):
+    queue = ledger.GroupCommit(window=0.2)
+    monkeypatch.setattr(ledger, 'group_commit', queue)
+    yield queue
+    queue.close()
+
+
+def test_group_commit_batches_entries(envelopes, group_commit):
+    rent, groceries = envelopes
+    user = rent.creator
+    food, _ = Category.objects.get_or_create(name='Ledger Food')
+    dt = datetime(2017, 10, 2)
+    futures = [
+        group_commit.submit(LedgerEntry(
+            envelope.uuid, Decimal(amount), user, dt, None, None, category, user.pk))
+        for envelope, amount, category in [
+            (rent, 10, None), (groceries, 5, None), (rent, 1, None), (groceries, -20, food)]
+    ]
+    results = [future.result() for future in futures]
+    assert group_commit.stats() == {'batches': 1, 'entries': 4}
+
+    assert [transaction.delta for _, transaction in results] == [10, 5, 1, -20]
+    assert [transaction.action_type for _, transaction in results][-1] == (
+        Transaction.ACTION_TYPE_WITHDRAWN)
+    assert results[0][0].balance == 111
+    assert results[1][0].balance == 85
+    assert Envelope.objects.get(pk=rent.pk).balance == 111
+    assert Envelope.objects.get(pk=groceries.pk).balance == 85
+    assert Transaction.objects.filter(envelope__in=envelopes, created=dt).count() == 4
+    assert CategorySpend.objects.get(account_id=rent.account_id, category=food).spent == 20
+
+
+def test_group_commit_isolates_failures(envelopes, group_commit):
+    rent, _ = envelopes
+    user = rent.creator
+    other, _ = User.objects.get_or_create(email='ledger-other@example.com')
+    futures = [
+        group_commit.submit(LedgerEntry(
+            rent.uuid, Decimal(1), user, datetime.now(), None, None, None, owner))
+        for owner in (user.pk, other.pk, user.pk)
+    ]
+    assert futures[0].result()[0].balance in (101, 102)
+    with pytest.raises(Envelope.DoesNotExist):
+        futures[1].result()
+    assert futures[2].result()[1].delta == 1
+    assert Envelope.objects.get(pk=rent.pk).balance == 102
+
+
+def test_views_write_through_group_commit(envelopes, group_commit):
+    rent, _ = envelopes
+    client = TestClient(app)
+    headers = create_auth(rent.creator)['header']
+    url = '/envelopes/{}/'.format(rent.uuid)
+
+    res = client.post(url + 'deposit/', headers=headers, json={'amount': '25.00'})
+    assert res.status_code == 201
+    assert res.json()['envelope']['balance'] == '125.00'
+    res = client.post(url + 'withdraw/', headers=headers, json={'amount': '5.00'})
+    assert res.status_code == 201
+    assert res.json()['transaction']['delta'] == '-5.00'
+    assert group_commit.stats()['entries'] == 2
+    assert Envelope.objects.get(pk=rent.pk).balance == 120
+
+    other = create_auth(User.objects.get_or_create(email='ledger-other@example.com')[0])
+    res = client.post(url + 'deposit/', headers=other['header'], json={'amount': '1.00'})
+    assert res.status_code == 404
+
+    # upper-case uuids key the same envelope
+    res = client.post('/envelopes/{}/deposit/'.format(str(rent.uuid).upper()), headers=headers,
+                      json={'amount': '1.00'})
+    assert res.status_code == 201
+    assert res.json()['envelope']['balance'] == '121.00'
+
+    # keyed requests store their response in the transaction that writes the deposit
+    res = client.post(url + 'deposit/', headers=dict(headers, **{'Idempotency-Key': 'ledger-1'}),
+                      json={'amount': '4.00'})
+    assert res.status_code == 201
+    assert group_commit.stats()['entries'] == 3
+    assert Envelope.objects.get(pk=rent.pk).balance == 125
@@ -0,0 +1,115 @@
+# Standard Library Imports
+import gzip
+from datetime import datetime
+
+# Third Party Library Imports
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+# First Party Library Imports
+from envelopes import partitions
+from envelopes.models import Account, Envelope, Transaction
+
+User = get_user_model()
+
+requires_postgresql = pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='partitioning needs PostgreSQL')
+
+
+class Rollback(Exception):
+    pass
+
+
+@pytest.fixture()
+def rollback():
+    """
+    Run the test in a transaction that is rolled back, partitioning included.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+@pytest.fixture()
+def ledger(rollback):
+    user, _ = User.objects.get_or_create(email='partitions@example.com')
+    account = Account.objects.create(balance=0, owner=user, created=datetime(2017, 1, 1))
+    envelope = Envelope.objects.create(
+        creator=user, name='Rent', budget=0, balance=0, account=account,
+        created=datetime(2017, 1, 1), modified=datetime(2017, 1, 1))
+    return [
+        Transaction.create(
+            user, envelope, Transaction.ACTION_TYPE_DEPOSITED, 1, datetime(2017, month, 15))
+        for month in (1, 2, 3)
+    ]
+
+
+def partition_of(transaction):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT tableoid::regclass::text FROM envelopes_transaction WHERE id = %s',
+            [transaction.pk])
+        return cursor.fetchone()[0]
+
+
+def test_months():
+    assert partitions.add_months(datetime(2017, 11, 1), 3) == datetime(2018, 2, 1)
+    assert partitions.add_months(datetime(2017, 1, 1), -1) == datetime(2016, 12, 1)
+    assert list(partitions.months_between(datetime(2017, 11, 20), datetime(2018, 1, 5))) == [
+        datetime(2017, 11, 1), datetime(2017, 12, 1)]
+    name = partitions.partition_name(datetime(2017, 2, 1))
+    assert name == 'envelopes_transaction_y2017m02'
+    assert partitions.partition_month('/archive/{}.csv.gz'.format(name)) == datetime(2017, 2, 1)
+    with pytest.raises(partitions.PartitionError):
+        partitions.partition_month('envelopes_transaction_default')
+
+
+@requires_postgresql
+def test_partition_archive_and_restore(ledger, tmpdir):
+    january, february, march = ledger
+    count = Transaction.objects.count()
+    now = datetime(2017, 3, 10)
+    with connection.cursor() as cursor:
+        partitioned = partitions.is_partitioned(cursor)
+
+    converted, created = partitions.partition(now=now, months_ahead=1)
+    assert converted is not partitioned
+    assert 'envelopes_transaction_y2017m04' in created
+    assert partitions.partition(now=now, months_ahead=1) == (False, [])
+    assert Transaction.objects.count() == count
+    assert partition_of(february) == 'envelopes_transaction_y2017m02'
+
+    later = Transaction.create(
+        january.user, january.envelope, Transaction.ACTION_TYPE_WITHDRAWN, -1,
+        datetime(2031, 5, 1))
+    assert partition_of(later) == partitions.DEFAULT_PARTITION
+    with connection.cursor() as cursor:
+        partitions.create_partitions(cursor, [datetime(2031, 5, 1)])
+    assert partition_of(later) == 'envelopes_transaction_y2031m05'
+
+    with connection.cursor() as cursor:
+        sql, params = Transaction.objects.filter(
+            created__gte=datetime(2017, 2, 1), created__lt=datetime(2017, 3, 1),
+        ).query.sql_with_params()
+        cursor.execute('EXPLAIN ' + sql, params)
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+    assert 'envelopes_transaction_y2017m02' in plan, plan
+    assert 'envelopes_transaction_y2017m03' not in plan, plan
+    assert partitions.DEFAULT_PARTITION not in plan, plan
+
+    paths = partitions.archive(str(tmpdir), now=now, retention_months=1)
+    path = str(tmpdir.join('envelopes_transaction_y2017m01.csv.gz'))
+    assert path in paths
+    assert not Transaction.objects.filter(pk=january.pk).exists()
+    assert Transaction.objects.filter(pk=february.pk).exists()
+    with gzip.open(path, 'rt') as f:
+        assert january.friendly_id in f.read()
+
+    assert partitions.restore(path) >= 1
+    restored = Transaction.objects.get(pk=january.pk)
+    assert restored.friendly_id == january.friendly_id
+    assert partition_of(restored) == 'envelopes_transaction_y2017m01'
@@ -0,0 +1,161 @@
+# Standard Library Imports
+import threading
+
+# Third Party Library Imports
+import psycopg2
+import pytest
+from apistar import TestClient
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+# First Party Library Imports
+from app import app
+from envelopes.db.pool import ConnectionPool, PoolTimeout
+from tests.test_views import create_auth
+
+User = get_user_model()
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='connection pooling is PostgreSQL only')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def backend_pid(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT pg_backend_pid()')
+        return cursor.fetchone()[0]
+
+
+@pytest.fixture()
+def make_pool():
+    pools = []
+    params = connection.get_connection_params()
+
+    def make_pool(**kwargs):
+        kwargs.setdefault('min_size', 0)
+        pool = ConnectionPool(lambda: psycopg2.connect(**params), **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make_pool
+    for pool in pools:
+        pool.close()
+
+
+def test_connections_are_reused(make_pool):
+    pool = make_pool(max_size=2)
+    first = pool.getconn()
+    pid = backend_pid(first.connection)
+    pool.putconn(first)
+    second = pool.getconn()
+    assert backend_pid(second.connection) == pid
+    pool.putconn(second)
+    assert pool.opened == 1
+    assert (pool.size, pool.idle, pool.in_use) == (1, 1, 0)
+    assert pool.wait_count == 2
+
+
+def test_fill_opens_min_size(make_pool):
+    pool = make_pool(min_size=2, max_size=4)
+    pool.fill()
+    assert (pool.size, pool.idle, pool.opened) == (2, 2, 2)
+
+
+def test_open_transaction_is_rolled_back(make_pool):
+    pool = make_pool(max_size=1)
+    pooled = pool.getconn()
+    with pooled.connection.cursor() as cursor:
+        cursor.execute('CREATE TEMPORARY TABLE pool_probe (id int)')
+    pool.putconn(pooled)
+    pooled = pool.getconn()
+    with pooled.connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('pool_probe')")
+        assert cursor.fetchone()[0] is None
+    pool.putconn(pooled)
+
+
+def test_max_size_waits_then_times_out(make_pool):
+    pool = make_pool(max_size=1, timeout=0.05)
+    held = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.timeouts == 1
+
+    pool.timeout = 5
+    released = threading.Timer(0.05, pool.putconn, args=(held, ))
+    released.start()
+    pooled = pool.getconn()
+    released.join()
+    assert pooled.connection is held.connection
+    assert pool.wait_seconds >= 0.04
+    pool.putconn(pooled)
+    assert pool.opened == 1
+
+
+def test_max_lifetime(make_pool):
+    clock = Clock()
+    pool = make_pool(max_size=1, max_lifetime=60, clock=clock)
+    pooled = pool.getconn()
+    clock.now = 30
+    pool.putconn(pooled)
+    assert pool.idle == 1
+
+    clock.now = 61
+    replacement = pool.getconn()
+    assert replacement.connection is not pooled.connection
+    assert pooled.connection.closed
+    assert pool.discarded['lifetime'] == 1
+
+    clock.now = 200
+    pool.putconn(replacement)
+    assert replacement.connection.closed
+    assert (pool.size, pool.idle) == (0, 0)
+
+
+def test_health_check_replaces_dead_connections(make_pool):
+    clock = Clock()
+    pool = make_pool(max_size=1, check_interval=10, clock=clock)
+    pooled = pool.getconn()
+    pid = backend_pid(pooled.connection)
+    pool.putconn(pooled)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+    clock.now = 5
+    assert pool.getconn() is pooled  # checked again only after check_interval
+    pool.putconn(pooled)
+
+    clock.now = 20
+    replacement = pool.getconn()
+    assert replacement is not pooled
+    assert backend_pid(replacement.connection) != pid
+    assert pool.discarded['broken'] + pool.discarded['health_check'] == 1
+    pool.putconn(replacement)
+
+
+def test_requests_return_connections_to_the_pool():
+    if connection.settings_dict['ENGINE'] != 'envelopes.db.postgresql_pool':
+        pytest.skip('the pooled engine is not configured')
+    client = TestClient(app)
+    auth = create_auth(User.objects.get_or_create(email='test@example.com')[0])
+    connection.close()
+    pool = connection.get_pool(connection.get_connection_params())
+    opened = pool.opened
+
+    for _ in range(3):
+        assert client.get('/accounts/', headers=auth['header']).status_code == 200
+        assert connection.connection is None
+        assert pool.in_use == 0
+    assert pool.opened == opened
+
+    staff, _ = User.objects.get_or_create(email='pool-staff@example.com', is_staff=True)
+    text = client.get('/metrics', headers=create_auth(staff)['header']).text
+    assert 'envelopes_db_pool_connections{alias="default",' in text
+    assert 'envelopes_db_pool_wait_seconds_count{alias="default",' in text
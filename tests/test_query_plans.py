@@ -0,0 +1,165 @@
+# Standard Library Imports
+import os
+from datetime import datetime
+
+# Third Party Library Imports
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+# First Party Library Imports
+from envelopes.models import Account, Envelope, Transaction
+from envelopes.pagination import encode_cursor, paginate
+from envelopes.views import account_relations, envelope_serializer, transaction_serializer
+
+User = get_user_model()
+
+PLAN_ROWS = int(os.environ.get('QUERY_PLAN_ROWS') or 1000000)
+PLAN_OWNERS = 1000
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='plans are checked on PostgreSQL')
+
+
+class Rollback(Exception):
+    pass
+
+
+@pytest.fixture(scope='module')
+def population():
+    """
+    `PLAN_ROWS` envelopes spread over `PLAN_OWNERS` users, analyzed and
+    rolled back once the module's tests are done. Set `QUERY_PLAN_ROWS` to
+    check the plans at another table size.
+    """
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(email='plans-{}@example.com'.format(i)) for i in range(PLAN_OWNERS)])
+            accounts = Account.objects.bulk_create([
+                Account(owner=user, balance=0, created=datetime(2017, 1, 1)) for user in users])
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO envelopes_envelope (
+                        version, uuid, creator_id, owner_id, account_id, name, description,
+                        budget, balance, created, modified)
+                    SELECT 1, md5(random()::text || n::text)::uuid, a.owner_id, a.owner_id,
+                           a.id, 'Envelope ' || n, '', 100, 100,
+                           timestamp '2017-01-01' + n * interval '1 minute',
+                           timestamp '2017-01-01' + n * interval '1 minute'
+                    FROM generate_series(1, %s) AS n
+                    JOIN (
+                        SELECT id, owner_id, row_number() OVER (ORDER BY id) - 1 AS slot
+                        FROM envelopes_account WHERE id = ANY(%s)
+                    ) a ON a.slot = n %% %s
+                """, [PLAN_ROWS, [account.id for account in accounts], len(accounts)])
+                # one ledger row per envelope, owned like the envelope
+                cursor.execute("""
+                    INSERT INTO envelopes_transaction (
+                        friendly_id, user_id, owner_id, envelope_id, created, action_type,
+                        delta, description, comment)
+                    SELECT 'PLAN-' || id, owner_id, owner_id, id, created, 'DEPOSITED', 100,
+                           '', ''
+                    FROM envelopes_envelope WHERE owner_id = ANY(%s)
+                """, [[user.id for user in users]])
+                cursor.execute('ANALYZE envelopes_envelope')
+                cursor.execute('ANALYZE envelopes_account')
+                cursor.execute('ANALYZE envelopes_transaction')
+            yield users[len(users) // 2]
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + sql, params)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def assert_no_scan_or_sort(plan):
+    assert 'Seq Scan' not in plan, plan
+    assert 'Sort' not in plan, plan
+
+
+class PageQuery:
+    """
+    Stands in for a queryset in `paginate`, recording the page query it
+    would run instead of running it.
+    """
+
+    def __init__(self, queryset, captured):
+        self.queryset = queryset
+        self.captured = captured
+        self.model = queryset.model
+
+    def filter(self, *args, **kwargs):
+        return PageQuery(self.queryset.filter(*args, **kwargs), self.captured)
+
+    def extra(self, **kwargs):
+        return PageQuery(self.queryset.extra(**kwargs), self.captured)
+
+    def order_by(self, *fields):
+        return PageQuery(self.queryset.order_by(*fields), self.captured)
+
+    def __getitem__(self, item):
+        self.captured.append(self.queryset[item])
+        return []
+
+
+def page_queryset(queryset, params):
+    captured = []
+    paginate(PageQuery(queryset, captured), params)
+    return captured[0]
+
+
+def test_envelope_list_pages_use_the_owner_index(population):
+    owned = Envelope.objects.filter(owner_id=population.id).values_list(
+        *envelope_serializer.columns_with('created', 'id'))
+    plan = explain(page_queryset(owned, {}))
+    assert_no_scan_or_sort(plan)
+    assert 'envelope_owner_created_id_idx' in plan, plan
+
+    created, pk = Envelope.objects.filter(owner_id=population.id).values_list(
+        'created', 'id').order_by('-created', '-id')[PLAN_ROWS // PLAN_OWNERS // 2]
+    plan = explain(page_queryset(owned, {'cursor': encode_cursor(created, pk, 'n')}))
+    assert_no_scan_or_sort(plan)
+    assert 'envelope_owner_created_id_idx' in plan, plan
+
+
+def test_transaction_list_pages_use_the_owner_index(population):
+    owned = Transaction.objects.filter(owner_id=population.id).values_list(
+        *transaction_serializer.columns_with('created', 'id'))
+    plan = explain(page_queryset(owned, {}))
+    assert_no_scan_or_sort(plan)
+    assert 'transaction_owner_created_idx' in plan, plan
+
+    created, pk = Transaction.objects.filter(owner_id=population.id).values_list(
+        'created', 'id').order_by('-created', '-id')[PLAN_ROWS // PLAN_OWNERS // 2]
+    plan = explain(page_queryset(owned, {'cursor': encode_cursor(created, pk, 'n')}))
+    assert_no_scan_or_sort(plan)
+    assert 'transaction_owner_created_idx' in plan, plan
+    # the cursor is a bound of the index scan, not a filter over the rows before it
+    assert 'Filter' not in plan, plan
+
+
+def test_envelope_lookups_use_indexes(population):
+    envelope = Envelope.objects.filter(owner_id=population.id).only('uuid').first()
+    for queryset in [
+        Envelope.objects.filter(uuid=envelope.uuid, owner_id=population.id).values_list('id'),
+        Envelope.objects.select_for_update().filter(uuid=envelope.uuid, owner_id=population.id),
+        Envelope.objects.filter(account_id=envelope.account_id).exclude(owner_id=population.id),
+    ]:
+        assert_no_scan_or_sort(explain(queryset))
+
+
+def test_embedded_envelopes_use_the_account_index(population):
+    relation = account_relations['envelopes']
+    account_ids = list(Account.objects.filter(owner_id=population.id).values_list('id', flat=True))
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN ' + relation.latest_sql(envelope_serializer.columns_with('id')), {
+            'parent_ids': account_ids, 'limit': 10})
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+    assert 'Seq Scan' not in plan, plan
+    assert 'envelope_account_created_idx' in plan, plan
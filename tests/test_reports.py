@@ -0,0 +1,116 @@
+# Standard Library Imports
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Third Party Library Imports
+import pytest
+from apistar import TestClient
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+# First Party Library Imports
+from app import app
+from envelopes import reports
+from envelopes.models import Account, Category, Envelope
+from tests.test_views import create_auth
+
+User = get_user_model()
+
+
+@pytest.fixture()
+def spending():
+    user, _ = User.objects.get_or_create(email='reports@example.com')
+    Account.objects.filter(owner=user).delete()
+    account = Account.objects.create(balance=1000, owner=user)
+    food, _ = Category.objects.get_or_create(name='Report Food')
+    fuel, _ = Category.objects.get_or_create(name='Report Fuel')
+    dt = datetime(2017, 9, 1)
+    groceries, _ = Envelope.create(user, dt, account, name='Groceries', budget=300, balance=300)
+    car, _ = Envelope.create(user, dt, account, name='Car', budget=0, balance=100)
+    for envelope, amount, category, day in [
+            (groceries, 40, food, datetime(2017, 9, 3)),
+            (groceries, '12.35', food, datetime(2017, 10, 2)),
+            (groceries, 5, None, datetime(2017, 10, 4)),
+            (car, 30, fuel, datetime(2017, 10, 5))]:
+        Envelope.withdraw(envelope.uuid, user, Decimal(amount), day, category=category)
+    Envelope.deposit(groceries.uuid, user, 100, datetime(2017, 10, 6))
+    yield {'auth': create_auth(user), 'account': account, 'food': food, 'fuel': fuel,
+           'groceries': groceries, 'car': car}
+    account.delete()
+
+
+def test_cents_round_trip():
+    cents = reports.to_cents([Decimal('12.35'), Decimal('-0.05'), Decimal('0.00')])
+    assert cents.tolist() == [1235, -5, 0]
+    assert [reports.from_cents(value) for value in cents] == ['12.35', '-0.05', '0.00']
+
+
+def test_spend_report(spending):
+    client = TestClient(app)
+    url = '/accounts/{}/reports/spend/'.format(spending['account'].uuid)
+    headers = spending['auth']['header']
+
+    res = client.get(url, headers=headers)
+    assert res.status_code == 200
+    report = res.json()
+    assert report['periods'] == ['2017-09-01', '2017-10-01']
+    assert report['categories'] == [
+        {'category': None, 'name': None, 'spent': ['0.00', '5.00']},
+        {'category': spending['food'].id, 'name': 'Report Food', 'spent': ['40.00', '12.35']},
+        {'category': spending['fuel'].id, 'name': 'Report Fuel', 'spent': ['0.00', '30.00']},
+    ]
+    assert report['totals'] == ['40.00', '47.35']
+
+    res = client.get(url + '?period=day&since=2017-10-01&until=2017-10-03', headers=headers)
+    assert res.json()['periods'] == ['2017-10-02']
+    assert res.json()['totals'] == ['12.35']
+
+    assert client.get(url + '?period=fortnight', headers=headers).status_code == 400
+    other = create_auth(User.objects.get_or_create(email='reports-other@example.com')[0])
+    assert client.get(url, headers=other['header']).status_code == 404
+
+
+def test_budget_report(spending):
+    client = TestClient(app)
+    url = '/accounts/{}/reports/budget/'.format(spending['account'].uuid)
+
+    res = client.get(url + '?month=2017-10', headers=spending['auth']['header'])
+    assert res.status_code == 200
+    report = res.json()
+    assert report['month'] == '2017-10'
+    assert report['envelopes'] == [
+        {'envelope': str(spending['groceries'].uuid), 'name': 'Groceries', 'budget': '300.00',
+         'spent': '17.35', 'remaining': '282.65', 'used': 5},
+        {'envelope': str(spending['car'].uuid), 'name': 'Car', 'budget': '0.00',
+         'spent': '30.00', 'remaining': '-30.00', 'used': None},
+    ]
+    assert report['totals'] == {'budget': '300.00', 'spent': '47.35', 'remaining': '252.65'}
+
+    res = client.get(url + '?month=October', headers=spending['auth']['header'])
+    assert res.status_code == 400
+
+
+def test_burn_rate_projection(spending):
+    now = timezone.now()
+    Envelope.withdraw(spending['car'].uuid, spending['auth']['user'], 30, now - timedelta(days=2))
+    report = reports.burn_rate_projection(
+        spending['account'].id, now, history_days=10, horizon_months=2)
+    assert len(report['dates']) == 2
+    groceries, car = report['envelopes']
+    assert groceries['daily_burn'] == '0.00'
+    assert groceries['depletes_on'] is None
+    assert groceries['projected'] == [groceries['balance']] * 2
+    # 30.00 over 10 days leaves 40.00 for 13 more days
+    assert car['balance'] == '40.00'
+    assert car['daily_burn'] == '3.00'
+    assert car['depletes_on'] == (now.date() + timedelta(days=13)).isoformat()
+    days = (datetime.strptime(report['dates'][0], '%Y-%m-%d').date() - now.date()).days
+    assert car['projected'][0] == reports.from_cents(4000 - 3000 * days // 10)
+
+    client = TestClient(app)
+    url = '/accounts/{}/reports/projection/'.format(spending['account'].uuid)
+    res = client.get(url + '?history=10&months=2', headers=spending['auth']['header'])
+    assert res.status_code == 200
+    assert res.json()['envelopes'][1]['daily_burn'] == '3.00'
+    res = client.get(url + '?months=0', headers=spending['auth']['header'])
+    assert res.status_code == 400
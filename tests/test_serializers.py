@@ -0,0 +1,57 @@
+# Standard Library Imports
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+# Third Party Library Imports
+import pytest
+
+# First Party Library Imports
+from envelopes import schemas
+from envelopes.models import Account, Envelope, Transaction
+from envelopes.serializers import CompiledSerializer
+
+
+def as_row(serializer, obj):
+    return tuple(getattr(obj, column) for column in serializer.columns)
+
+
+def test_compiled_serializers_match_schema_dump():
+    dt = datetime(2017, 10, 14, 21, 31, 5, 123456)
+    account = Account(
+        id=1, uuid=uuid.uuid4(), balance=Decimal('10.5'), owner_id=3, created=dt, version=2)
+    envelope = Envelope(
+        id=2, uuid=uuid.uuid4(), budget=Decimal('100'), balance=Decimal('-0.125'),
+        creator_id=3, name='Groceries', description='', account_id=1, created=dt, modified=dt)
+    transaction = Transaction(
+        id=3, friendly_id='785YW19AL92O8DQ', user_id=3, created=dt, envelope_id=2,
+        action_type=Transaction.ACTION_TYPE_DEPOSITED, delta=Decimal('12.345'), description='',
+        category_id=None, comment='Paycheck')
+
+    for schema, obj in [
+        (schemas.Account(exclude=('id',)), account),
+        (schemas.Envelope(exclude=('id',)), envelope),
+        (schemas.Transaction(), transaction),
+    ]:
+        serializer = CompiledSerializer(schema)
+        assert serializer.dump(as_row(serializer, obj)) == schema.dump(obj).data
+        rows = [as_row(serializer, obj)]
+        assert serializer.dump_many(rows) == schema.dump([obj], many=True).data
+
+
+def test_compiled_serializer_ignores_extra_columns():
+    serializer = CompiledSerializer(schemas.Category(exclude=('id',)))
+    assert serializer.columns == ('name', )
+    assert serializer.columns_with('created', 'id') == ('name', 'created', 'id')
+    assert serializer.dump(('Rent', datetime(2017, 1, 1), 4)) == {'name': 'Rent'}
+
+
+def test_compiled_serializer_projection():
+    serializer = CompiledSerializer(schemas.Envelope(exclude=('id',)))
+    projected = serializer.project(['balance', 'account'])
+    assert projected.columns == ('balance', 'account_id')
+    assert projected.dump((Decimal('1.5'), 3)) == {'balance': '1.50', 'account': 3}
+    assert serializer.project(['account', 'balance']) is projected
+    assert serializer.project(serializer.keys) is serializer
+    with pytest.raises(ValueError):
+        serializer.project(['balance', 'account_id'])
@@ -0,0 +1,48 @@
+# Standard Library Imports
+import random
+
+# Third Party Library Imports
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+# First Party Library Imports
+from envelopes.utils import MAX_SEQUENCE, FriendlyIdGenerator, WorkerLease, hashid
+
+
+def test_friendly_ids_are_unique_and_monotonic():
+    generator = FriendlyIdGenerator(hashid, worker=7)
+    numbers = generator.next_numbers(MAX_SEQUENCE * 3) + generator.next_numbers(10)
+    assert numbers == sorted(set(numbers))
+    assert all((number >> 12) & 1023 == 7 for number in numbers)
+
+    ids = generator.next_ids(100)
+    assert len(set(ids)) == 100
+    assert all(len(friendly_id) <= 30 for friendly_id in ids)
+
+
+def test_friendly_ids_match_hashids():
+    generator = FriendlyIdGenerator(hashid, worker=1)
+    for number in [0, 1, 99, 100] + [random.randrange(1 << 62) for _ in range(1000)]:
+        assert generator.encode(number) == hashid.encode(number)
+    number = generator.next_numbers(1)[0]
+    assert hashid.decode(generator.encode(number)) == (number, )
+
+
+def test_friendly_id_workers_are_leased():
+    with pytest.raises(ImproperlyConfigured):
+        FriendlyIdGenerator(hashid).next_id()
+    with pytest.raises(ImproperlyConfigured):
+        FriendlyIdGenerator(hashid, worker=1024).next_id()
+
+    first, second = WorkerLease.acquire(start=5), WorkerLease.acquire(start=5)
+    try:
+        assert second.worker != first.worker
+        generator = FriendlyIdGenerator(hashid, lease=lambda: first)
+        assert (generator.next_numbers(1)[0] >> 12) & 1023 == first.worker
+        generator.release()
+        third = WorkerLease.acquire(start=first.worker)
+        assert third.worker == first.worker
+        third.release()
+    finally:
+        first.release()
+        second.release()
@@ -1,15 +1,23 @@
 # Standard Library Imports
+import csv
+import io
+import json
 import os
+from datetime import datetime, timedelta
+from decimal import Decimal
 
 # Third Party Library Imports
 import pytest
 from apistar import TestClient
 from apistar_jwt.token import JWT
 from django.contrib.auth import get_user_model
+from werkzeug.http import http_date
 
 # First Party Library Imports
 from app import app
-from envelopes.models import Account
+from envelopes.cache import row_cache
+from envelopes.models import Account, AccountRollup, CategorySpend, Envelope, Transaction
+from tests.utils import assert_num_queries
 
 User = get_user_model()
 
@@ -61,19 +69,54 @@ def test_list_accounts(auth, accounts):
     client = TestClient(app)
     res = client.get('/accounts/', headers=auth['header'])
     assert res.status_code == 200
-    for item in res.json():
+    for item in res.json()['results']:
         assert item['owner'] == auth['user'].id
 
     auth = create_auth(accounts[0].owner)
     res = client.get('/accounts/', headers=auth['header'])
     assert res.status_code == 200
-    assert len(res.json()) == 1
-    assert res.json()[0]['uuid'] == str(accounts[0].uuid)
+    assert len(res.json()['results']) == 1
+    assert res.json()['results'][0]['uuid'] == str(accounts[0].uuid)
+    assert res.json()['next'] is None
+    assert res.json()['previous'] is None
 
     res = client.get('/accounts/')
     assert res.status_code == 401
 
 
+def test_list_accounts_pagination(auth):
+    client = TestClient(app)
+    Account.objects.filter(owner=auth['user']).delete()
+    created = [Account.objects.create(balance=i, owner=auth['user']) for i in range(5)]
+    expected = [str(account.uuid) for account in reversed(created)]
+
+    res = client.get('/accounts/?limit=2', headers=auth['header'])
+    assert res.status_code == 200
+    page = res.json()
+    assert [item['uuid'] for item in page['results']] == expected[:2]
+    assert page['previous'] is None
+
+    res = client.get('/accounts/?limit=2&cursor={}'.format(page['next']), headers=auth['header'])
+    page = res.json()
+    assert [item['uuid'] for item in page['results']] == expected[2:4]
+
+    res = client.get('/accounts/?limit=2&cursor={}'.format(page['next']), headers=auth['header'])
+    last = res.json()
+    assert [item['uuid'] for item in last['results']] == expected[4:]
+    assert last['next'] is None
+
+    res = client.get(
+        '/accounts/?limit=2&cursor={}'.format(last['previous']), headers=auth['header'])
+    assert [item['uuid'] for item in res.json()['results']] == expected[2:4]
+
+    res = client.get('/accounts/?cursor=garbage', headers=auth['header'])
+    assert res.status_code == 400
+    res = client.get('/accounts/?limit=0', headers=auth['header'])
+    assert res.status_code == 400
+
+    Account.objects.filter(owner=auth['user']).delete()
+
+
 def test_get_account(auth, accounts):
     client = TestClient(app)
     url = '/accounts/{}/'.format(accounts[0].uuid)
@@ -92,6 +135,35 @@ def test_get_account(auth, accounts):
     assert res.status_code == 401
 
 
+def test_account_query_counts(accounts):
+    client = TestClient(app)
+    url = '/accounts/{}/'.format(accounts[1].uuid)
+    auth = create_auth(accounts[1].owner)
+
+    with assert_num_queries(1):
+        res = client.get('/accounts/', headers=auth['header'])
+    assert res.status_code == 200
+
+    with assert_num_queries(1):
+        res = client.get(url, headers=auth['header'])
+    assert res.status_code == 200
+
+    with assert_num_queries(1):
+        res = client.get('/accounts/{}/'.format(accounts[2].uuid), headers=auth['header'])
+    assert res.status_code == 404
+
+    # lookup, owner choice and foreign key validation on the form, update
+    data = {'balance': accounts[1].balance, 'owner': accounts[1].owner.id}
+    with assert_num_queries(4):
+        res = client.patch(url, headers=auth['header'], data=data)
+    assert res.status_code == 200
+
+    # lookup, cascade collection of envelopes, rollup rows, rollup deltas and the account delete
+    with assert_num_queries(6):
+        res = client.delete(url, headers=auth['header'])
+    assert res.status_code == 204
+
+
 def test_create_account(auth):
     client = TestClient(app)
     data = {
@@ -141,6 +213,100 @@ def test_update_account(accounts):
     account.save()
 
 
+def test_update_account_preconditions(accounts):
+    client = TestClient(app)
+    account = Account.objects.get(pk=accounts[2].pk)
+    url = '/accounts/{}/'.format(account.uuid)
+    auth = create_auth(account.owner)
+    data = {'balance': account.balance, 'owner': account.owner.id}
+
+    res = client.get(url, headers=auth['header'])
+    assert res.headers['etag'] == '"{}"'.format(account.version)
+    assert res.json()['version'] == account.version
+
+    headers = dict(auth['header'], **{'If-Match': res.headers['etag']})
+    res = client.patch(url, headers=headers, data=data)
+    assert res.status_code == 200
+    assert res.headers['etag'] == '"{}"'.format(account.version + 1)
+
+    res = client.patch(url, headers=headers, data=data)
+    assert res.status_code == 412
+    assert Account.objects.get(pk=account.pk).version == account.version + 1
+
+    headers['If-Match'] = '*'
+    res = client.patch(url, headers=headers, data=data)
+    assert res.status_code == 200
+
+
+def test_conditional_get_account(accounts):
+    client = TestClient(app)
+    account = Account.objects.get(pk=accounts[1].pk)
+    url = '/accounts/{}/'.format(account.uuid)
+    auth = create_auth(account.owner)
+
+    res = client.get(url, headers=auth['header'])
+    tag, modified = res.headers['etag'], res.headers['last-modified']
+    assert tag == '"{}"'.format(account.version)
+    assert modified == http_date((account.modified or account.created).replace(microsecond=0))
+
+    # answered from the row cache
+    with assert_num_queries(0):
+        res = client.get(url, headers=dict(auth['header'], **{'If-None-Match': tag}))
+    assert res.status_code == 304
+    assert res.content == b''
+    assert res.headers['etag'] == tag
+
+    row_cache.backend.clear()
+    with assert_num_queries(1):
+        res = client.get(url, headers=dict(auth['header'], **{'If-None-Match': 'W/' + tag}))
+    assert res.status_code == 304
+
+    res = client.get(url, headers=dict(auth['header'], **{'If-Modified-Since': modified}))
+    assert res.status_code == 304
+    res = client.get(url, headers=dict(auth['header'], **{
+        'If-Modified-Since': http_date(account.created - timedelta(seconds=1))}))
+    assert res.status_code == 200
+
+    data = {'balance': account.balance, 'owner': account.owner.id}
+    client.patch(url, headers=auth['header'], data=data)
+    res = client.get(url, headers=dict(auth['header'], **{'If-None-Match': tag}))
+    assert res.status_code == 200
+    assert res.headers['etag'] == '"{}"'.format(account.version + 1)
+
+
+def test_conditional_list_accounts(accounts):
+    client = TestClient(app)
+    auth = create_auth(accounts[1].owner)
+    res = client.get('/accounts/', headers=auth['header'])
+    tag = res.headers['etag']
+
+    headers = dict(auth['header'], **{'If-None-Match': tag})
+    with assert_num_queries(1):
+        res = client.get('/accounts/', headers=headers)
+    assert res.status_code == 304
+
+    Account.objects.create(balance=1, owner=accounts[1].owner)
+    res = client.get('/accounts/', headers=headers)
+    assert res.status_code == 200
+    assert res.headers['etag'] != tag
+
+
+def test_delete_account_preconditions(accounts):
+    client = TestClient(app)
+    account = Account.objects.get(pk=accounts[0].pk)
+    url = '/accounts/{}/'.format(account.uuid)
+    auth = create_auth(account.owner)
+
+    headers = dict(auth['header'], **{'If-Match': '"{}"'.format(account.version + 1)})
+    res = client.delete(url, headers=headers)
+    assert res.status_code == 412
+    assert Account.objects.filter(pk=account.pk).exists()
+
+    headers['If-Match'] = '"{}"'.format(account.version)
+    res = client.delete(url, headers=headers)
+    assert res.status_code == 204
+
+
 def test_delete_account(accounts):
     client = TestClient(app)
     url = '/accounts/{}/'.format(accounts[0].uuid)
@@ -149,3 +315,325 @@ def test_delete_account(accounts):
     res = client.delete(url, headers=auth['header'])
     assert res.status_code == 204
     assert not Account.objects.filter(uuid=uuid).exists()
+
+
+@pytest.fixture()
+def ledger(auth):
+    Account.objects.filter(owner=auth['user']).delete()
+    account = Account.objects.create(balance=100, owner=auth['user'])
+    dt = datetime(2017, 10, 1)
+    envelope = Envelope.objects.create(
+        creator=auth['user'], name='Groceries', budget=100, balance=100, account=account,
+        created=dt, modified=dt)
+    transactions = [
+        Transaction.objects.create(
+            friendly_id='EXPORT-{}-{}'.format(envelope.pk, i), user=auth['user'],
+            envelope=envelope, action_type=Transaction.ACTION_TYPE_DEPOSITED, delta=i,
+            created=dt + timedelta(days=i))
+        for i in range(1, 4)
+    ]
+    yield transactions
+    account.delete()
+
+
+def test_export_transactions(auth, ledger):
+    client = TestClient(app)
+    friendly_ids = [transaction.friendly_id for transaction in ledger]
+
+    res = client.get('/transactions/export', headers=auth['header'])
+    assert res.status_code == 200
+    assert res.headers['content-type'] == 'application/x-ndjson'
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    assert [row['friendly_id'] for row in rows] == friendly_ids
+    assert rows[0]['delta'] == '1.00'
+
+    res = client.get('/transactions/export?format=json', headers=auth['header'])
+    assert res.status_code == 200
+    assert [row['friendly_id'] for row in res.json()] == friendly_ids
+
+    res = client.get('/transactions/export?format=csv', headers=auth['header'])
+    assert res.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(res.text)))
+    assert [row['friendly_id'] for row in rows] == friendly_ids
+    assert rows[2]['envelope'] == str(ledger[2].envelope_id)
+
+    res = client.get('/transactions/export?format=xml', headers=auth['header'])
+    assert res.status_code == 400
+
+    auth = create_auth(User.objects.get_or_create(email='1-test@example.com')[0])
+    res = client.get('/transactions/export?format=json', headers=auth['header'])
+    assert res.json() == []
+
+    res = client.get('/transactions/export')
+    assert res.status_code == 401
+
+
+def test_list_and_get_transactions(auth, ledger):
+    client = TestClient(app)
+    friendly_ids = [transaction.friendly_id for transaction in ledger]
+
+    res = client.get('/transactions/', headers=auth['header'])
+    assert res.status_code == 200
+    assert [row['friendly_id'] for row in res.json()['results']] == friendly_ids[::-1]
+
+    res = client.get(
+        '/transactions/?since=2017-10-03&until=2017-10-04', headers=auth['header'])
+    assert [row['friendly_id'] for row in res.json()['results']] == friendly_ids[1:2]
+
+    res = client.get('/transactions/?since=soon', headers=auth['header'])
+    assert res.status_code == 400
+
+    url = '/transactions/{}/'.format(friendly_ids[0])
+    res = client.get(url, headers=auth['header'])
+    assert res.status_code == 200
+    assert res.json()['delta'] == '1.00'
+    res = client.get(url + '?since=2017-10-03', headers=auth['header'])
+    assert res.status_code == 404
+
+    other = create_auth(User.objects.get_or_create(email='1-test@example.com')[0])
+    assert client.get(url, headers=other['header']).status_code == 404
+    assert client.get('/transactions/', headers=other['header']).json()['results'] == []
+
+
+def test_account_summary(auth, ledger):
+    client = TestClient(app)
+    envelope = ledger[0].envelope
+    url = '/accounts/{}/summary/'.format(envelope.account.uuid)
+
+    res = client.get(url, headers=auth['header'])
+    assert res.status_code == 200
+    assert res.json()['allocated'] == '0.00'
+    assert res.json()['spend'] == []
+
+    now = datetime.now()
+    AccountRollup.rebuild(envelope.account_id, now)
+    AccountRollup.apply(envelope.account_id, now, allocated=Decimal('-12.50'))
+    CategorySpend.record(envelope.account_id, None, now, Decimal('12.50'))
+    CategorySpend.record(envelope.account_id, None, now, Decimal('2.50'))
+
+    with assert_num_queries(2):
+        res = client.get(url, headers=auth['header'])
+    assert res.status_code == 200
+    summary = res.json()
+    assert summary['account'] == str(envelope.account.uuid)
+    assert summary['allocated'] == '87.50'
+    assert summary['budgeted'] == '100.00'
+    assert summary['unallocated'] == '12.50'
+    assert summary['spend'] == [
+        {'category': None, 'period': summary['period'], 'spent': '15.00'},
+    ]
+
+    auth = create_auth(User.objects.get_or_create(email='1-test@example.com')[0])
+    res = client.get(url, headers=auth['header'])
+    assert res.status_code == 404
+
+
+def test_move_envelope_funds(auth, ledger):
+    client = TestClient(app)
+    groceries = ledger[0].envelope
+    rent = Envelope.objects.create(
+        creator=auth['user'], name='Rent', budget=500, balance=0, account=groceries.account,
+        created=groceries.created, modified=groceries.created)
+    AccountRollup.rebuild(groceries.account_id, datetime.now())
+    data = {
+        'movements': [
+            {'envelope': str(rent.uuid), 'amount': '400.00'},
+            {'envelope': str(groceries.uuid), 'amount': '50.00'},
+            {'envelope': str(rent.uuid), 'amount': '100.00'},
+        ],
+        'description': 'Paycheck',
+    }
+
+    # savepoint, lock, balance update, ledger insert, rollup update, release
+    with assert_num_queries(6):
+        res = client.post('/envelopes/movements/', headers=auth['header'], json=data)
+    assert res.status_code == 201
+    assert [row['delta'] for row in res.json()] == ['400.00', '50.00', '100.00']
+    assert {row['action_type'] for row in res.json()} == {Transaction.ACTION_TYPE_DEPOSITED}
+    assert len({row['friendly_id'] for row in res.json()}) == 3
+    assert Envelope.objects.get(pk=rent.pk).balance == 500
+    assert Envelope.objects.get(pk=groceries.pk).balance == 150
+    assert AccountRollup.current(groceries.account_id).allocated == 650
+
+    data = {'movements': [{'envelope': str(rent.uuid), 'amount': '-25.00'}]}
+    res = client.post('/envelopes/movements/', headers=auth['header'], json=data)
+    assert res.status_code == 201
+    assert res.json()[0]['action_type'] == Transaction.ACTION_TYPE_WITHDRAWN
+    assert Envelope.objects.get(pk=rent.pk).balance == 475
+    assert CategorySpend.objects.get(account=groceries.account).spent == 25
+
+    data = {'movements': [{'envelope': str(rent.uuid), 'amount': '0'}]}
+    res = client.post('/envelopes/movements/', headers=auth['header'], json=data)
+    assert res.status_code == 400
+
+    other = create_auth(User.objects.get_or_create(email='1-test@example.com')[0])
+    data = {'movements': [{'envelope': str(rent.uuid), 'amount': '10.00'}]}
+    res = client.post('/envelopes/movements/', headers=other['header'], json=data)
+    assert res.status_code == 404
+    assert Envelope.objects.get(pk=rent.pk).balance == 475
+
+
+def test_transfer_envelope_funds(auth, ledger):
+    client = TestClient(app)
+    groceries = ledger[0].envelope
+    rent = Envelope.objects.create(
+        creator=auth['user'], name='Rent', budget=500, balance=0, account=groceries.account,
+        created=groceries.created, modified=groceries.created)
+    data = {'source': str(groceries.uuid), 'target': str(rent.uuid), 'amount': '60.00'}
+
+    # savepoint, lock and update, ledger insert, release
+    with assert_num_queries(4):
+        res = client.post('/envelopes/transfers/', headers=auth['header'], json=data)
+    assert res.status_code == 201
+    transfer = res.json()
+    assert [row['delta'] for row in transfer['transactions']] == ['-60.00', '60.00']
+    assert {row['transfer_id'] for row in transfer['transactions']} == {transfer['transfer_id']}
+    assert len({row['friendly_id'] for row in transfer['transactions']}) == 2
+    assert Envelope.objects.get(pk=groceries.pk).balance == 40
+    assert Envelope.objects.get(pk=rent.pk).balance == 60
+
+    data['allow_overdraft'] = False
+    res = client.post('/envelopes/transfers/', headers=auth['header'], json=data)
+    assert res.status_code == 409
+    assert Envelope.objects.get(pk=groceries.pk).balance == 40
+    assert Envelope.objects.get(pk=rent.pk).balance == 60
+
+    data['allow_overdraft'] = True
+    res = client.post('/envelopes/transfers/', headers=auth['header'], json=data)
+    assert res.status_code == 201
+    assert Envelope.objects.get(pk=groceries.pk).balance == -20
+
+    res = client.post('/envelopes/transfers/', headers=auth['header'], json={
+        'source': str(rent.uuid), 'target': str(rent.uuid), 'amount': '1.00'})
+    assert res.status_code == 400
+
+    other = create_auth(User.objects.get_or_create(email='1-test@example.com')[0])
+    res = client.post('/envelopes/transfers/', headers=other['header'], json=data)
+    assert res.status_code == 404
+
+
+def test_list_envelopes(auth, ledger):
+    client = TestClient(app)
+    groceries = ledger[0].envelope
+    rent = Envelope.objects.create(
+        creator=auth['user'], name='Rent', budget=500, balance=0, account=groceries.account,
+        created=groceries.created + timedelta(days=1), modified=groceries.created)
+    assert rent.owner_id == auth['user'].id
+
+    with assert_num_queries(1):
+        res = client.get('/envelopes/', headers=auth['header'])
+    assert res.status_code == 200
+    assert [item['uuid'] for item in res.json()['results']] == [
+        str(rent.uuid), str(groceries.uuid)]
+
+    other = create_auth(User.objects.get_or_create(email='1-test@example.com')[0])
+    res = client.get('/envelopes/', headers=other['header'])
+    assert str(rent.uuid) not in [item['uuid'] for item in res.json()['results']]
+
+    res = client.get('/envelopes/{}/'.format(rent.uuid), headers=other['header'])
+    assert res.status_code == 404
+    with assert_num_queries(1):
+        res = client.get('/envelopes/{}/'.format(rent.uuid), headers=auth['header'])
+    assert res.json()['name'] == 'Rent'
+
+
+def test_create_update_delete_envelope(auth, ledger):
+    client = TestClient(app)
+    account = ledger[0].envelope.account
+    AccountRollup.rebuild(account.id, datetime.now())
+    data = {'name': 'Travel', 'budget': '50.00', 'balance': '20.00', 'account': account.id}
+
+    res = client.post('/envelopes/', headers=auth['header'], json=data)
+    assert res.status_code == 201
+    envelope = Envelope.objects.get(uuid=res.json()['uuid'])
+    assert envelope.owner_id == auth['user'].id
+    rollup = AccountRollup.current(account.pk)
+    assert (rollup.allocated, rollup.budgeted) == (120, 150)
+
+    other = create_auth(User.objects.get_or_create(email='1-test@example.com')[0])
+    foreign = Account.objects.create(balance=0, owner=other['user'])
+    res = client.post('/envelopes/', headers=auth['header'], json=dict(data, account=foreign.id))
+    assert res.status_code == 400
+
+    url = '/envelopes/{}/'.format(envelope.uuid)
+    res = client.patch(url, headers=auth['header'], json=dict(data, account=foreign.id))
+    assert res.status_code == 400
+
+    second = Account.objects.create(balance=0, owner=auth['user'])
+    data.update(balance='30.00', account=second.id)
+    res = client.put(url, headers=auth['header'], json=data)
+    assert res.status_code == 200
+    assert res.json()['account'] == second.id
+    assert [(row.action_type, row.delta) for row in envelope.transactions.order_by('id')] == [
+        (Transaction.ACTION_TYPE_CREATED, 20), (Transaction.ACTION_TYPE_DEPOSITED, 10)]
+    rollup = AccountRollup.current(account.pk)
+    assert (rollup.allocated, rollup.budgeted) == (100, 100)
+    rollup = AccountRollup.current(second.pk)
+    assert (rollup.allocated, rollup.budgeted) == (30, 50)
+
+    res = client.delete(url, headers=other['header'])
+    assert res.status_code == 404
+    res = client.delete(url, headers=auth['header'])
+    assert res.status_code == 204
+    assert not Envelope.objects.filter(pk=envelope.pk).exists()
+    rollup = AccountRollup.current(second.pk)
+    assert (rollup.allocated, rollup.budgeted) == (0, 0)
+    second.delete()
+    foreign.delete()
+
+
+def test_deposit_and_withdraw(auth, ledger, monkeypatch):
+    client = TestClient(app)
+    envelope = ledger[0].envelope
+    url = '/envelopes/{}/'.format(envelope.uuid)
+
+    res = client.post(url + 'deposit/', headers=auth['header'], json={'amount': '25.00'})
+    assert res.status_code == 201
+    assert res.json()['envelope']['balance'] == '125.00'
+    assert res.json()['transaction']['action_type'] == Transaction.ACTION_TYPE_DEPOSITED
+    assert res.headers['ETag'] == '"{}"'.format(res.json()['envelope']['version'])
+
+    res = client.post(url + 'withdraw/', headers=auth['header'], json={
+        'amount': '40.00', 'description': 'Market'})
+    assert res.status_code == 201
+    assert res.json()['envelope']['balance'] == '85.00'
+    assert res.json()['transaction']['delta'] == '-40.00'
+    assert Envelope.objects.get(pk=envelope.pk).balance == 85
+
+    res = client.post(url + 'withdraw/', headers=auth['header'], json={'amount': '-1'})
+    assert res.status_code == 400
+    res = client.post(url + 'withdraw/', headers=auth['header'], json={
+        'amount': '1.00', 'category': 999999})
+    assert res.status_code == 400
+
+    other = create_auth(User.objects.get_or_create(email='1-test@example.com')[0])
+    res = client.post(url + 'deposit/', headers=other['header'], json={'amount': '1.00'})
+    assert res.status_code == 404
+    res = client.post('/envelopes/not-a-uuid/deposit/', headers=auth['header'], json={
+        'amount': '1.00'})
+    assert res.status_code == 400
+    assert Envelope.objects.get(pk=envelope.pk).balance == 85
+
+    # an envelope that keeps changing under the version check
+    monkeypatch.setattr('envelopes.models.OPTIMISTIC_WRITES', True)
+    monkeypatch.setattr('envelopes.models.OPTIMISTIC_BACKOFF', 0)
+    monkeypatch.setattr(Envelope, 'save_versioned', lambda self, fields: False)
+    res = client.post(url + 'deposit/', headers=auth['header'], json={'amount': '1.00'})
+    assert res.status_code == 409
+    assert res.json() == {'message': 'Conflict'}
+
+
+def test_envelope_balance(auth, ledger):
+    client = TestClient(app)
+    url = '/envelopes/{}/balance/'.format(ledger[0].envelope.uuid)
+
+    res = client.get(url + '?at=2017-10-03T12:00:00', headers=auth['header'])
+    assert res.status_code == 200
+    assert res.json()['balance'] == '3.00'
+    assert res.json()['envelope'] == str(ledger[0].envelope.uuid)
+    assert client.get(url, headers=auth['header']).json()['balance'] == '6.00'
+    assert client.get(url + '?at=2017-09-01', headers=auth['header']).json()['balance'] == '0.00'
+
+    assert client.get(url + '?at=someday', headers=auth['header']).status_code == 400
+    other = create_auth(User.objects.get_or_create(email='1-test@example.com')[0])
+    assert client.get(url, headers=other['header']).status_code == 404
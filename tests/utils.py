@@ -0,0 +1,41 @@
+# Standard Library Imports
+from collections import deque
+from contextlib import contextmanager
+
+# Third Party Library Imports
+from django.db import connection
+
+
+class RecordingQueryLog(deque):
+    """
+    Query log that also keeps every query it sees in `captured`.
+
+    The Django ORM session component clears `connection.queries_log` at the
+    start of every request, so counting by log offsets (as Django's
+    `CaptureQueriesContext` does) under-reports queries made by a view.
+    """
+
+    def __init__(self, iterable, maxlen):
+        super().__init__(iterable, maxlen)
+        self.captured = []
+
+    def append(self, query):
+        self.captured.append(query)
+        super().append(query)
+
+
+@contextmanager
+def assert_num_queries(num):
+    # `num=None` only records the queries for the caller to inspect
+    queries_log = connection.queries_log
+    force_debug_cursor = connection.force_debug_cursor
+    connection.queries_log = RecordingQueryLog(queries_log, queries_log.maxlen)
+    connection.force_debug_cursor = True
+    try:
+        yield connection.queries_log.captured
+    finally:
+        captured = connection.queries_log.captured
+        connection.queries_log = queries_log
+        connection.force_debug_cursor = force_debug_cursor
+    assert num is None or len(captured) == num, '{} queries executed, {} expected:\n{}'.format(
+        len(captured), num, '\n'.join(query['sql'] for query in captured))